@@ -78,16 +78,23 @@ Delete options:
 
 # TODO -- option separator
 
+import heapq
+
 from lmi.scripts.common import command
 from lmi.scripts.common.errors import LmiFailed
 from lmi.scripts.common.errors import LmiInvalidOptions
 
-def list(ns):
+def list(ns, max_objects=None):
     """
-    Implementation of 'user list' command.
+    Implementation of 'user list' command. If *max_objects* is given, only
+    that many first users by name are kept while enumerating.
     """
-    for s in sorted(ns.LMI_Account.instances(),
-                    key=lambda i: i.Name):
+    if max_objects is None:
+        users = sorted(ns.LMI_Account.instances(), key=lambda i: i.Name)
+    else:
+        users = heapq.nsmallest(max_objects, ns.LMI_Account.instances(),
+                key=lambda i: i.Name)
+    for s in users:
         yield (s.Name, s.UserID, s.ElementName)
 
 def get_user_info(ns, user):
@@ -155,6 +162,7 @@ def create_user(ns, name, **kwargs):
 class Lister(command.LmiLister):
     CALLABLE = 'lmi.scripts.account.user_cmd:list'
     COLUMNS = ('Name', "UID", "Full name")
+    CACHE_TTL = 300
 
 class Show(command.LmiInstanceLister):
     CALLABLE = show_user
@@ -31,14 +31,22 @@
 LMI service provider client library.
 """
 
+import heapq
+
 from lmi.shell import LMIInstance
 from lmi.shell import LMIInstanceName
 from lmi.scripts.common.errors import LmiFailed
 from lmi.scripts.common import get_logger
+from lmi.scripts.common import where as query
 
 LOG = get_logger(__name__)
 
 SERVICE_KINDS = {'all', 'enabled', 'disabled', 'oneshot'}
+# names of EnabledDefault values of service kinds
+KIND_ENABLED_DEFAULT = {
+        'enabled'  : 'Enabled',
+        'disabled' : 'Disabled',
+        'oneshot'  : 'NotApplicable'}
 
 def invoke_on_service(ns, method, service, description):
     """
@@ -60,7 +68,8 @@ def invoke_on_service(ns, method, service, description):
                 description, service, ns.hostname)
     return res
 
-def list_services(ns, kind='enabled'):
+def list_services(ns, kind='enabled', max_objects=None, property_list=None,
+        where=None):
     """
     List services. Yields service instances.
 
@@ -71,6 +80,14 @@ def list_services(ns, kind='enabled'):
         * 'oneshot'  - list only oneshot services
         * 'all'      - list all services
 
+    :param integer max_objects: Maximum number of services to yield. Only
+        the first ones by name are kept while enumerating, instead of
+        sorting all of them.
+    :param list property_list: Names of properties needed by caller. Other
+        properties are not requested from the host. All of them are
+        requested, if ``None``.
+    :param string where: Additional condition of WQL query services must
+        satisfy.
     :returns: Instances of ``LMI_Service``.
     :rtype: generator over :py:class:`lmi.shell.LMIInstance`.
     """
@@ -78,17 +95,38 @@ def list_services(ns, kind='enabled'):
         raise TypeError("kind must be a string")
     if not kind in SERVICE_KINDS:
         raise ValueError("kind must be one of %s" % SERVICE_KINDS)
-    for service in sorted(ns.LMI_Service.instances(), key=lambda i: i.Name):
+    def _matches(service):
+        """ Whether the service is of requested kind. """
         if kind == 'disabled' and service.EnabledDefault != \
                 ns.LMI_Service.EnabledDefaultValues.Disabled:
-            continue
+            return False
         if kind == 'oneshot' and service.EnabledDefault != \
                 ns.LMI_Service.EnabledDefaultValues.NotApplicable:
-            continue
+            return False
         if kind == 'enabled' and service.EnabledDefault != \
                 ns.LMI_Service.EnabledDefaultValues.Enabled:
             # list only enabled
-            continue
+            return False
+        return True
+    conditions = [where]
+    if kind != 'all':
+        # let the CIMOM filter them, they are checked again below
+        conditions.append('EnabledDefault = %d' % getattr(
+                ns.LMI_Service.EnabledDefaultValues,
+                KIND_ENABLED_DEFAULT[kind]))
+    if property_list is not None:
+        # Name is needed for sorting and EnabledDefault for filtering
+        property_list = sorted(
+                set(property_list).union(('Name', 'EnabledDefault')))
+    services = ns.wql(query.make_query(
+            'LMI_Service', property_list, conditions))
+    services = (s for s in services if _matches(s))
+    if max_objects is None:
+        services = sorted(services, key=lambda i: i.Name)
+    else:
+        services = heapq.nsmallest(max_objects, services,
+                key=lambda i: i.Name)
+    for service in services:
         yield service
 
 def start_service(ns, service):
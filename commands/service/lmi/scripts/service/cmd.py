@@ -63,8 +63,10 @@ from lmi.scripts.common import command
 
 class Lister(command.LmiInstanceLister):
     PROPERTIES = ('Name', "Started", 'Status')
+    CACHE_TTL = 60
 
-    def execute(self, ns, _all, _disabled, _oneshot):
+    def execute(self, ns, _all, _disabled, _oneshot, max_objects=None,
+            property_list=None, where=None):
         kind = 'enabled'
         if _all:
             kind = 'all'
@@ -72,7 +74,8 @@ class Lister(command.LmiInstanceLister):
             kind = 'disabled'
         elif _oneshot:
             kind = 'oneshot'
-        for service_inst in srv.list_services(ns, kind):
+        for service_inst in srv.list_services(
+                ns, kind, max_objects, property_list, where):
             yield service_inst
 
 class Start(command.LmiCheckResult):
@@ -88,6 +88,7 @@ from lmi.shell import LMIUtil
 from lmi.shell import LMIExceptions
 from lmi.scripts.common.errors import LmiFailed
 from lmi.scripts.common import get_logger
+from lmi.scripts.common import where
 
 # matches <name>.<arch>
 RE_NA  = re.compile(r'^(?P<name>.+)\.(?P<arch>[^.]+)$')
@@ -149,22 +150,27 @@ def get_package_nevra(package):
            if   isinstance(package, LMIInstanceName)
            else package.InstanceId)[len('LMI:LMI_SoftwareIdentity:'):]
 
-def list_installed_packages(ns):
+def list_installed_packages(ns, property_list=None):
     """
     Yields instances of ``LMI_SoftwareIdentity`` representing installed packages.
 
+    :param list property_list: Names of properties needed by caller. Other
+        properties are not requested from the host. All of them are
+        requested, if ``None``.
     :rtype: generator
     """
     for identity in ns.Linux_ComputerSystem.first_instance().associators(
             Role="System",
             ResultRole="InstalledSoftware",
-            ResultClass="LMI_SoftwareIdentity"):
+            ResultClass="LMI_SoftwareIdentity",
+            PropertyList=property_list):
         yield identity
 
 def list_available_packages(ns,
         allow_installed=False,
         allow_duplicates=False,
-        repoid=None):
+        repoid=None,
+        property_list=None):
     """
     Yields instances of ``LMI_SoftwareIdentity`` representing available packages.
 
@@ -176,6 +182,9 @@ def list_available_packages(ns,
         in result.
     :param string repoid: Repository identification string. This will filter
         available packages just for those provided by this repository.
+    :param list property_list: Names of properties needed by caller. Other
+        properties are not requested from the host. All of them are
+        requested, if ``None``.
     :rtype: generator
     """
     if repoid is not None:
@@ -186,6 +195,10 @@ def list_available_packages(ns,
         repos = [inst]
     else:
         repos = ns.LMI_SoftwareIdentityResource.instances()
+    if property_list is not None:
+        # Name is needed for sorting and InstallDate for filtering
+        property_list = sorted(
+                set(property_list).union(('Name', 'InstallDate')))
 
     pkg_names = []
     data = defaultdict(list)    # (pkg_name, [instance, ...])
@@ -195,7 +208,8 @@ def list_available_packages(ns,
             continue                  # skip disabled repositories
         for identity in repo.associators(
                 Role="AvailableSAP", ResultRole="ManagedElement",
-                ResultClass="LMI_SoftwareIdentity"):
+                ResultClass="LMI_SoftwareIdentity",
+                PropertyList=property_list):
             if not allow_installed and identity.InstallDate:
                 continue
             if not identity.Name in data:
@@ -329,7 +343,14 @@ def list_repositories(ns, enabled=True):
     if not isinstance(enabled, bool) and enabled is not None:
         raise TypeError("kind must be a boolean or None")
 
-    for repo in ns.LMI_SoftwareIdentityResource.instances():
+    conditions = []
+    if enabled is not None:
+        # let the CIMOM filter them, they are checked again below
+        values = ns.LMI_SoftwareIdentityResource.EnabledStateValues
+        conditions.append('EnabledState = %d'
+                % (values.Enabled if enabled else values.Disabled))
+    for repo in ns.wql(where.make_query(
+            'LMI_SoftwareIdentityResource', conditions=conditions)):
         if enabled and repo.EnabledState != \
                 ns.LMI_SoftwareIdentityResource.EnabledStateValues.Enabled:
             continue
@@ -110,6 +110,7 @@ LOG = get_logger(__name__)
 class PkgLister(command.LmiInstanceLister):
     DYNAMIC_PROPERTIES = True
     ARG_ARRAY_SUFFIX = '_array'
+    CACHE_TTL = 600
 
     def execute(self, ns,
             _available=False,
@@ -120,6 +121,7 @@ class PkgLister(command.LmiInstanceLister):
         properties = (
                 ('NEVRA', 'ElementName'),
                 ('Summary', 'Caption'))
+        property_list = command.get_property_list(properties)
         if package_array:
             package_generators = []
             for pkg_spec in package_array:
@@ -146,10 +148,12 @@ class PkgLister(command.LmiInstanceLister):
             instances = software.list_available_packages(ns,
                     allow_installed=_all,
                     allow_duplicates=_allow_duplicates,
-                    repoid=_repoid)
+                    repoid=_repoid,
+                    property_list=property_list)
 
         else:
-            instances = software.list_installed_packages(ns)
+            instances = software.list_installed_packages(ns,
+                    property_list=property_list)
 
         return (properties, instances)
 
@@ -34,30 +34,13 @@ Common storage functionality.
 """
 
 from lmi.scripts.common import get_logger
-import re
 from lmi.shell import LMIInstance
 from lmi.scripts.common.errors import LmiFailed
+from lmi.scripts.common.where import escape_cql
 from lmi.shell.LMIUtil import lmi_isinstance
 
 LOG = get_logger(__name__)
 
-ESCAPE_RE = re.compile(r'(["\\])')
-
-def escape_cql(s):
-    """
-    Escape potentially unsafe string for CQL.
-
-    It is generally not possible to do anything really harmful in CQL
-    (there is no DELETE nor DROP TABLE), but just to be nice,
-    all strings passed to CQL should escape backslash '\' and double quote
-    '"'.
-
-    :type s: string
-    :param s: String to escape.
-    :rtype: string
-    """
-    return ESCAPE_RE.sub(r'\\\1', s)
-
 def str2device(ns, device):
     """
     Convert string with name of device to LMIInstance of the device.
@@ -37,6 +37,7 @@ Filesystem management functions.
 from lmi.scripts.common.errors import LmiFailed
 from lmi.scripts.storage import partition
 from lmi.scripts.common import get_logger
+from lmi.scripts.common import where
 LOG = get_logger(__name__)
 from lmi.scripts.storage import common
 from lmi.shell import LMIInstance
@@ -156,7 +157,13 @@ def get_formats(ns, devices=None, format_type=FORMAT_ALL, nodevfs=False):
         # No devices supplied, list all formats
         if format_type & FORMAT_FS:
             cls = ns.CIM_LocalFileSystem
-            for fs in ns.CIM_LocalFileSystem.instances():
+            conditions = []
+            if not nodevfs:
+                # let the CIMOM filter them, they are checked again below
+                conditions.append('PersistenceType = %d'
+                        % cls.PersistenceTypeValues.Persistent)
+            for fs in ns.wql(where.make_query(
+                    'CIM_LocalFileSystem', conditions=conditions)):
                 if fs.PersistenceType == cls.PersistenceTypeValues.Persistent \
                         or nodevfs:
                     yield fs
@@ -65,8 +65,33 @@ Commands:
 from lmi.scripts.common import command
 from lmi.scripts.storage import fs
 
-class Lister(command.LmiLister):
-    COLUMNS = ('Device', 'Name', "ElementName", "Type")
+def _get_device_name(fmt):
+    """
+    Return name of device, the format resides on.
+    """
+    device = fmt.first_associator(AssocClass="CIM_ResidesOnExtent")
+    if device:
+        return device.DeviceID
+    return "(none)"
+
+def _get_format_type(fmt):
+    """
+    Return type of filesystem or other data format.
+    """
+    if "FileSystemType" in fmt.properties():
+        # it's CIM_LocalFileSystem
+        # TODO: add filesystem size and free space
+        return fmt.FileSystemType
+    # it must be LMI_DataFormat
+    return fmt.FormatTypeDescription
+
+class Lister(command.LmiInstanceLister):
+    # device is looked up just when its column is printed
+    PROPERTIES = (
+            ('Device', _get_device_name),
+            'Name',
+            'ElementName',
+            ('Type', _get_format_type))
 
     def transform_options(self, options):
         """
@@ -79,23 +104,8 @@ class Lister(command.LmiLister):
         """
         Implementation of 'fs list' command.
         """
-        for fmt in fs.get_formats(ns, devices, fs.FORMAT_ALL, _all):
-            device = fmt.first_associator(AssocClass="CIM_ResidesOnExtent")
-            if device:
-                devname = device.DeviceID
-            else:
-                devname = "(none)"
-            name = fmt.Name
-            label = fmt.ElementName
-            if "FileSystemType" in fmt.properties():
-                # it's CIM_LocalFileSystem
-                # TODO: add filesystem size and free space
-                fstype = fmt.FileSystemType
-            else:
-                # it must be LMI_DataFormat
-                fstype = fmt.FormatTypeDescription
-            # TODO: add free space when OpenLMI provides it
-            yield (devname, name, label, fstype)
+        # TODO: add free space when OpenLMI provides it
+        return fs.get_formats(ns, devices, fs.FORMAT_ALL, _all)
 
 
 class ListSupported(command.LmiLister):
@@ -121,6 +121,7 @@ def get_obj_info(ns, obj, human_friendly):
 
 class Lister(command.LmiLister):
     COLUMNS = ('DeviceID', "Name", "ElementName", "Size", "Format")
+    CACHE_TTL = 300
 
     def transform_options(self, options):
         """
@@ -33,19 +33,26 @@ Subpackage containing functionality of lmi meta-command.
 
 import argparse
 import logging
+import os
 import sys
 
 from lmi.scripts import common
 from lmi.scripts.common import errors
+from lmi.scripts.common import executor
 from lmi.scripts._metacommand import util
 from lmi.scripts._metacommand.help import Help
 from lmi.scripts._metacommand.manager import CommandManager
+from lmi.scripts._metacommand.pager import DEFAULT_PAGER, Pager
 from lmi.scripts._metacommand.interactive import Interactive
 from lmi.scripts._metacommand.toplevel import TopLevelCommand
+from lmi.scripts.common.broker import BrokerClient
+from lmi.scripts.common.credentials import CredentialStore
 from lmi.scripts.common.command import LmiCommandMultiplexer, LmiBaseCommand
+from lmi.scripts.common.command import util as command_util
 from lmi.scripts.common.configuration import Configuration
+from lmi.scripts.common.resultcache import ResultCache
 from lmi.scripts.common.session import Session
-from lmi.shell import LMIUtil
+from lmi.scripts.common.unreachable import UnreachableCache
 
 LOG = common.get_logger(__name__)
 
@@ -75,8 +82,6 @@ class MetaCommand(object):
     """
 
     def __init__(self):
-        # allow exceptions in lmi shell
-        LMIUtil.lmi_set_use_exceptions(True)
         # instance of CommandManager, created when first needed
         self._command_manager = None
         self.stdout = sys.stdout
@@ -84,10 +89,17 @@ class MetaCommand(object):
         self.stdin = sys.stdin
         # instance of Session, created when needed
         self._session = None
+        # instance of ResultCache, created when needed
+        self._result_cache = None
+        # instance of Pager used as standard output, if configured
+        self._pager = None
         # instance of Configuration, created in setup()
         self.config = None
         # dictionary of not yet processed options, it's created in setup()
         self._options = None
+        # names of options modifying output given to meta-command, they
+        # are refused by commands not supporting them
+        self.output_options = []
 
     def _configure_logging(self):
         """
@@ -126,6 +138,14 @@ class MetaCommand(object):
             self._command_manager.add_command('help', Help)
         return self._command_manager
 
+    @property
+    def has_session(self):
+        """
+        :returns: Whether the session has been already created.
+        :rtype: boolean
+        """
+        return self._session is not None
+
     @property
     def session(self):
         """
@@ -139,33 +159,95 @@ class MetaCommand(object):
                 LOG().critical(
                         "missing one of (--host | --hosts-file) arguments")
                 sys.exit(1)
-            hostnames = []
-            # credentials loaded from file
-            credentials = {}
-            def add_hosts(hosts, creds):
-                """ Update hostnames and credentials for new data. """
-                hostnames.extend(hosts)
-                credentials.update(creds)
+            # lmi.shell is imported as late as possible, commands not
+            # connecting to any host start faster without it
+            from lmi.shell import LMIUtil
+            # allow exceptions in lmi shell
+            LMIUtil.lmi_set_use_exceptions(True)
+            hostnames, credentials = util.get_hosts_credentials(
+                    self._options['--host'])
+            hosts_file = None
             if self._options['--hosts-file']:
                 hosts_path = self._options['--hosts-file']
                 try:
-                    with open(hosts_path, 'r') as hosts_file:
-                        add_hosts(*util.parse_hosts_file(hosts_file))
+                    hosts_file = open(hosts_path, 'r')
                 except (OSError, IOError) as err:
                     LOG().critical('could not read hosts file "%s": %s',
                             hosts_path, err)
                     sys.exit(1)
-            add_hosts(*util.get_hosts_credentials(self._options['--host']))
-            if self._options['--user']:
-                credentials.update({
-                        # credentials in file has precedence over --user option
-                        h : credentials.get(h, (self._options['--user'], ''))
-                    for h in hostnames if h not in credentials
-                })
-            self._session = Session(self, hostnames, credentials,
-                    same_credentials=self._options['--same-credentials'])
+            # credentials in file has precedence over --user option
+            store = CredentialStore(credentials,
+                    same_credentials=self._options['--same-credentials'],
+                    default_username=self._options['--user'],
+                    cache_path=self.config.credentials_cache,
+                    key_path=self.config.credentials_key_file)
+            def iter_hosts():
+                """
+                Yield hosts from hosts file as they are read followed by
+                the ones given on command line.
+                """
+                if hosts_file is not None:
+                    with hosts_file:
+                        for hostname, creds in util.iter_hosts_file(
+                                hosts_file, set(self._options['--group'])):
+                            # credentials on command line have precedence
+                            if (   creds is not None
+                               and hostname not in credentials):
+                                store.set(hostname, *creds)
+                            yield hostname
+                for hostname in hostnames:
+                    yield hostname
+            unreachable_cache = None
+            if self.config.unreachable_ttl is not None:
+                unreachable_cache = UnreachableCache(
+                        self.config.unreachable_cache,
+                        self.config.unreachable_ttl)
+            self._session = Session(self, iter_hosts(), store,
+                    broker=BrokerClient.attach(self.config.broker_socket),
+                    unreachable_cache=unreachable_cache)
         return self._session
 
+    @property
+    def result_cache(self):
+        """
+        Return instance of ResultCache. Instantiated when first needed.
+
+        :returns: Cache of results or ``None``, if disabled.
+        :rtype: :py:class:`lmi.scripts.common.resultcache.ResultCache`
+        """
+        if self._result_cache is None and self.config.result_cache:
+            self._result_cache = ResultCache(self.config.result_cache,
+                    self.config.result_cache_size)
+        return self._result_cache
+
+    def use_pager(self):
+        """
+        Make the standard output go to the pager, if configured and the
+        output is printed to terminal. The pager process is started with
+        the first write to the output.
+        """
+        if (   self._pager is not None
+           or not self.config.pager
+           or self.config.silent
+           or not hasattr(self.stdout, 'isatty')
+           or not self.stdout.isatty()):
+            return
+        self._pager = Pager(self.config.pager)
+        self.stdout = self._pager
+
+    def _discard_output(self):
+        """
+        Make the writes to closed standard output, that may still be
+        buffered, succeed silently.
+        """
+        devnull = open(os.devnull, 'w')
+        if self._pager is None or not self._pager.started:
+            try:
+                os.dup2(devnull.fileno(), sys.stdout.fileno())
+            except (AttributeError, OSError, ValueError):
+                pass
+        self.stdout = devnull
+
     def print_version(self):
         """ Print version of this egg to stdout. """
         self.stdout.write("%s\n" % util.get_version())
@@ -196,6 +278,56 @@ class MetaCommand(object):
         self.config.human_friendly = options.pop('--human-friendly', None)
         self.config.no_headings = options.pop('--no-headings', None)
         self.config.lister_format = options.pop('--lister-format', None)
+        window = options.pop('--table-window', None)
+        if window is not None:
+            try:
+                self.config.table_window = int(window)
+            except ValueError:
+                raise errors.LmiInvalidOptions('--table-window must be'
+                        ' a non-negative integer, not "%s"' % window)
+        self.config.output_dir = options.pop('--output-dir', None)
+        self.output_options = command_util.set_output_options(
+                self.config, options)
+        use_pager = options.pop('--pager', False)
+        if options.pop('--no-pager', False):
+            self.config.pager = ''
+        elif use_pager and not self.config.pager:
+            self.config.pager = os.environ.get('PAGER', DEFAULT_PAGER)
+        jobs = options.pop('--jobs', None)
+        if jobs is not None:
+            try:
+                self.config.jobs = int(jobs)
+            except ValueError:
+                raise errors.LmiInvalidOptions(
+                        '--jobs must be a positive integer, not "%s"' % jobs)
+        processes = options.pop('--processes', None)
+        if processes is not None:
+            try:
+                self.config.processes = int(processes)
+            except ValueError:
+                raise errors.LmiInvalidOptions('--processes must be'
+                        ' a positive integer, not "%s"' % processes)
+        backend = options.pop('--backend', None)
+        if backend is not None:
+            try:
+                self.config.backend = backend
+            except ValueError as exc:
+                raise errors.LmiInvalidOptions('--backend: %s' % exc)
+        if self.config.backend == 'gevent':
+            executor.use_greenlets()
+        try:
+            for network, _ in self.config.subnet_jobs:
+                executor.parse_network(network)
+        except ValueError as exc:
+            raise errors.LmiInvalidOptions('invalid [Main] SubnetJobs: %s'
+                    % exc)
+        timeout = options.pop('--connect-timeout', None)
+        if timeout is not None:
+            try:
+                self.config.connect_timeout = float(timeout)
+            except ValueError:
+                raise errors.LmiInvalidOptions('--connect-timeout must be'
+                        ' a non-negative number, not "%s"' % timeout)
         # unhandled options may be used later (for session creation),
         # so let's save them
         self._options = options
@@ -210,6 +342,10 @@ class MetaCommand(object):
         cmd = TopLevelCommand(self)
         try:
             return cmd.run(argv)
+        except errors.LmiOutputClosed:
+            LOG().debug('output closed by reader, processing cancelled')
+            self._discard_output()
+            return 0
         except Exception as exc:
             trace = True if self.config is None else self.config.trace
             if isinstance(exc, errors.LmiError) or not trace:
@@ -217,6 +353,13 @@ class MetaCommand(object):
             else:
                 LOG().exception("fatal")
             return 1
+        finally:
+            if self.has_session:
+                self.session.save()
+            if self._result_cache is not None:
+                self._result_cache.save()
+            if self._pager is not None:
+                self._pager.close()
 
 def main(argv=sys.argv[1:]):
     """
@@ -56,8 +56,7 @@ class Help(LmiEndPointCommand):
             max_cmd_len = max(len(n) for n in mgr)
             cmd_line = "  %%-%ds - %%s\n" % max_cmd_len
             for cmd in sorted(mgr):
-                self.app.stdout.write(cmd_line
-                        % (cmd, mgr[cmd].get_description()
-                            .strip().split("\n", 1)[0]))
+                self.app.stdout.write(cmd_line % (cmd, mgr.get_summary(cmd)))
+            mgr.save_index()
         return 0
 
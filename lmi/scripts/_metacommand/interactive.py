@@ -38,6 +38,9 @@ import shlex
 
 from lmi.scripts.common import errors
 from lmi.scripts.common import get_logger
+from lmi.scripts.common.formatter import TableFormatter
+from lmi.scripts.common.formatter import NewTableHeaderCommand
+from lmi.scripts.common.session import KeepAlive
 
 LOG = get_logger(__name__)
 
@@ -57,6 +60,8 @@ class Interactive(cmd.Cmd):
         cmd.Cmd.__init__(self,
                 stdin=parent_app.stdin, stdout=parent_app.stdout)
         self.prompt = prompt
+        # instance of KeepAlive, started once the session is created
+        self._keep_alive = None
 
     @property
     def command_manager(self):
@@ -79,6 +84,40 @@ class Interactive(cmd.Cmd):
         cmd_inst = cmd_factory(self._parent, args[0])
         return cmd_inst.run(args[1:])
 
+    def run_meta_command(self, args):
+        """
+        Run a meta command given with leading colon as a first item of
+        ``args``. Meta commands are implemented by ``do__<name>`` methods.
+
+        :param args: (``list``) List of commands.
+        """
+        method = getattr(self, 'do__' + args[0][1:], None)
+        if method is None:
+            return cmd.Cmd.default(self, ' '.join(args))
+        return method(' '.join(args[1:]))
+
+    def onecmd(self, line):
+        """
+        Run single command. Connections are not probed while the command
+        runs.
+        """
+        if self._keep_alive is None:
+            result = cmd.Cmd.onecmd(self, line)
+        else:
+            with self._keep_alive.lock:
+                result = cmd.Cmd.onecmd(self, line)
+        interval = self._parent.config.keep_alive_interval
+        if (   self._keep_alive is None and interval is not None
+           and self._parent.has_session):
+            self._keep_alive = KeepAlive(self._parent.session, interval)
+            self._keep_alive.start()
+        return result
+
+    def postloop(self):
+        """ Stop probing connections. """
+        if self._keep_alive is not None:
+            self._keep_alive.stop()
+
     def default(self, line):
         """
         This is run, when line contains unknown command to ``cmd.Cmd``. It
@@ -87,6 +126,8 @@ class Interactive(cmd.Cmd):
         :param line: (``str``) Line given to our shell.
         """
         line_parts = shlex.split(line)
+        if line_parts and line_parts[0].startswith(':'):
+            return self.run_meta_command(line_parts)
         try:
             # let's try to run registered subcommand
             return self.run_subcommand(line_parts)
@@ -146,8 +187,38 @@ class Interactive(cmd.Cmd):
             self.print_topics(
                     "Application commands (type help <topic>):",
                     cmd_names, 15, 80)
+            meta_names = sorted(  ':' + n[len('do__'):]
+                               for n in cmd.Cmd.get_names(self)
+                               if n.startswith('do__'))
+            self.print_topics("Meta commands:", meta_names, 15, 80)
         return
 
+    def do__session(self, _arg):
+        """
+        Show hosts of session with the age of their connections and round
+        trip times. Connections are probed first.
+        """
+        if not self._parent.has_session:
+            self.stdout.write("No session created yet.\n")
+            return
+        session = self._parent.session
+        session.probe_all()
+        unreachable = session.get_unreachable()
+        def _make_row(hostname, age, rtt):
+            """ Render single row of the table. """
+            if age is not None:
+                status = 'connected'
+            else:
+                status = unreachable.get(hostname, 'not connected')
+            return ( hostname, status
+                   , '-' if age is None else '%d s' % age
+                   , '-' if rtt is None else '%.1f ms' % (rtt * 1000))
+        formatter = TableFormatter(self.stdout,
+                no_headings=self._parent.config.no_headings)
+        formatter.produce_output(itertools.chain(
+            [NewTableHeaderCommand(('Host', 'Status', 'Age', 'RTT'))],
+            (_make_row(*stats) for stats in session.get_connection_stats())))
+
     def do_EOF(self, _arg):     #pylint: disable=C0103,R0201
         """
         Exit on End-Of-File.
@@ -30,17 +30,92 @@
 """
 Manager module for direct subcommands of lmi metacommand. Most of them are
 loaded from entry_points of installed python eggs.
+
+Searching the entry points requires ``pkg_resources`` to read metadata of
+all installed eggs and listing the commands with their descriptions
+requires to import all of them. Both are needed just once. Entry points and
+descriptions of commands are kept in an index file, which is used as long
+as the directories of ``sys.path`` and ``entry_points.txt`` files of
+installed eggs are not modified.
 """
 
-import pkg_resources
+import json
+import os
+import sys
 
 from lmi.scripts.common import Configuration
 from lmi.scripts.common import errors
 from lmi.scripts.common import get_logger
 from lmi.scripts.common.command import base
+from lmi.scripts.common.util import make_parent_dir
 
 LOG = get_logger(__name__)
 
+#: Names of directories with metadata of installed eggs.
+EGG_INFO_SUFFIXES = ('.egg-info', '.dist-info', 'EGG-INFO')
+
+def _get_mtime(path):
+    """
+    :returns: Modification time of file or ``None`` if it does not exist.
+    :rtype: float
+    """
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+def _get_index_key(namespace):
+    """
+    Make a key identifying installed entry points. It consists of
+    modification times of ``sys.path`` entries and of ``entry_points.txt``
+    files of eggs found in them. Any egg installed, removed or updated
+    changes the key.
+
+    :param string namespace: Namespace of entry points.
+    :rtype: list
+    """
+    stamps = []
+    for entry in sys.path:
+        entry = os.path.abspath(entry or os.curdir)
+        stamps.append([entry, _get_mtime(entry)])
+        try:
+            names = os.listdir(entry)
+        except OSError:
+            continue
+        for name in sorted(names):
+            if name.endswith(EGG_INFO_SUFFIXES):
+                path = os.path.join(entry, name, 'entry_points.txt')
+                mtime = _get_mtime(path)
+                if mtime is not None:
+                    stamps.append([path, mtime])
+    return [namespace, stamps]
+
+class _IndexedEntryPoint(object):
+    """
+    Provide an interface mocking an entry_point object for commands read
+    from index. Unlike entry points of ``pkg_resources``, requirements of
+    egg are not checked upon loading.
+
+    :param string name: Name of command.
+    :param string module_name: Module containing command.
+    :param list attrs: Path to the command class within module.
+    """
+
+    def __init__(self, name, module_name, attrs):
+        self.name = name
+        self.module_name = module_name
+        self.attrs = tuple(attrs)
+
+    def load(self):
+        """ Import the module and return command class. """
+        obj = __import__(self.module_name, fromlist=['__name__'])
+        for attr in self.attrs:
+            try:
+                obj = getattr(obj, attr)
+            except AttributeError:
+                raise ImportError("%r has no %r attribute" % (obj, attr))
+        return obj
+
 class _CustomCommandWrapper(object):
     """
     Provide an interface mocking an entry_point object for custom commands
@@ -75,16 +150,25 @@ class CommandManager(object):
 
     :param namespace: (``str``) Namespace, where commands are registered.
         For example ``lmi.scripts.cmd``.
+    :param index: (``str``) Path to the file with index of entry points.
+        Defaults to ``[Main] CommandIndex``.
     """
 
-    def __init__(self, namespace=None):
+    def __init__(self, namespace=None, index=None):
         if namespace is not None and not isinstance(namespace, basestring):
             raise TypeError("namespace must be a string")
         if namespace is None:
             namespace = Configuration.get_instance().get_safe(
                     "Main", "CommandNamespace")
+        if index is None:
+            index = Configuration.get_instance().command_index
         self._namespace = namespace
+        self._index = index
         self._commands = {}
+        # { command_name : summary, ... }
+        self._summaries = {}
+        # whether the index file needs to be written
+        self._index_modified = False
         self._load_commands()
 
     @property
@@ -103,8 +187,76 @@ class CommandManager(object):
         """ Gets command factory for name. """
         return self.find_command(cmd_name)
 
-    def _load_commands(self):
-        """ Loads commands from entry points under provided namespace. """
+    def _read_index(self, key):
+        """
+        Read entry points from index file.
+
+        :param list key: Key identifying installed entry points.
+        :returns: Whether the index is valid for given key.
+        :rtype: boolean
+        """
+        if not self._index or not os.path.exists(self._index):
+            return False
+        try:
+            with open(self._index, 'r') as index_file:
+                data = json.load(index_file)
+            if data.get('key') != key:
+                return False
+            commands = {}
+            summaries = {}
+            for name, (module_name, attrs, summary) in \
+                    data['commands'].items():
+                commands[name] = _IndexedEntryPoint(name, module_name, attrs)
+                if summary is not None:
+                    summaries[name] = summary
+        except (IOError, OSError, ValueError, TypeError, KeyError,
+                AttributeError) as exc:
+            LOG().warn('failed to read command index "%s": %s',
+                    self._index, exc)
+            return False
+        LOG().debug('commands read from index "%s"', self._index)
+        self._commands.update(commands)
+        self._summaries.update(summaries)
+        return True
+
+    def save_index(self):
+        """
+        Write entry points of loaded commands and their summaries to index
+        file, if modified.
+        """
+        if not self._index or not self._index_modified:
+            return
+        commands = {}
+        for name, epoint in self._commands.items():
+            if isinstance(epoint, _CustomCommandWrapper):
+                continue
+            commands[name] = [epoint.module_name, list(epoint.attrs),
+                    self._summaries.get(name)]
+        try:
+            make_parent_dir(self._index)
+            tmp_path = '%s.%d.tmp' % (self._index, os.getpid())
+            with open(tmp_path, 'w') as index_file:
+                json.dump({ 'key'      : _get_index_key(self._namespace)
+                          , 'commands' : commands }, index_file)
+            os.rename(tmp_path, self._index)
+        except (IOError, OSError) as exc:
+            LOG().warn('failed to write command index "%s": %s',
+                    self._index, exc)
+        self._index_modified = False
+
+    def _load_commands(self, use_index=True):
+        """
+        Loads commands from entry points under provided namespace.
+
+        :param boolean use_index: Whether the commands may be read from
+            index file instead of searching for entry points.
+        """
+        if self._index is not None:
+            if use_index and self._read_index(
+                    _get_index_key(self._namespace)):
+                return
+            self._index_modified = True
+
         def _add_entry_point(epoint):
             """
             Convenience function taking an entry point, making some name
@@ -120,13 +272,14 @@ class CommandManager(object):
                 LOG().debug('found command "%s"', epoint.name)
                 self._commands[epoint.name] = epoint
 
+        import pkg_resources
         for entry_point in pkg_resources.iter_entry_points(self._namespace):
             if isinstance(entry_point, dict):
                 for epoint in entry_point.values():
                     _add_entry_point(epoint)
             else:
                 _add_entry_point(entry_point)
-
+        self.save_index()
 
     def add_command(self, name, cmd_class):
         """
@@ -159,6 +312,27 @@ class CommandManager(object):
         except KeyError:
             raise errors.LmiCommandNotFound(cmd_name)
 
+    def get_summary(self, cmd_name):
+        """
+        Get the first line of command's description. Summaries of commands
+        loaded from entry points are remembered in index, so the commands
+        do not need to be loaded next time. Call :py:meth:`save_index` to
+        write them.
+
+        :param cmd_name: (``str``) Name of command.
+        :rtype: (``str``) Summary of command.
+        """
+        try:
+            return self._summaries[cmd_name]
+        except KeyError:
+            pass
+        summary = self.find_command(cmd_name).get_description() \
+                .strip().split("\n", 1)[0]
+        if not isinstance(self._commands[cmd_name], _CustomCommandWrapper):
+            self._summaries[cmd_name] = summary
+            self._index_modified = True
+        return summary
+
     def reload_commands(self, keep_custom=True):
         """
         Flushes all commands and reloads entry points.
@@ -172,6 +346,7 @@ class CommandManager(object):
         else:
             keep = {}
         self._commands = {}
-        self._load_commands()
+        self._summaries = {}
+        self._load_commands(use_index=False)
         self._commands.update(keep)
 
@@ -0,0 +1,116 @@
+# Copyright (c) 2013, Red Hat, Inc. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of the FreeBSD Project.
+#
+# Authors: Michal Minar <miminar@redhat.com>
+#
+"""
+Module running a pager for the output of ``lmi`` meta-command.
+"""
+
+import errno
+import os
+import subprocess
+
+from lmi.scripts.common import errors
+from lmi.scripts.common import get_logger
+
+LOG = get_logger(__name__)
+
+#: Pager used, when neither configured nor given in ``PAGER`` environment
+#: variable.
+DEFAULT_PAGER = 'less'
+
+class Pager(object):
+    """
+    Pager process reading the standard output of ``lmi``. Unless ``LESS``
+    environment variable is set, ``less`` is told to quit if the output fits
+    the screen, to pass colors and not to clear the screen.
+
+    The object is used as the output stream itself. The process is started
+    with the first write. Until then the terminal is left to ``lmi``, so
+    the user can be asked for credentials while hosts are being connected.
+
+    :param string command: Shell command running the pager.
+    """
+
+    def __init__(self, command):
+        self._command = command
+        self._process = None
+
+    @property
+    def started(self):
+        """ Whether the pager process is running. """
+        return self._process is not None
+
+    @property
+    def stdin(self):
+        """
+        Stream read by the pager. The pager is started, when accessed for
+        the first time.
+
+        :rtype: file
+        """
+        if self._process is None:
+            env = os.environ.copy()
+            env.setdefault('LESS', 'FRX')
+            try:
+                self._process = subprocess.Popen(self._command, shell=True,
+                        stdin=subprocess.PIPE, env=env)
+            except OSError as exc:
+                raise errors.LmiError('failed to run pager "%s": %s'
+                        % (self._command, exc))
+            LOG().debug('started pager "%s" with pid %d',
+                    self._command, self._process.pid)
+        return self._process.stdin
+
+    def write(self, data):
+        """ Write the data to the pager, starting it if needed. """
+        self.stdin.write(data)
+
+    def flush(self):
+        """ Flush the data written to the pager, if started. """
+        if self._process is not None:
+            self._process.stdin.flush()
+
+    def close(self):
+        """
+        Close the output and wait until the reader quits the pager.
+        """
+        if self._process is None:
+            return
+        try:
+            self._process.stdin.close()
+        except (IOError, OSError) as exc:
+            if exc.errno != errno.EPIPE:
+                raise
+        while True:
+            try:
+                self._process.wait()
+                break
+            except KeyboardInterrupt:
+                # let the pager handle it
+                continue
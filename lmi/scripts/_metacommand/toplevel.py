@@ -37,11 +37,13 @@ OpenLMI command line interface for CIM providers. It's functionality is
 composed of registered subcommands, operating on top of simple libraries,
 interfacing with particular OpenLMI profile providers.
 Works also in interactive mode which is entered, when <command> argument is
-omitted.
+omitted. Options modifying the output of commands like --limit can be given
+also after the arguments of command supporting them.
 
 Usage:
-    %(cmd)s [options] [-v]... [-h <host>]... <command> [<args> ...]
-    %(cmd)s [options] [-v]... [-h <host>]...
+    %(cmd)s [options] [-v]... [-h <host>]... [--group <group>]...
+        <command> [<args> ...]
+    %(cmd)s [options] [-v]... [-h <host>]... [--group <group>]...
     %(cmd)s (--help | --version)
 
 Options:
@@ -51,8 +53,31 @@ Options:
     -h --host <host>          Hostname of target system.
     --hosts-file <hosts>      Path to a file containing target hostnames.
                               Each hostname must be listed on a single line.
+                              Hosts can be sorted into [group] sections and
+                              followed by tags. Other files can be included
+                              with "@include <path>" line.
+    --group <group>           Use only hosts from hosts file belonging to
+                              given group or having given tag.
     --user <user>             Username used in connection to any target host.
     --same-credentials        Use the first credentials given for all hosts.
+    -j --jobs <jobs>          Maximum number of hosts processed at once.
+                              Defaults to 1.
+    --processes <count>       Split hosts among given number of processes,
+                              each processing up to --jobs hosts at once.
+                              Defaults to 1.
+    --backend <backend>       Implementation of concurrency used with more
+                              than one job. One of: threads, gevent.
+    --connect-timeout <seconds>
+                              Give up connecting to a host after given number
+                              of seconds. Applies only with more than one
+                              job.
+    --cached                  Print cached results of read-only commands, if
+                              they are fresh enough, instead of querying hosts.
+    --refresh                 Query hosts and store their results in cache
+                              regardless of cached ones.
+    --since-snapshot          Print just the rows of lister commands added,
+                              removed or changed since the previous run with
+                              this option.
     -n --noverify             Do not verify cimom's ssl certificate.
     -v                        Increase verbosity of output.
     --trace                   Show tracebacks on errors.
@@ -61,10 +86,37 @@ Options:
     -N --no-headings          Don't print table headings.
     -H --human-friendly       Print large values in human friendly units (i.e.
                               MB, GB, TB etc.)
-    -L --lister-format (table | csv)
-                              Print output of lister commands in CSV or table
-                              format. CSV format is more suitable for machine
-                              processing. Defaults to table.
+    -L --lister-format (table | csv | json | jsonl | binary)
+                              Print output of lister commands in table, CSV,
+                              JSON, JSON lines or binary columnar format. The
+                              latter ones are more suitable for machine
+                              processing. JSON and binary formats preserve
+                              types of values. Defaults to table.
+    --table-window <rows>     Compute column sizes of tables from given number
+                              of rows and print the rest as they come.
+    --limit <count>           Print at most given number of rows of lister
+                              commands for each host.
+    --offset <count>          Skip given number of rows of lister commands
+                              for each host.
+    --columns <columns>       Comma separated list of columns to print by
+                              lister commands. Values of other columns are
+                              not computed.
+    --where <expression>      Print just the rows of lister commands matching
+                              filter expression like 'Name like "ssh%%"
+                              and Status = "OK"'. Filtered by CIMOM if
+                              possible.
+    --aggregate               Print rows of lister commands from all hosts in
+                              a single table with hostname in the first column.
+    --group-by <column>       Collapse rows of lister commands from all hosts
+                              having the same value in given column and print
+                              their counts.
+    --output-dir <dir>        Write the output of each host to its own file in
+                              given directory together with an index of
+                              hosts, their status and timings.
+    --pager                   Show the output in a pager, when printed to
+                              terminal. Configured pager is used, then
+                              the one in PAGER environment variable or less.
+    --no-pager                Do not use pager even if configured.
     --help                    Show this text and quite.
     --version                 Print version of '%(cmd)s' in use and quit.
 """
@@ -146,6 +198,7 @@ class TopLevelCommand(base.LmiBaseCommand):
             return self.start_interactive_mode()
         else:
             LOG().debug('running command "%s"', options['<command>'])
+            self.app.use_pager()
             return self.run_subcommand(
                     options['<command>'], options['<args>'])
 
@@ -33,7 +33,7 @@ Meta-command utility module.
 
 import logging
 import logging.config
-import pkg_resources
+import os
 import re
 import sys
 import urlparse
@@ -45,6 +45,8 @@ PYTHON_EGG_NAME = "openlmi-scripts"
 
 RE_NETLOC = re.compile(r'^((?P<username>[^:@]+)(:(?P<password>[^@]+))?@)?'
         r'(?P<hostname>[^:]+)(:(?P<port>\d+))?$')
+RE_HOSTS_SECTION = re.compile(r'^\[\s*(?P<group>[^\]\s]+)\s*\]$')
+RE_HOSTS_COMMENT = re.compile(r'(^|\s)#.*$')
 
 DEFAULT_LOGGING_CONFIG = {
     'version' : 1,
@@ -129,6 +131,7 @@ def get_version(egg_name=PYTHON_EGG_NAME):
     Gets version string of any python egg. Defaults to the egg of current
     application.
     """
+    import pkg_resources
     return pkg_resources.get_distribution(egg_name).version
 
 def get_hosts_credentials(hostnames):
@@ -169,9 +172,68 @@ def get_hosts_credentials(hostnames):
         new_hostnames.append(hostname)
     return (new_hostnames, credentials)
 
+def iter_hosts_file(hosts_file, groups=None, tags=frozenset(),
+        _included=frozenset()):
+    """
+    Parse file with hostnames to connect to lazily. Each hostname occupies
+    single line optionally followed by whitespace separated tags. Hosts can
+    be sorted into groups with ``[group]`` lines. Hosts listed before the
+    first one don't belong to any group. Line ``@include <path>`` inserts
+    hosts from another file, whose hosts belong to current group. Relative
+    path is resolved against the directory of including file. Everything
+    following ``#`` at the beginning of line or after whitespace is
+    a comment. ::
+
+        server.example.com
+        [web]
+        root:password@web1.example.com production
+        web2.example.com staging
+        @include more-web-hosts
+
+    :param hosts_file: (``file``) File object opened for read.
+    :param groups: (``set``) Names of groups or tags. If given, only hosts
+        belonging to any of them are yielded.
+    :param tags: (``frozenset``) Tags assigned to all hosts in file.
+    :rtype: (``generator``) Pairs ``(hostname, creds)``, where ``creds``
+        is a pair ``(username, password)`` if supplied or ``None``.
+    """
+    path = os.path.abspath(getattr(hosts_file, 'name', '<hosts>'))
+    _included = _included | frozenset([path])
+    section = frozenset()
+    for line in hosts_file:
+        line = RE_HOSTS_COMMENT.sub('', line).strip()
+        if not line:
+            continue
+        match = RE_HOSTS_SECTION.match(line)
+        if match:
+            section = frozenset([match.group('group')])
+            continue
+        if line.startswith('@include'):
+            include_path = os.path.join(os.path.dirname(path),
+                    os.path.expanduser(line[len('@include'):].strip()))
+            if os.path.abspath(include_path) in _included:
+                LOG().warn('skipping recursive inclusion of hosts file'
+                        ' "%s"', include_path)
+                continue
+            try:
+                with open(include_path, 'r') as included_file:
+                    for item in iter_hosts_file(included_file, groups,
+                            tags | section, _included):
+                        yield item
+            except (OSError, IOError) as err:
+                LOG().error('could not read hosts file "%s": %s',
+                        include_path, err)
+            continue
+        parts = line.split()
+        if groups and not (tags | section | frozenset(parts[1:])) & groups:
+            continue
+        (hostname, ), creds = get_hosts_credentials(parts[:1])
+        yield hostname, creds.get(hostname)
+
 def parse_hosts_file(hosts_file):
     """
     Parse file with hostnames to connect to. Return list of parsed hostnames.
+    See :py:func:`iter_hosts_file` for its format.
 
     :param hosts_file: (``file``) File object openned for read.
         It containes hostnames. Each hostname occupies single line.
@@ -180,7 +242,10 @@ def parse_hosts_file(hosts_file):
         ``(username, password)`` to each hostname if supplied.
     """
     hostnames = []
-    for line in hosts_file.readlines():
-        hostnames.append(line.strip())
-    return get_hosts_credentials(hostnames)
+    credentials = {}
+    for hostname, creds in iter_hosts_file(hosts_file):
+        hostnames.append(hostname)
+        if creds is not None:
+            credentials[hostname] = creds
+    return hostnames, credentials
 
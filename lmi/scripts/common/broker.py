@@ -0,0 +1,654 @@
+# Copyright (c) 2013, Red Hat, Inc. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of the FreeBSD Project.
+#
+# Authors: Michal Minar <miminar@redhat.com>
+#
+"""
+Connection broker keeping connections to CIMOMs open across invocations of
+``lmi`` meta-command.
+
+``LMIConnection`` objects can not be shared between processes. The broker
+therefore keeps open the underlying HTTP(S) connections instead. For each
+pair of host and user it listens on a local port, forwarding *CIM-XML*
+requests through a pool of persistent connections to the CIMOM. Thus the
+TCP and TLS handshakes are paid only once, not for every request of every
+``lmi`` process.
+
+Local ports are reachable by any user of the machine. Therefore each
+endpoint accepts only requests authenticated with a random token in place
+of the password. The token is handed out over the control socket, which is
+accessible only to the user running the broker. Forwarded requests carry
+the real credentials, so the CIMOM authenticates them as usual. Passwords
+never cross the loopback in plain text.
+
+Broker is controlled over a Unix socket with simple line based protocol.
+Each request and reply is a single line containing a *JSON* object.
+Supported requests are:
+
+    ``{"op" : "open", "host" : <host>, "user" : <user>, ...}``
+        Further takes ``"password"`` and ``"verify"`` (boolean) keys.
+        Returns ``{"url" : <url>, "token" : <token>}`` with address of
+        local endpoint forwarding to given host and the password to use
+        for it.
+    ``{"op" : "status"}``
+        Returns ``{"endpoints" : [...], "connections" : <count>}``.
+    ``{"op" : "shutdown"}``
+        Terminates the broker.
+
+Failed request is replied with ``{"error" : <message>}``.
+"""
+
+USAGE_STRING = \
+"""
+Connection broker for lmi meta-command. It keeps connections to remote
+hosts open, so they can be reused by subsequent invocations of lmi.
+
+Usage:
+    %(cmd)s [options] [-v]...
+    %(cmd)s --help
+
+Options:
+    -c --config-file <config>   Path to a user configuration file. Options
+                                specified here override any settings of
+                                global configuration file.
+    -s --socket <path>          Path to the control socket.
+    --idle-timeout <seconds>    Close connections unused for given number
+                                of seconds.
+    --max-connections <count>   Maximum number of connections kept open.
+    -v                          Increase verbosity of output.
+    --help                      Show this text and quit.
+"""
+
+import base64
+import BaseHTTPServer
+import binascii
+import errno
+import hmac
+import httplib
+import json
+import os
+import socket
+import SocketServer
+import ssl
+import sys
+import threading
+import time
+import urlparse
+
+from lmi.scripts.common import Configuration
+from lmi.scripts.common import errors
+from lmi.scripts.common import get_logger
+
+LOG = get_logger(__name__)
+
+# headers, that apply to a single connection and must not be forwarded
+HOP_BY_HOP_HEADERS = {
+        'connection', 'keep-alive', 'proxy-authenticate',
+        'proxy-authorization', 'te', 'trailers', 'transfer-encoding',
+        'upgrade', 'host', 'content-length'}
+
+def _basic_authorization(username, password):
+    """
+    :returns: Value of ``Authorization`` header for basic authentication.
+    :rtype: string
+    """
+    return 'Basic ' + base64.b64encode('%s:%s' % (username, password))
+
+def parse_cimom_uri(uri):
+    """
+    Get the scheme, hostname and port of CIMOM out of its uri. Missing
+    parts are completed the same way as ``lmi.shell`` does.
+
+    :param string uri: Hostname with optional scheme and port.
+    :returns: Triple ``(scheme, hostname, port)``.
+    :rtype: tuple
+    """
+    if not uri.startswith('http://') and not uri.startswith('https://'):
+        uri = 'https://' + uri
+    parsed = urlparse.urlparse(uri)
+    port = parsed.port
+    if port is None:
+        port = 5989 if parsed.scheme == 'https' else 5988
+    return parsed.scheme, parsed.hostname, port
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn,
+        BaseHTTPServer.HTTPServer):
+    """ HTTP server handling each client in a separate thread. """
+    daemon_threads = True
+    # many lmi processes and jobs may connect at once
+    request_queue_size = 128
+
+class _ForwardHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Handler of requests made to local endpoint. It passes them to the
+    endpoint for forwarding.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):      #pylint: disable=C0103
+        """ Forward *CIM-XML* request to the CIMOM. """
+        length = int(self.headers.get('content-length', 0))
+        body = self.rfile.read(length)
+        if not self.server.endpoint.is_authorized(
+                self.headers.get('authorization', '')):
+            LOG().warn('refused unauthorized request for "%s" from %s',
+                    self.server.endpoint.host, self.address_string())
+            self.send_error(401)
+            return
+        # endpoint puts the real credentials in place of the token
+        headers = dict(  (k, v) for k, v in self.headers.items()
+                      if  k.lower() not in HOP_BY_HOP_HEADERS
+                      and k.lower() != 'authorization')
+        try:
+            status, reason, resp_headers, data = self.server.endpoint.forward(
+                    self.command, self.path, headers, body)
+        except (socket.error, httplib.HTTPException, errors.LmiError) as exc:
+            LOG().error('failed to forward request to "%s": %s',
+                    self.server.endpoint.host, exc)
+            self.send_error(502, str(exc))
+            return
+        self.send_response(status, reason)
+        for name, value in resp_headers:
+            if name.lower() not in HOP_BY_HOP_HEADERS:
+                self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, fmt, *args):
+        LOG().debug('%s: ' + fmt, self.address_string(), *args)
+
+class _Endpoint(object):
+    """
+    Local HTTP endpoint forwarding requests to single CIMOM through a pool
+    of persistent connections.
+
+    :param broker: Broker owning this endpoint.
+    :type broker: :py:class:`Broker`
+    :param string uri: Uri of CIMOM.
+    :param string username: Name of user logging in to CIMOM.
+    :param string password: Password of user.
+    :param boolean verify: Whether to verify server-side certificate.
+    """
+
+    def __init__(self, broker, uri, username, password, verify):
+        self._broker = broker
+        self.scheme, self.host, self.port = parse_cimom_uri(uri)
+        self.verify = verify
+        self.token = binascii.hexlify(os.urandom(16))
+        self._authorization = _basic_authorization(username, password)
+        self._expected = _basic_authorization(username, self.token)
+        # [ (connection, time_of_release), ... ]
+        self._idle = []
+        self._lock = threading.Lock()
+        self.last_used = time.time()
+        # number of requests being forwarded
+        self._in_flight = 0
+        # set when evicted, connections released afterwards are closed
+        self._retired = False
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), _ForwardHandler)
+        self._server.endpoint = self
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    @property
+    def url(self):
+        """ Address of local endpoint. """
+        return 'http://127.0.0.1:%d' % self._server.server_address[1]
+
+    @property
+    def idle_count(self):
+        """ Number of open connections not being used. """
+        return len(self._idle)
+
+    def is_authorized(self, authorization):
+        """
+        Check the ``Authorization`` header of request made to local
+        endpoint.
+
+        :param string authorization: Value of the header.
+        :returns: Whether it carries the token of this endpoint.
+        :rtype: boolean
+        """
+        return hmac.compare_digest(authorization, self._expected)
+
+    def _new_connection(self):
+        """ Make a new connection to CIMOM. """
+        if self.scheme == 'https':
+            kwargs = {}
+            if not self.verify:
+                context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+                context.verify_mode = ssl.CERT_NONE
+                kwargs['context'] = context
+            return httplib.HTTPSConnection(self.host, self.port, **kwargs)
+        return httplib.HTTPConnection(self.host, self.port)
+
+    def _acquire(self):
+        """
+        Get a connection to CIMOM. Idle ones are preferred.
+
+        :returns: Pair ``(connection, reused)``.
+        :rtype: tuple
+        """
+        with self._lock:
+            self.last_used = time.time()
+            self._in_flight += 1
+            if self._idle:
+                return self._idle.pop()[0], True
+        try:
+            self._broker.reserve()
+        except BaseException:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        return self._new_connection(), False
+
+    def _release(self, conn, reusable=True):
+        """
+        Return the connection to the pool or close it. It's always closed,
+        if the endpoint has been retired meanwhile.
+        """
+        with self._lock:
+            self._in_flight -= 1
+            self.last_used = time.time()
+            if reusable and not self._retired:
+                self._idle.append((conn, self.last_used))
+                return
+        conn.close()
+        self._broker.unreserve()
+
+    def retire(self, max_idle):
+        """
+        Mark the endpoint as no longer used, if it has not been used for
+        given time and no request is being forwarded.
+
+        :param float max_idle: Number of seconds since the last use.
+        :returns: Whether the endpoint has been retired. It shall be shut
+            down then.
+        :rtype: boolean
+        """
+        with self._lock:
+            if (  self._in_flight == 0
+               and time.time() - self.last_used > max_idle):
+                self._retired = True
+            return self._retired
+
+    def forward(self, method, path, headers, body):
+        """
+        Send the request to CIMOM and return its response.
+
+        :returns: Tuple ``(status, reason, headers, data)``.
+        :rtype: tuple
+        """
+        headers = dict(headers, Authorization=self._authorization)
+        while True:
+            conn, reused = self._acquire()
+            try:
+                conn.request(method, path, body, headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except (socket.error, httplib.HTTPException):
+                self._release(conn, False)
+                if reused:
+                    # the CIMOM may have closed the idle connection,
+                    # request has not been processed
+                    continue
+                raise
+            except BaseException:
+                self._release(conn, False)
+                raise
+            self._release(conn, not resp.will_close)
+            return resp.status, resp.reason, resp.getheaders(), data
+
+    def close_idle(self, max_idle=None):
+        """
+        Close idle connections.
+
+        :param float max_idle: Close only connections idle for more than
+            given number of seconds. All of them are closed if ``None``.
+        :returns: Number of closed connections.
+        :rtype: integer
+        """
+        now = time.time()
+        with self._lock:
+            to_close = [  c for c, t in self._idle
+                       if max_idle is None or now - t > max_idle]
+            self._idle = [  (c, t) for c, t in self._idle
+                         if c not in to_close]
+        for conn in to_close:
+            conn.close()
+            self._broker.unreserve()
+        return len(to_close)
+
+    def close_oldest_idle(self):
+        """
+        Close the least recently used idle connection.
+
+        :returns: Time of release of closed connection or ``None``, if there
+            is no idle connection.
+        """
+        with self._lock:
+            if not self._idle:
+                return None
+            conn, released = self._idle.pop(0)
+        conn.close()
+        self._broker.unreserve()
+        return released
+
+    def shutdown(self):
+        """
+        Stop the local endpoint and close all idle connections. Those still
+        in use are closed, when released.
+        """
+        with self._lock:
+            self._retired = True
+        self._server.shutdown()
+        self._server.server_close()
+        self.close_idle()
+
+class _ControlHandler(SocketServer.StreamRequestHandler):
+    """ Handler of requests on control socket. """
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            reply = self.server.broker.handle_request(request)
+        except Exception as exc:
+            LOG().error('failed to process request: %s', exc)
+            reply = {'error' : str(exc)}
+        self.wfile.write(json.dumps(reply) + '\n')
+
+class _ControlServer(SocketServer.ThreadingMixIn,
+        SocketServer.UnixStreamServer):
+    """ Server listening on control socket. """
+    daemon_threads = True
+
+class Broker(object):
+    """
+    Connection broker serving local endpoints, each forwarding to single
+    CIMOM.
+
+    :param string socket_path: Path to the control socket.
+    :param float idle_timeout: Number of seconds, after which unused
+        connections and endpoints are closed.
+    :param integer max_connections: Maximum number of connections open at
+        once. When reached, the least recently used idle connection is
+        closed or the request waits until some connection is released.
+    """
+
+    def __init__(self, socket_path, idle_timeout=300, max_connections=64):
+        self.socket_path = socket_path
+        self.idle_timeout = idle_timeout
+        self.max_connections = max_connections
+        # { (uri, user, password, verify) : _Endpoint, ... }
+        self._endpoints = {}
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._open_connections = 0
+        self._server = None
+
+    def reserve(self):
+        """
+        Account for a new connection to be opened. Blocks while the maximum
+        number of connections is reached and none of them can be closed.
+        """
+        with self._cond:
+            while self._open_connections >= self.max_connections:
+                self._cond.release()
+                try:
+                    closed = self._close_oldest_idle()
+                finally:
+                    self._cond.acquire()
+                if not closed:
+                    self._cond.wait(1)
+            self._open_connections += 1
+
+    def unreserve(self):
+        """ Account for a connection being closed. """
+        with self._cond:
+            self._open_connections -= 1
+            self._cond.notify()
+
+    def _close_oldest_idle(self):
+        """
+        Close the least recently used idle connection of all endpoints.
+
+        :returns: Whether any connection has been closed.
+        :rtype: boolean
+        """
+        with self._lock:
+            endpoints = [e for e in self._endpoints.values() if e.idle_count]
+        for endpoint in sorted(endpoints, key=lambda e: e.last_used):
+            if endpoint.close_oldest_idle() is not None:
+                return True
+        return False
+
+    def open(self, uri, user, password, verify=True):
+        """
+        Get local endpoint forwarding to given CIMOM. It's created if not
+        yet existing.
+
+        :param string uri: Uri or hostname of CIMOM.
+        :param string user: Name of user, whose requests will be forwarded.
+        :param string password: Password of user.
+        :param boolean verify: Whether to verify server-side certificate.
+        :returns: Pair ``(url, token)`` with address of local endpoint and
+            the token to use as a password when connecting to it.
+        :rtype: tuple
+        """
+        key = (uri, user, password, bool(verify))
+        with self._lock:
+            if key not in self._endpoints:
+                LOG().info('opening endpoint for "%s@%s"', user, uri)
+                self._endpoints[key] = _Endpoint(
+                        self, uri, user, password, verify)
+            endpoint = self._endpoints[key]
+            endpoint.last_used = time.time()
+            return endpoint.url, endpoint.token
+
+    def handle_request(self, request):
+        """
+        Process a request received on control socket.
+
+        :param dictionary request: Decoded request.
+        :returns: Reply to send back.
+        :rtype: dictionary
+        """
+        operation = request.get('op')
+        if operation == 'open':
+            url, token = self.open(request['host'], request.get('user', ''),
+                    request.get('password', ''), request.get('verify', True))
+            return {'url' : url, 'token' : token}
+        if operation == 'status':
+            with self._lock:
+                endpoints = [  {'host' : k[0], 'user' : k[1],
+                                'url' : e.url, 'idle' : e.idle_count}
+                            for k, e in self._endpoints.items()]
+            return { 'endpoints' : endpoints
+                   , 'connections' : self._open_connections}
+        if operation == 'shutdown':
+            threading.Thread(target=self._server.shutdown).start()
+            return {}
+        raise ValueError('unknown operation "%s"' % operation)
+
+    def evict_idle(self):
+        """
+        Close connections and endpoints unused for longer than
+        ``idle_timeout``. Endpoints forwarding a request are kept.
+        """
+        with self._lock:
+            for key, endpoint in self._endpoints.items():
+                endpoint.close_idle(self.idle_timeout)
+                if endpoint.retire(self.idle_timeout):
+                    LOG().info('closing idle endpoint for "%s@%s"',
+                            key[1], key[0])
+                    del self._endpoints[key]
+                    endpoint.shutdown()
+
+    def _evict_loop(self):
+        """ Thread body evicting idle connections periodically. """
+        while True:
+            time.sleep(min(self.idle_timeout, 30))
+            self.evict_idle()
+
+    def serve_forever(self):
+        """ Listen on control socket until shutdown is requested. """
+        directory = os.path.dirname(self.socket_path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        try:
+            os.unlink(self.socket_path)
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise
+        old_umask = os.umask(0o077)
+        try:
+            self._server = _ControlServer(self.socket_path, _ControlHandler)
+        finally:
+            os.umask(old_umask)
+        # the socket hands out tokens of endpoints, nobody else may use it
+        os.chmod(self.socket_path, 0o600)
+        self._server.broker = self
+        thread = threading.Thread(target=self._evict_loop)
+        thread.daemon = True
+        thread.start()
+        LOG().info('listening on "%s"', self.socket_path)
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            os.unlink(self.socket_path)
+            with self._lock:
+                for endpoint in self._endpoints.values():
+                    endpoint.shutdown()
+                self._endpoints.clear()
+
+class BrokerClient(object):
+    """
+    Client of connection broker used by :py:class:`Session` to obtain
+    local endpoints for remote hosts.
+
+    :param string socket_path: Path to the control socket of broker.
+    :param float timeout: Number of seconds to wait for a reply.
+    """
+
+    def __init__(self, socket_path, timeout=5):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    @classmethod
+    def attach(cls, socket_path):
+        """
+        Make a client of running broker.
+
+        :param string socket_path: Path to the control socket of broker.
+        :returns: Client object or ``None`` if the broker is not running.
+        :rtype: :py:class:`BrokerClient`
+        """
+        if not socket_path or not os.path.exists(socket_path):
+            return None
+        client = cls(socket_path)
+        try:
+            client.request(op='status')
+        except errors.LmiBrokerError as err:
+            LOG().warn('connection broker is not available: %s', err)
+            return None
+        LOG().debug('attached to connection broker at "%s"', socket_path)
+        return client
+
+    def request(self, **kwargs):
+        """
+        Send a request to broker and return its reply.
+
+        :returns: Decoded reply.
+        :rtype: dictionary
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+            sock.sendall(json.dumps(kwargs) + '\n')
+            reply = sock.makefile('r').readline()
+            reply = json.loads(reply)
+        except (socket.error, ValueError) as exc:
+            raise errors.LmiBrokerError(
+                    'broker request "%s" failed: %s' % (kwargs['op'], exc))
+        finally:
+            sock.close()
+        if 'error' in reply:
+            raise errors.LmiBrokerError(reply['error'])
+        return reply
+
+    def open(self, hostname, username, password, verify=True):
+        """
+        Get local endpoint forwarding to given host.
+
+        :param string hostname: Host to connect to.
+        :param string username: Name of user connecting.
+        :param string password: Password of user.
+        :param boolean verify: Whether to verify server-side certificate.
+        :returns: Pair ``(url, token)``. Address of local endpoint, that can
+            be passed to ``lmi.shell`` as an uri, and the token to pass
+            instead of the password.
+        :rtype: tuple
+        """
+        reply = self.request(op='open', host=hostname, user=username,
+                password=password, verify=verify)
+        return reply['url'], reply['token']
+
+def main(argv=sys.argv[1:]):
+    """
+    Entry point of ``lmi-broker`` command.
+    """
+    import docopt
+    from lmi.scripts._metacommand import util
+
+    options = docopt.docopt(
+            USAGE_STRING % {'cmd' : os.path.basename(sys.argv[0])}, argv)
+    conf_kwargs = {}
+    if options['--config-file']:
+        conf_kwargs['user_config_file_path'] = options['--config-file']
+    config = Configuration.get_instance(**conf_kwargs)
+    config.verbosity = options['-v']
+    util.setup_logging(config)
+    socket_path = options['--socket'] or config.broker_socket
+    try:
+        idle_timeout = float(options['--idle-timeout']
+                or config.get_safe('Broker', 'IdleTimeout', float, 300))
+        max_connections = int(options['--max-connections']
+                or config.get_safe('Broker', 'MaxConnections', int, 64))
+    except ValueError as err:
+        LOG().critical('invalid option: %s', err)
+        return 1
+    broker = Broker(socket_path, idle_timeout, max_connections)
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
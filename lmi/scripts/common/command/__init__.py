@@ -46,3 +46,4 @@ from lmi.scripts.common.command.command import LmiCheckResult
 
 from lmi.scripts.common.command.helper import make_list_command
 from lmi.scripts.common.command.helper import register_subcommands
+from lmi.scripts.common.command.util import get_property_list
@@ -0,0 +1,142 @@
+# Copyright (c) 2013, Red Hat, Inc. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of the FreeBSD Project.
+#
+# Authors: Michal Minar <miminar@redhat.com>
+#
+"""
+Functions merging results of lister commands from many hosts into a
+single table. They implement ``--aggregate`` and ``--group-by`` options.
+
+Results are given as pairs ``(hostname, rows)``, where rows is a list or
+generator of rows possibly interleaved with instances of
+:py:class:`lmi.scripts.common.formatter.FormatterCommand`. Both functions
+return a generator of rows, that can be passed to
+:py:meth:`lmi.scripts.common.formatter.ListFormatter.produce_output`.
+"""
+
+import collections
+
+from lmi.scripts.common import errors
+from lmi.scripts.common import formatter
+from lmi.scripts.common.command import util
+
+#: Name of column prepended to aggregated rows.
+HOST_COLUMN = 'Host'
+
+def _host_rows(results):
+    """
+    Prepend hostname to each row of results.
+
+    :returns: Triples ``(title, columns, row)``, where ``title`` and
+        ``columns`` belong to the table of row. Columns include
+        :py:data:`HOST_COLUMN`.
+    :rtype: generator
+    """
+    for hostname, rows in results:
+        title = None
+        columns = (HOST_COLUMN, )
+        try:
+            for row in rows:
+                if isinstance(row, formatter.NewTableCommand):
+                    title = row.title
+                elif isinstance(row, formatter.NewTableHeaderCommand):
+                    columns = (HOST_COLUMN, ) + tuple(row.columns or ())
+                elif not isinstance(row, formatter.FormatterCommand):
+                    yield title, columns, (hostname, ) + tuple(row)
+        finally:
+            # stop making requests to host, if the output is closed
+            close = getattr(rows, 'close', None)
+            if close is not None:
+                close()
+
+def aggregate_rows(results):
+    """
+    Merge rows of all hosts into a single table with hostname in the first
+    column. Tables of hosts having the same title and column names are
+    merged into one.
+
+    :param results: Pairs ``(hostname, rows)``.
+    :type results: list or generator
+    :rtype: generator
+    """
+    current = None
+    for title, columns, row in _host_rows(results):
+        if (title, columns) != current:
+            if title is not None:
+                yield formatter.NewTableCommand(title)
+            yield formatter.NewTableHeaderCommand(columns)
+            current = (title, columns)
+        yield row
+
+def _column_index(columns, column):
+    """
+    :returns: Index of column with given name to group rows by.
+    :rtype: integer
+    """
+    index = util.column_index(columns, column)
+    if index is None:
+        raise errors.LmiInvalidOptions('no column "%s" to group rows by,'
+                ' available columns are: %s' % (column, ", ".join(columns)))
+    return index
+
+def group_rows(results, column):
+    """
+    Collapse rows of all hosts having the same value in given column into
+    a single row with the number of such rows and the number of hosts they
+    come from. Groups are kept in a hash table, memory use is thus given by
+    the number of distinct values, not by the number of rows. Rows are
+    yielded in the order of first occurence of their values.
+
+    :param results: Pairs ``(hostname, rows)``.
+    :type results: list or generator
+    :param string column: Name of column to group by. It may be also
+        :py:data:`HOST_COLUMN`.
+    :rtype: generator
+    """
+    # value -> [row count, host count, last hostname]
+    groups = collections.OrderedDict()
+    columns = None
+    index = None
+    for _title, row_columns, row in _host_rows(results):
+        if row_columns is not columns:
+            index = _column_index(row_columns, column)
+            columns = row_columns
+        value = row[index]
+        if isinstance(value, list):
+            value = tuple(value)
+        group = groups.get(value)
+        if group is None:
+            groups[value] = [1, 1, row[0]]
+        else:
+            group[0] += 1
+            if group[2] != row[0]:
+                group[1] += 1
+                group[2] = row[0]
+    name = column if columns is None else columns[index]
+    yield formatter.NewTableHeaderCommand((name, 'Count', 'Hosts'))
+    for value, (count, hosts, _hostname) in groups.iteritems():
+        yield (value, count, hosts)
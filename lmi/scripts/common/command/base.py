@@ -98,6 +98,16 @@ class LmiBaseCommand(object):
         """
         return False
 
+    @classmethod
+    def output_options(cls):
+        """
+        :returns: Names of options modifying the output, which are accepted
+            after the arguments of this command. They are listed in
+            :py:data:`lmi.scripts.common.command.util.OUTPUT_OPTIONS`.
+        :rtype: list
+        """
+        return []
+
     @classmethod
     def child_commands(cls):
         """
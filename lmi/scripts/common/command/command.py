@@ -33,22 +33,42 @@ Module with abstractions for representing subcommand of lmi meta-command.
 
 import abc
 import inspect
+import functools
 import re
+import threading
 from docopt import docopt
 
-from lmi.shell import LMIUtil
-from lmi.shell import LMIConnection
 from lmi.scripts.common import Configuration
 from lmi.scripts.common import get_logger
 from lmi.scripts.common import errors
+from lmi.scripts.common import executor
 from lmi.scripts.common import formatter
+from lmi.scripts.common import resultcache
+from lmi.scripts.common import snapshot
+from lmi.scripts.common import where
 from lmi.scripts.common.session import Session
+from lmi.scripts.common.command import aggregate
 from lmi.scripts.common.command import base
 from lmi.scripts.common.command import meta
+from lmi.scripts.common.command import outputdir
 from lmi.scripts.common.command import util
 
 LOG = get_logger(__name__)
 
+#: Name of optional argument of associated function of lister command. It
+#: gets the maximum number of objects needed to print, when ``--limit`` is
+#: given. The function may stop enumeration early or keep just the first
+#: objects instead of sorting all of them.
+MAX_OBJECTS_ARG = 'max_objects'
+#: Name of optional argument of associated function of instance lister
+#: getting the names of properties to render.
+PROPERTY_LIST_ARG = 'property_list'
+#: Name of optional argument of associated function of instance lister
+#: getting the condition of WQL query instances shall satisfy.
+WHERE_ARG = 'where'
+#: Optional arguments of associated function passed just by lister commands.
+HINT_ARGS = (MAX_OBJECTS_ARG, PROPERTY_LIST_ARG, WHERE_ARG)
+
 def opt_name_sanitize(opt_name):
     """
     Make a function parameter name out of option name. This replaces any
@@ -142,6 +162,13 @@ class LmiCommandMultiplexer(base.LmiBaseCommand):
     def is_end_point(cls):
         return False
 
+    @classmethod
+    def output_options(cls):
+        names = set()
+        for cmd_cls in cls.child_commands().values():
+            names.update(cmd_cls.output_options())
+        return sorted(names)
+
     def run_subcommand(self, cmd_name, args):
         """
         Pass control to a subcommand identified by given name.
@@ -177,6 +204,9 @@ class LmiCommandMultiplexer(base.LmiBaseCommand):
         if not isinstance(args, (list, tuple)):
             raise TypeError("args must be a list")
         full_args = self.cmd_name_args[1:] + args
+        # they are handled by subcommand
+        full_args = util.pop_output_options(full_args,
+                self.output_options(), self.get_usage())[0]
         # check the --help ourselves (the default docopt behaviour checks
         # also for --version)
         docopt_kwargs = {
@@ -317,6 +347,9 @@ class LmiEndPointCommand(base.LmiBaseCommand):
             del kwargs[opt_name]
         args = []
         for arg_name in argspec.args[pos_args_count:]:
+            if arg_name in HINT_ARGS and arg_name not in kwargs:
+                # passed by lister command, if needed
+                continue
             if arg_name not in kwargs:
                 raise errors.LmiCommandError(
                     self.__module__, self.__class__.__name__,
@@ -421,12 +454,26 @@ class LmiEndPointCommand(base.LmiBaseCommand):
         :returns: Exit code of application.
         :rtype: integer
         """
+        args, output_options = util.pop_output_options(
+                args, self.output_options(), self.get_usage())
         options = self._parse_args(args)
         self.verify_options(options)
         self.transform_options(options)
         self._options = options.copy()
         args, kwargs = self._make_end_point_args(options)
-        return self.run_with_args(args, kwargs)
+        config = self.app.config
+        # options following the arguments apply just to this command
+        saved = dict((util.OUTPUT_OPTIONS[name][0],
+                getattr(config, util.OUTPUT_OPTIONS[name][0]))
+                for name in output_options)
+        try:
+            util.set_output_options(config, output_options)
+            return self.run_with_args(args, kwargs)
+        finally:
+            for attr, value in saved.items():
+                setattr(config, attr, value)
+            if self._formatter is not None:
+                self._formatter.finish()
 
     def _print_errors(self, errors):
         """
@@ -454,6 +501,10 @@ class LmiSessionCommand(LmiEndPointCommand):
     """
     __metaclass__ = meta.SessionCommandMetaClass
 
+    def __init__(self, *args, **kwargs):
+        super(LmiSessionCommand, self).__init__(*args, **kwargs)
+        self._executor = None
+
     @classmethod
     def cim_namespace(cls):
         """
@@ -470,6 +521,24 @@ class LmiSessionCommand(LmiEndPointCommand):
         """
         return Configuration.get_instance().namespace
 
+    @classmethod
+    def cache_ttl(cls):
+        """
+        Number of seconds, the results of command may be reused from result
+        cache. It's overriden by ``CACHE_TTL`` property of command.
+
+        :returns: Number of seconds or ``None`` if the results shall not be
+            cached.
+        :rtype: integer
+        """
+        return None
+
+    @classmethod
+    def output_options(cls):
+        if cls.cache_ttl() is None:
+            return []
+        return ['--cached', '--refresh']
+
     @classmethod
     def dest_pos_args_count(cls):
         """
@@ -497,7 +566,142 @@ class LmiSessionCommand(LmiEndPointCommand):
         raise NotImplementedError("process_session must be overriden"
                 " in subclass")
 
+    def executor_factory(self):
+        """
+        Subclasses may override this method to provide different executor
+        factory for processing hosts of session.
+
+        :returns: Subclass of
+            :py:class:`lmi.scripts.common.executor.Executor` or a callable
+            creating its instance given the number of jobs.
+        """
+        config = self.app.config
+        factory = executor.SerialExecutor
+        if config.jobs > 1:
+            if config.adaptive_jobs or config.subnet_jobs:
+                factory = functools.partial(executor.AdaptiveExecutor,
+                        subnet_jobs=config.subnet_jobs,
+                        latency_factor=config.latency_factor,
+                        adaptive=config.adaptive_jobs)
+            else:
+                factory = executor.ThreadPoolExecutor
+        if config.processes > 1:
+            return functools.partial(executor.ProcessPoolExecutor,
+                    processes=config.processes, executor_factory=factory)
+        return factory
+
+    @property
+    def executor(self):
+        """
+        Return instance of executor processing hosts of session.
+
+        :rtype: :py:class:`lmi.scripts.common.executor.Executor`
+        """
+        if self._executor is None:
+            self._executor = self.executor_factory()(self.app.config.jobs)
+        return self._executor
+
+    def result_key(self):
+        """
+        :returns: Key identifying results of command invoked with current
+            options. It's used to store them in result cache and snapshots.
+        :rtype: string
+        """
+        config = self.app.config
+        parts = [self.__class__.__module__, self.__class__.__name__,
+                self._options, self.cim_namespace(), config.human_friendly]
+        if config.columns:
+            # just the selected columns are rendered
+            parts.append(config.columns)
+        if config.where:
+            # rows may be filtered by CIMOM
+            parts.append(config.where)
+        return resultcache.make_key(*parts)
+
+    def cached_action(self, take_action, session=None):
+        """
+        Make the function collecting results of single host use result
+        cache. Results are looked up in the cache if ``--cached`` option is
+        given. They are obtained from host and stored otherwise.
+
+        :param take_action: Function taking connection and returning the
+            list of rows to print.
+        :param session: Session of processed hosts. If given, hosts with
+            cached results are not connected. Those are passed to returned
+            function as :py:class:`lmi.scripts.common.executor.RemoteHost`
+            objects.
+        :type session: :py:class:`lmi.scripts.common.session.Session`
+        :returns: Function with the same signature as *take_action*. It's
+            *take_action* itself, if the results of command are not to be
+            cached.
+        :rtype: callable
+        """
+        config = self.app.config
+        ttl = self.cache_ttl()
+        if (   ttl is None
+           or not (config.use_result_cache or config.refresh_results)
+           or self.app.result_cache is None):
+            return take_action
+        cache = self.app.result_cache
+        key = self.result_key()
+        # { hostname : data, ... } of hosts found in cache before connecting
+        hits = {}
+        def _lookup(hostname):
+            """ Look up the results of host, that is not yet connected. """
+            data = cache.get(hostname, key, ttl)
+            if data is None:
+                return False
+            hits[hostname] = data
+            return True
+        if session is not None and not config.refresh_results:
+            session.offline_callback = _lookup
+        def _cached_action(connection):
+            """ Collect results of single host unless cached. """
+            if not config.refresh_results:
+                data = hits.pop(connection.hostname, None)
+                if data is None:
+                    data = cache.get(connection.hostname, key, ttl)
+                if data is not None:
+                    LOG().debug('using cached result of host "%s"',
+                            connection.hostname)
+                    return data
+            data = take_action(connection)
+            if not isinstance(data, (list, tuple, dict)):
+                data = list(data)
+            cache.set(connection.hostname, key, data)
+            return data
+        return _cached_action
+
+    def produce_host_outputs(self, session, take_action):
+        """
+        Write results of each host to its own file in the directory given
+        with ``--output-dir`` option. Each host gets its own formatter. Its
+        file is written by the worker processing the host as soon as the
+        results are obtained. Index of hosts is written at the end.
+
+        :param session: Session object with set of hosts.
+        :type session: :py:class:`lmi.scripts.common.session.Session`
+        :param take_action: Function taking connection and returning the
+            data to print.
+        :returns: Exit code of application.
+        :rtype: integer
+        """
+        config = self.app.config
+        factory = self.formatter_factory()
+        outputdir.prepare(config.output_dir)
+        def _write_host(connection):
+            """ Write results of single host to its file. """
+            return outputdir.write_host(config.output_dir,
+                    connection.hostname,
+                    lambda out: factory(out, no_headings=config.no_headings),
+                    lambda: take_action(connection), config.trace)
+        entries = [entry for _, entry in self.executor.imap(_write_host,
+                session, lambda e: e['status'] != outputdir.STATUS_OK)]
+        outputdir.write_index(config.output_dir, session, entries)
+        return 0
+
     def execute_on_connection(self, connection, *args, **kwargs):
+        from lmi.shell import LMIConnection, LMIUtil
         if not isinstance(connection, LMIConnection):
             raise TypeError("expected an instance of LMIConnection for"
                     " connection argument, not %s" % repr(connection))
@@ -508,10 +712,188 @@ class LmiSessionCommand(LmiEndPointCommand):
         return self.execute(connection, *args, **kwargs)
 
     def run_with_args(self, args, kwargs):
-        self.process_session(self.app.session, args, kwargs)
+        unsupported = [name for name in self.app.output_options
+                if name not in self.output_options()]
+        if unsupported:
+            raise errors.LmiInvalidOptions('%s not supported by "%s"'
+                    ' command' % (', '.join(unsupported), self.cmd_full_name))
+        session = self.app.session
+        if self.executor.concurrent and session.has_many_hosts:
+            # connect hosts concurrently in batches ahead of processing
+            session.prefetch = self.executor.jobs
+        try:
+            self.process_session(session, args, kwargs)
+        finally:
+            # set by cached_action() just for this command
+            session.offline_callback = None
+
+def _close_rows(rows):
+    """
+    Close the generator of rows, so it does not make any more requests to
+    the host. Lists and other iterables are left alone.
+    """
+    close = getattr(rows, 'close', None)
+    if close is not None:
+        close()
+
+def _iter_rows(header, data, render=None):
+    """
+    Yield header command followed by rows of data. Data are closed
+    together with returned generator.
+
+    :param header: Command to yield first.
+    :type header: :py:class:`lmi.scripts.common.formatter.NewTableHeaderCommand`
+    :param data: Rows or instances.
+    :type data: list or generator
+    :param callable render: Function making a row out of item of data.
+    :rtype: generator
+    """
+    try:
+        yield header
+        if render is None:
+            for row in data:
+                yield row
+        else:
+            for item in data:
+                yield render(item)
+    finally:
+        _close_rows(data)
+
+def _slice_rows(rows, offset, limit):
+    """
+    Skip the first rows and yield at most given number of the following
+    ones. Formatter commands are passed through. Rows are closed once the
+    limit is reached.
+
+    :param rows: Rows to slice.
+    :type rows: list or generator
+    :param integer offset: Number of rows to skip.
+    :param integer limit: Maximum number of rows to yield. ``None`` means
+        no limit.
+    :rtype: generator
+    """
+    try:
+        if limit == 0:
+            return
+        count = 0
+        for row in rows:
+            if isinstance(row, formatter.FormatterCommand):
+                yield row
+            elif offset > 0:
+                offset -= 1
+            else:
+                yield row
+                count += 1
+                if count == limit:
+                    break
+    finally:
+        _close_rows(rows)
+
+def _select_columns(columns, selected):
+    """
+    :param list columns: Column names of table.
+    :param list selected: Names of columns to print in desired order.
+    :returns: Indices of selected columns.
+    :rtype: list
+    """
+    indices = []
+    for name in selected:
+        index = util.column_index(columns, name)
+        if index is None:
+            raise errors.LmiInvalidOptions('no column "%s" to print,'
+                    ' available columns are: %s' % (name, ", ".join(columns)))
+        indices.append(index)
+    return indices
+
+def _project_rows(rows, select):
+    """
+    Select columns of rows preceded with table header commands. Rows not
+    preceded with a header can not be projected.
+
+    :param rows: Rows of lister command interleaved with formatter commands.
+    :type rows: list or generator
+    :param callable select: Function taking column names of table and
+        returning indices of columns to keep.
+    :rtype: generator
+    """
+    indices = None
+    try:
+        for row in rows:
+            if isinstance(row, formatter.NewTableHeaderCommand):
+                indices = select(row.columns)
+                row = formatter.NewTableHeaderCommand(
+                        [row.columns[i] for i in indices])
+            elif not isinstance(row, formatter.FormatterCommand):
+                if indices is None:
+                    raise errors.LmiInvalidOptions('--columns can not be'
+                            ' used, columns of command are not named')
+                row = tuple([row[i] for i in indices])
+            yield row
+    finally:
+        _close_rows(rows)
+
+def _filter_rows(rows, local_filter):
+    """
+    Select rows matching filter expression. Columns are looked up in the
+    last table header.
+
+    :param rows: Rows of lister command interleaved with formatter commands.
+    :type rows: list or generator
+    :param local_filter: Filter to evaluate.
+    :type local_filter: :py:class:`lmi.scripts.common.where.Filter`
+    :rtype: generator
+    """
+    indices = None
+    current = [None]
+    get_value = lambda name: current[0][indices[name]]
+    try:
+        for row in rows:
+            if isinstance(row, formatter.NewTableHeaderCommand):
+                indices = {}
+                for name in local_filter.names():
+                    index = util.column_index(row.columns, name)
+                    if index is None:
+                        raise errors.LmiInvalidOptions('no column "%s" to'
+                                ' filter by, available columns are: %s'
+                                % (name, ", ".join(row.columns)))
+                    indices[name] = index
+            elif not isinstance(row, formatter.FormatterCommand):
+                if indices is None:
+                    raise errors.LmiInvalidOptions('--where can not be'
+                            ' used, columns of command are not named')
+                current[0] = row
+                if not local_filter.evaluate(get_value):
+                    continue
+            yield row
+    finally:
+        _close_rows(rows)
+
+def _consume_rows(rows, cancelled):
+    """
+    Make a list of rows unless cancelled.
+
+    :param rows: Rows to consume.
+    :type rows: list or generator
+    :param cancelled: Event set, when the rows are no more needed.
+    :type cancelled: :py:class:`threading.Event`
+    :rtype: list
+    """
+    result = []
+    for row in rows:
+        if cancelled.is_set():
+            _close_rows(rows)
+            raise errors.LmiOutputClosed('processing cancelled')
+        result.append(row)
+    return result
 
 class LmiBaseListerCommand(LmiSessionCommand):
 
+    @classmethod
+    def output_options(cls):
+        return LmiSessionCommand.output_options.im_func(cls) + [
+                '--limit', '--offset', '--columns', '--where', '--aggregate',
+                '--group-by', '--since-snapshot']
+
     @classmethod
     def get_columns(cls):
         """
@@ -523,11 +905,133 @@ class LmiBaseListerCommand(LmiSessionCommand):
         """
         return None
 
+    @classmethod
+    def get_column_properties(cls):
+        """
+        :returns: Names of instance properties rendered in columns without
+            any transformation indexed by column names. ``PROPERTIES``
+            property of instance lister will be converted to this class
+            method. Filter expressions on these columns can be evaluated
+            by CIMOM. ``None`` means there are no such columns.
+        :rtype: dictionary
+        """
+        return None
+
+    @classmethod
+    def get_property_list(cls, indices=None):
+        """
+        :param list indices: Indices of columns to render. All columns are
+            rendered if ``None``.
+        :returns: Names of instance properties needed to render the rows.
+            ``PROPERTIES`` property of instance lister will be converted to
+            this class method. If ``None``, all the properties may be needed.
+        :rtype: list or None
+        """
+        return None
+
     def formatter_factory(self):
-        if self.app.config.lister_format == Configuration.LISTER_FORMAT_CSV:
+        lister_format = self.app.config.lister_format
+        if lister_format == Configuration.LISTER_FORMAT_CSV:
             return formatter.CsvFormatter
+        elif lister_format == Configuration.LISTER_FORMAT_JSON:
+            return formatter.JsonFormatter
+        elif lister_format == Configuration.LISTER_FORMAT_JSON_LINES:
+            return formatter.JsonLinesFormatter
+        elif lister_format == Configuration.LISTER_FORMAT_BINARY:
+            return formatter.BinaryFormatter
         else:
-            return formatter.TableFormatter
+            return functools.partial(formatter.TableFormatter,
+                    window=self.app.config.table_window)
+
+    def max_objects(self):
+        """
+        Maximum number of objects needed from associated function to print
+        the rows selected with ``--limit`` and ``--offset`` options.
+
+        :returns: Number of objects or ``None`` if all are needed or the
+            associated function does not accept ``max_objects`` argument.
+        :rtype: integer
+        """
+        limit = self.app.config.limit
+        if limit is None or not self._dest_accepts(MAX_OBJECTS_ARG):
+            return None
+        return self.app.config.offset + limit
+
+    def column_indices(self, columns):
+        """
+        Select columns to render with ``--columns`` option. Columns needed
+        to evaluate the filter expression given with ``--where`` option
+        locally follow the selected ones. They are dropped after filtering.
+
+        :param list columns: Column names of table.
+        :returns: Indices of columns to render or ``None``, if all columns
+            shall be rendered.
+        :rtype: list
+        """
+        selected = self.app.config.columns
+        if not selected:
+            return None
+        indices = _select_columns(columns, selected)
+        _, local_filter = self.query_filter()
+        if local_filter is not None:
+            for name in local_filter.names():
+                index = util.column_index(columns, name)
+                if index is None:
+                    raise errors.LmiInvalidOptions('no column "%s" to'
+                            ' filter by, available columns are: %s'
+                            % (name, ", ".join(columns)))
+                if index not in indices:
+                    indices.append(index)
+        return indices
+
+    def property_list(self):
+        """
+        Names of instance properties passed to associated function in
+        ``property_list`` argument. Function can pass them as a
+        ``PropertyList`` to enumeration of instances, so that properties
+        not rendered are not transferred from host.
+
+        :returns: List of property names or ``None`` if all properties may
+            be needed or the associated function does not accept
+            ``property_list`` argument.
+        :rtype: list
+        """
+        if not self._dest_accepts(PROPERTY_LIST_ARG):
+            return None
+        columns = self.get_columns()
+        if columns is None:
+            return self.get_property_list()
+        return self.get_property_list(self.column_indices(columns))
+
+    def query_filter(self):
+        """
+        Split the filter expression given with ``--where`` option into
+        a condition of WQL query passed to associated function in ``where``
+        argument and the rest evaluated locally on rendered rows.
+
+        :returns: A pair ``(condition, local_filter)``. Condition is
+            ``None``, if no part of expression can be evaluated by CIMOM
+            or the associated function does not accept ``where`` argument.
+            Local filter is an instance of
+            :py:class:`lmi.scripts.common.where.Filter` or ``None``.
+        :rtype: tuple
+        """
+        expression = self.app.config.where
+        if not expression:
+            return None, None
+        query_filter = where.Filter(expression)
+        properties = self.get_column_properties()
+        if not properties or not self._dest_accepts(WHERE_ARG):
+            return None, query_filter
+        return query_filter.split(properties)
+
+    def _dest_accepts(self, arg_name):
+        """
+        :returns: Whether the associated function accepts given argument.
+        :rtype: boolean
+        """
+        dest = getattr(self.execute, "dest", self.execute)
+        return arg_name in inspect.getargspec(dest).args
 
     @abc.abstractmethod
     def take_action(self, connection, args, kwargs):
@@ -547,14 +1051,80 @@ class LmiBaseListerCommand(LmiSessionCommand):
         if not isinstance(session, Session):
             raise TypeError("session must be an object of Session, not %s"
                     % repr(session))
-        for connection in session:
-            if len(session) > 1:
-                command = formatter.NewHostCommand(connection.hostname)
-                self.produce_output((command,))
-            data = self.take_action(connection, args, kwargs)
-            self.produce_output(data)
-            if len(session) > 1:
-                self.app.stdout.write("\n")
+        config = self.app.config
+        property_list = self.property_list()
+        if property_list is not None:
+            kwargs = dict(kwargs)
+            kwargs[PROPERTY_LIST_ARG] = property_list
+        condition, local_filter = self.query_filter()
+        if condition is not None:
+            kwargs = dict(kwargs)
+            kwargs[WHERE_ARG] = condition
+        take_action = lambda c: self.take_action(c, args, kwargs)
+        cached_action = self.cached_action(take_action, session)
+        max_objects = self.max_objects()
+        if (   max_objects is not None
+           and local_filter is None
+           and cached_action is take_action
+           and not config.since_snapshot):
+            # cached results and snapshots need all the rows
+            hinted = dict(kwargs)
+            hinted[MAX_OBJECTS_ARG] = max_objects
+            cached_action = lambda c: self.take_action(c, args, hinted)
+        if config.since_snapshot:
+            key = self.result_key()
+        # set, when the output is closed by its reader
+        cancelled = threading.Event()
+        # rows of host being consumed in this thread
+        current = [None]
+        def _take_action(connection):
+            """ Collect results of single host. """
+            data = cached_action(connection)
+            if local_filter is not None:
+                data = _filter_rows(data, local_filter)
+                if config.columns:
+                    # drop the columns rendered just for filtering
+                    data = _project_rows(data, lambda columns:
+                            _select_columns(columns, config.columns))
+            if config.since_snapshot:
+                current[0] = data
+                data = snapshot.Snapshot(config.snapshot_dir,
+                        connection.hostname, key).diff(data)
+            if config.limit is not None or config.offset:
+                data = _slice_rows(data, config.offset, config.limit)
+            if self.executor.concurrent and not config.output_dir:
+                # generators need to be consumed in a worker
+                data = _consume_rows(data, cancelled)
+            return data
+
+        if config.output_dir:
+            return self.produce_host_outputs(session, _take_action)
+        results = self.executor.imap(_take_action, session)
+        data = None
+        try:
+            if config.group_by:
+                data = aggregate.group_rows(
+                        ((c.hostname, d) for c, d in results), config.group_by)
+                self.produce_output(data)
+            elif config.aggregate:
+                data = aggregate.aggregate_rows(
+                        (c.hostname, d) for c, d in results)
+                self.produce_output(data)
+            else:
+                for connection, data in results:
+                    if session.has_many_hosts:
+                        command = formatter.NewHostCommand(connection.hostname)
+                        self.produce_output((command,))
+                    self.produce_output(data)
+                    if session.has_many_hosts:
+                        self.formatter.end_host()
+        except errors.LmiOutputClosed:
+            # stop enumerating instances and processing other hosts
+            cancelled.set()
+            _close_rows(data)
+            _close_rows(current[0])
+            results.close()
+            raise
         return 0
 
 class LmiLister(LmiBaseListerCommand):
@@ -585,14 +1155,23 @@ class LmiLister(LmiBaseListerCommand):
         :type connection: :py:class:`lmi.shell.LMIConnection`
         :param list args: Positional arguments for associated function.
         :param dictionary kwargs: Keyword arguments for associated function.
-        :returns: Column names and item list as a pair.
-        :rtype: tuple
+        :returns: List of rows optionally preceded with
+            :py:class:`lmi.scripts.common.formatter.NewTableHeaderCommand`.
+        :rtype: list or generator
         """
         res = self.execute_on_connection(connection, *args, **kwargs)
         columns = self.get_columns()
         if columns is not None:
+            indices = self.column_indices(columns)
+            if indices is not None:
+                command = formatter.NewTableHeaderCommand(
+                        [columns[i] for i in indices])
+                return _iter_rows(command, res,
+                        lambda row: tuple([row[i] for i in indices]))
             command = formatter.NewTableHeaderCommand(columns)
-            self.formatter.produce_output((command,))
+            return _iter_rows(command, res)
+        if self.app.config.columns:
+            return _project_rows(res, self.column_indices)
         return res
 
 class LmiInstanceLister(LmiBaseListerCommand):
@@ -630,6 +1209,21 @@ class LmiInstanceLister(LmiBaseListerCommand):
         raise NotImplementedError(
                 "render method must be overriden in subclass")
 
+    def get_column_renderer(self, indices):
+        """
+        Make a function rendering just the columns at given indices. It's
+        generated by
+        :py:class:`lmi.scripts.common.meta.InstanceListerMetaClass` metaclass
+        with regard to ``PROPERTIES`` so that values of other columns are
+        not computed. This implementation renders whole rows.
+
+        :param list indices: Indices of columns to render.
+        :returns: Function taking an instance and returning a row.
+        :rtype: callable
+        """
+        render = self.render
+        return lambda inst: tuple([render(inst)[i] for i in indices])
+
     def take_action(self, connection, args, kwargs):
         """
         Collects results of single host.
@@ -638,8 +1232,9 @@ class LmiInstanceLister(LmiBaseListerCommand):
         :type connection: :py:class:`lmi.shell.LMIConnection`
         :param list args: Positional arguments for associated function.
         :param dictionary kwargs: Keyword arguments for associated function.
-        :returns: Column names and item list as a pair.
-        :rtype: tuple
+        :returns: List of rows preceded with
+            :py:class:`lmi.scripts.common.formatter.NewTableHeaderCommand`.
+        :rtype: list or generator
         """
         cols = self.get_columns()
         if cols is None:
@@ -653,17 +1248,25 @@ class LmiInstanceLister(LmiBaseListerCommand):
                 raise errors.LmiUnexpectedResult(
                         self.__class__, "(tuple, ...)", (cols, '...'))
             header = [c if isinstance(c, basestring) else c[0] for c in cols]
+            indices = self.column_indices(header)
+            if indices is not None:
+                # properties of other columns are not rendered
+                cols = [cols[i] for i in indices]
+                header = [header[i] for i in indices]
             cmd = formatter.NewTableHeaderCommand(columns=header)
-            self.produce_output((cmd,))
-            return [self.render((cols, inst)) for inst in data]
+            return _iter_rows(cmd, data, lambda inst: self.render((cols, inst)))
         else:
             data = self.execute_on_connection(connection, *args, **kwargs)
             if not hasattr(data, '__iter__'):
                 raise errors.LmiUnexpectedResult(
                         self.__class__, 'list or generator', data)
+            render = self.render
+            indices = self.column_indices(cols)
+            if indices is not None:
+                cols = [cols[i] for i in indices]
+                render = self.get_column_renderer(indices)
             cmd = formatter.NewTableHeaderCommand(columns=cols)
-            self.produce_output((cmd,))
-            return [self.render(inst) for inst in data]
+            return _iter_rows(cmd, data, render)
 
 class LmiShowInstance(LmiSessionCommand):
     """
@@ -738,13 +1341,14 @@ class LmiShowInstance(LmiSessionCommand):
         return self.render(res)
 
     def process_session(self, session, args, kwargs):
-        failures = []
-        for connection in session:
-            if len(session) > 1:
-                command = formatter.NewHostCommand(connection.hostname)
-                self.produce_output(command)
+        cached_action = self.cached_action(
+                lambda c: self.take_action(c, args, kwargs), session)
+        def _take_action(connection):
+            """
+            Render result of single host. Returns a pair ``(data, error)``.
+            """
             try:
-                self.produce_output(self.take_action(connection, args, kwargs))
+                return (cached_action(connection), None)
             except Exception as exc:
                 if self.app.config.trace:
                     LOG().exception('show instance failed for host "%s"',
@@ -752,9 +1356,22 @@ class LmiShowInstance(LmiSessionCommand):
                 else:
                     LOG().error('show instance failed for host "%s": %s',
                             connection.hostname, exc)
-                failures.append((connection.hostname, exc))
-            if len(session) > 1:
-                self.app.stdout.write("\n")
+                return (None, exc)
+
+        if self.app.config.output_dir:
+            return self.produce_host_outputs(session, cached_action)
+        failures = []
+        for connection, (data, error) in self.executor.imap(
+                _take_action, session, lambda result: result[1] is not None):
+            if session.has_many_hosts:
+                command = formatter.NewHostCommand(connection.hostname)
+                self.produce_output(command)
+            if error is None:
+                self.produce_output(data)
+            else:
+                failures.append((connection.hostname, error))
+            if session.has_many_hosts:
+                self.formatter.end_host()
         if len(failures) > 0:
             self._print_errors(failures)
         return 0
@@ -787,6 +1404,11 @@ class LmiCheckResult(LmiSessionCommand):
     def formatter_factory(self):
         return formatter.TableFormatter
 
+    @classmethod
+    def output_options(cls):
+        # results of invoked actions are never cached
+        return []
+
     @abc.abstractmethod
     def check_result(self, options, result):
         """
@@ -832,11 +1454,36 @@ class LmiCheckResult(LmiSessionCommand):
                 LOG().warn("failed to execute wrapped function: %s", exc)
             return (False, exc)
 
+    def _check_host(self, connection, args, kwargs):
+        """
+        Run :py:meth:`take_action` on single host. It may run in a worker
+        process, thus the unexpected result is returned for the report
+        instead of being looked up in :py:attr:`results`.
+
+        :returns: A triple ``(passed, error, result)``, where ``result`` is
+            a string of unexpected result or ``None``.
+        :rtype: tuple
+        """
+        passed, error = self.take_action(connection, args, kwargs)
+        result = None
+        if not passed and error is None:
+            result = str(self.results.get(connection.hostname))
+        return passed, error, result
+
     def process_session(self, session, args, kwargs):
         # first list contain passed hosts, the second one failed ones
         results = ([], [])
-        for connection in session:
-            passed, error = self.take_action(connection, args, kwargs)
+        cache = self.app.result_cache
+        # unexpected results do not indicate overloaded hosts, exceptions do
+        for connection, (passed, error, result) in self.executor.imap(
+                lambda c: self._check_host(c, args, kwargs), session,
+                lambda result: isinstance(result[1], Exception)):
+            if result is not None:
+                # filled in parent process only when run in a worker
+                self.results.setdefault(connection.hostname, result)
+            if cache is not None:
+                # the host may have been modified
+                cache.invalidate(connection.hostname)
             results[0 if passed else 1].append((connection.hostname, error))
             if not passed and error:
                 LOG().warn('invocation failed on host "%s": %s',
@@ -849,8 +1496,10 @@ class LmiCheckResult(LmiSessionCommand):
         failed_runs = len(results[1]) + len(session.get_unconnected())
         if failed_runs:
             data = []
+            unreachable = session.get_unreachable()
             for hostname in session.get_unconnected():
-                data.append((hostname, 'failed to connect'))
+                data.append((hostname,
+                    unreachable.get(hostname, 'failed to connect')))
             for hostname, error in results[1]:
                 if error is None:
                     error = "failed"
@@ -46,9 +46,6 @@ from lmi.scripts.common import get_logger
 from lmi.scripts.common import errors
 from lmi.scripts.common.command import base
 from lmi.scripts.common.command import util
-from lmi.shell import LMIUtil
-from lmi.shell import LMIInstance
-from lmi.shell.LMIReturnValue import LMIReturnValue
 
 RE_CALLABLE = re.compile(
         r'^(?P<module>[a-z_]+(?:\.[a-z_]+)*):(?P<func>[a-z_]+)$',
@@ -132,6 +129,25 @@ def _handle_namespace(dcl):
             return namespace
         dcl['cim_namespace'] = classmethod(_new_cim_namespace)
 
+def _handle_cache_ttl(name, dcl):
+    """
+    Overrides ``cache_ttl()`` class method if ``CACHE_TTL`` property is
+    given.
+
+    :param string name: Name of class to be created.
+    :param dictionary dcl: Class dictionary being modified by this method.
+    """
+    if 'CACHE_TTL' in dcl:
+        ttl = dcl.pop('CACHE_TTL')
+        if ttl is not None and (
+                not isinstance(ttl, (int, long, float)) or ttl <= 0):
+            raise errors.LmiCommandInvalidProperty(dcl['__module__'], name,
+                    'CACHE_TTL must be a positive number of seconds')
+        def _new_cache_ttl(_cls):
+            """ Returns number of seconds, the results stay valid. """
+            return ttl
+        dcl['cache_ttl'] = classmethod(_new_cache_ttl)
+
 def _handle_callable(name, bases, dcl):
     """
     Process the ``CALLABLE`` property of end-point command. Create the
@@ -192,10 +208,72 @@ def _make_render_all_properties(bases):
 
         return _render
 
+def _render_error(prop_name, exc):
+    """
+    Log a failure to render property.
+
+    :returns: Value rendered instead.
+    """
+    if Configuration.get_instance().trace:
+        LOG().exception('failed to render property "%s"', prop_name)
+    else:
+        LOG().error('failed to render property "%s": %s', prop_name, exc)
+    return "ERROR"
+
+def _compile_property(prop):
+    """
+    Make an accessor function for single item of ``PROPERTIES``. It takes
+    an instance and a set of its property names and returns the value to
+    render.
+
+    :param prop: Property name or a pair ``(name, callable or property
+        name)``.
+    :returns: A pair of column name and accessor.
+    :rtype: tuple
+    """
+    if isinstance(prop, basestring):
+        def _get_property(inst, names):
+            """ Get the value of property checked to be present. """
+            # names may come from another instance of the same class
+            if prop in names or prop in inst.properties():
+                try:
+                    return getattr(inst, prop)
+                except AttributeError:
+                    pass
+            LOG().warn('property "%s" not present in instance of "%s"',
+                    prop, inst.path)
+            return "UNKNOWN"
+        return prop, _get_property
+
+    if not isinstance(prop, (tuple, list)):
+        raise TypeError("prop must be a string or tuple, not %s" %
+                repr(prop))
+    prop_name, getter = prop[0], prop[1]
+    if callable(getter):
+        def _get_value(inst, _names):
+            """ Get the value computed by a function. """
+            try:
+                return getter(inst)
+            except Exception as exc:
+                return _render_error(prop_name, exc)
+    else:
+        def _get_value(inst, _names):
+            """ Get the value of another property. """
+            try:
+                return getattr(inst, getter)
+            except Exception as exc:
+                return _render_error(prop_name, exc)
+    return prop_name, _get_value
+
 def _make_render_with_properties(properties, target_formatter_lister=False):
     """
     Creates ``render()`` method, rendering given instance properties.
 
+    Properties are compiled into a list of accessors once. Names of
+    properties are fetched once for each CIM class, because they are the
+    same for all its instances as long as they were obtained the same way.
+    An instance lacking some property has its own names checked.
+
     :param properties: (``list``) List of properties to render.
     :param target_formatter_lister: (``bool``) Whether the output is targeted
         for Show command or Lister. The former expects a pair of column_names
@@ -203,39 +281,26 @@ def _make_render_with_properties(properties, target_formatter_lister=False):
     :rtype: (``function``) Rendering method taking CIM instance as an
         argument.
     """
-    def _process_property(prop, inst):
-        """
-        Takes a single property and instance. Returns computed value.
-
-        :rtype: ``(str, any)`` A pair of property name and value.
-        """
-        if isinstance(prop, basestring):
-            prop_name = prop
-            if not prop in inst.properties():
-                LOG().warn('property "%s" not present in instance of "%s"',
-                        prop, inst.path)
-                value = "UNKNOWN"
-            else:
-                value = getattr(inst, prop)
-        else:
-            if not isinstance(prop, (tuple, list)):
-                raise TypeError("prop must be a string or tuple, not %s" %
-                        repr(prop))
-            prop_name = prop[0]
-            try:
-                if callable(prop[1]):
-                    value = prop[1](inst)
-                else:
-                    value = getattr(inst, prop[1])
-            except Exception as exc:
-                if Configuration.get_instance().trace:
-                    LOG().exception('failed to render property "%s"',
-                            prop[0])
-                else:
-                    LOG().error('failed to render property "%s": %s',
-                            prop[0], exc)
-                value = "ERROR"
-        return prop_name, value
+    # imported with the first command class, not with this module
+    from lmi.shell import LMIInstance
+    column_names, accessors = [], []
+    for prop in properties:
+        prop_name, accessor = _compile_property(prop)
+        column_names.append(prop_name)
+        accessors.append(accessor)
+    need_names = any(isinstance(p, basestring) for p in properties)
+    # property names of instances indexed by class name
+    class_names = {}
+
+    def _get_names(inst):
+        """ Return a set of property names of instance's class. """
+        if not need_names:
+            return ()
+        classname = getattr(inst, 'classname', None)
+        names = class_names.get(classname)
+        if names is None:
+            names = class_names[classname] = frozenset(inst.properties())
+        return names
 
     if target_formatter_lister:
         def _render(self, inst):
@@ -246,7 +311,8 @@ def _make_render_with_properties(properties, target_formatter_lister=False):
             if not isinstance(inst, LMIInstance):
                 raise errors.LmiUnexpectedResult(
                         self.__class__, 'LMIInstance object', inst)
-            return tuple(_process_property(p, inst)[1] for p in properties)
+            names = _get_names(inst)
+            return tuple([get(inst, names) for get in accessors])
 
     else:
         def _render(self, inst):
@@ -257,12 +323,9 @@ def _make_render_with_properties(properties, target_formatter_lister=False):
             if not isinstance(inst, LMIInstance):
                 raise errors.LmiUnexpectedResult(
                         self.__class__, 'LMIInstance object', inst)
-            column_names, values = [], []
-            for prop in properties:
-                prop_name, value = _process_property(prop, inst)
-                column_names.append(prop_name)
-                values.append(value)
-            return (column_names, values)
+            names = _get_names(inst)
+            return (list(column_names),
+                    [get(inst, names) for get in accessors])
 
     return _render
 
@@ -324,6 +387,9 @@ def _handle_render_properties(name, bases, dcl, target_formatter_lister=False):
 
     renderer = None
     get_columns = lambda cls: None
+    get_property_list = lambda cls, indices=None: None
+    get_column_properties = lambda cls: None
+    get_column_renderer = None
     if properties is None and not dynamic_properties:
         if (   target_formatter_lister
            and dcl.get('__metaclass__', None) is not InstanceListerMetaClass):
@@ -333,11 +399,17 @@ def _handle_render_properties(name, bases, dcl, target_formatter_lister=False):
                     " commands")
         renderer = _make_render_all_properties(bases)
     elif properties is None and dynamic_properties:
+        # renderer of the last properties given
+        compiled = [(None, None)]
         def _render_dynamic(self, return_value):
             """ Renderer of dynamic properties. """
             properties, inst = return_value
-            return _make_render_with_properties(properties,
-                    target_formatter_lister)(self, inst)
+            last_properties, render = compiled[0]
+            if properties is not last_properties:
+                render = _make_render_with_properties(properties,
+                        target_formatter_lister)
+                compiled[0] = (properties, render)
+            return render(self, inst)
         renderer = _render_dynamic
     elif properties is not None:
         renderer = _make_render_with_properties(properties,
@@ -345,10 +417,30 @@ def _handle_render_properties(name, bases, dcl, target_formatter_lister=False):
         get_columns = (lambda cls:
                     tuple((p[0] if isinstance(p, tuple) else p)
                 for p in properties))
+        property_list = util.get_property_list(properties)
+        column_properties = util.get_column_properties(properties)
+        get_column_properties = lambda cls: column_properties
+        def get_property_list(_cls, indices=None):
+            """ Names of properties needed to render given columns. """
+            if indices is None:
+                return property_list
+            return util.get_property_list([properties[i] for i in indices])
+        def get_column_renderer(cls, indices):
+            """
+            Make a function rendering just the columns at given indices.
+            Properties of other columns are not evaluated.
+            """
+            render = _make_render_with_properties(
+                    [properties[i] for i in indices], True)
+            return lambda inst: render(cls, inst)
     if renderer is not None:
         dcl['render'] = classmethod(renderer)
     if target_formatter_lister:
         dcl['get_columns'] = get_columns
+        dcl['get_property_list'] = get_property_list
+        dcl['get_column_properties'] = get_column_properties
+        if get_column_renderer is not None:
+            dcl['get_column_renderer'] = get_column_renderer
 
 def _handle_opt_preprocess(name, dcl):
     """
@@ -459,10 +551,14 @@ class SessionCommandMetaClass(EndPointCommandMetaClass):
             function. Defaults to ``"root/cimv2"``. If ``False``, raw
             :py:class:`lmi.shell.LMIConnection` object will be passed to
             associated function.
+        ``CACHE_TTL`` : ``int``
+            Number of seconds, the results of read-only command may be
+            reused from result cache. Results are not cached if ``None``.
     """
     def __new__(mcs, name, bases, dcl):
         _handle_usage(name, dcl)
         _handle_namespace(dcl)
+        _handle_cache_ttl(name, dcl)
         _handle_callable(name, bases, dcl)
 
         return EndPointCommandMetaClass.__new__(mcs, name, bases, dcl)
@@ -517,7 +613,9 @@ class ShowInstanceMetaClass(SessionCommandMetaClass):
 class InstanceListerMetaClass(SessionCommandMetaClass):
     """
     Meta class for instance lister command handling the same properties
-    as :py:class:`ShowInstanceMetaClass`.
+    as :py:class:`ShowInstanceMetaClass`. ``PROPERTIES`` are also translated
+    to ``get_columns()``, ``get_property_list()``,
+    ``get_column_properties()`` and ``get_column_renderer()`` methods.
     """
 
     def __new__(mcs, name, bases, dcl):
@@ -548,6 +646,7 @@ class CheckResultMetaClass(SessionCommandMetaClass):
                     Comparison function testing return value with *expect*
                     function.
                     """
+                    from lmi.shell.LMIReturnValue import LMIReturnValue
                     if isinstance(result, LMIReturnValue):
                         result = result.rval
                     passed = expect(options, result)
@@ -557,6 +656,7 @@ class CheckResultMetaClass(SessionCommandMetaClass):
             else:
                 def _new_expect(_self, _options, result):
                     """ Comparison function testing by equivalence. """
+                    from lmi.shell.LMIReturnValue import LMIReturnValue
                     if isinstance(result, LMIReturnValue):
                         result = result.rval
                     passed = expect == result
@@ -0,0 +1,203 @@
+# Copyright (c) 2013, Red Hat, Inc. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of the FreeBSD Project.
+#
+# Authors: Michal Minar <miminar@redhat.com>
+#
+"""
+Functions writing output of session commands to a directory with one file
+per host. They implement ``--output-dir`` option.
+
+Each host gets its own formatter writing to ``<hostname>.<ext>`` file,
+where the extension is given by
+:py:attr:`lmi.scripts.common.formatter.Formatter.file_extension`.
+Characters of hostname unsafe for file names are replaced with
+underscores. Such names are suffixed with ``+`` and a hash of hostname, so
+that ``a:b`` and ``a_b`` do not overwrite each other's file. So is the name
+of host ``index``, which would be overwritten by the index file. The
+file is written by the worker processing the host as soon as its results
+are known, so hosts processed concurrently do not wait for each other to
+print their output. Files are written under temporary names and renamed,
+when complete.
+
+Processed hosts are summarized in ``index.json`` file. It contains a list
+of objects looking like: ::
+
+    {"host": "server", "status": "ok", "file": "server.txt", "rows": 42,
+     "elapsed": 0.153, "error": null}
+
+Where ``status`` is one of ``ok``, ``failed`` and ``unreachable``,
+``rows`` is a number of rows written (``null`` for commands not printing
+tables) and ``elapsed`` is a number of seconds spent obtaining and writing
+the results.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+
+from lmi.scripts.common import errors
+from lmi.scripts.common import formatter
+from lmi.scripts.common import get_logger
+
+LOG = get_logger(__name__)
+
+#: Name of file summarizing processed hosts.
+INDEX_FILE = 'index.json'
+#: File name reserved for index file regardless of the extension.
+INDEX_NAME = os.path.splitext(INDEX_FILE)[0]
+
+STATUS_OK = 'ok'
+STATUS_FAILED = 'failed'
+STATUS_UNREACHABLE = 'unreachable'
+
+RE_UNSAFE_CHARS = re.compile(r'[^\w.-]')
+
+def file_name(hostname):
+    """
+    :returns: Hostname with characters unsafe for file names replaced
+        with underscores. If any was replaced or the name is reserved for
+        index file, ``+`` and a hash of hostname is appended. Safe names
+        never contain ``+``, thus different hosts get different file names.
+    :rtype: string
+    """
+    name = RE_UNSAFE_CHARS.sub('_', hostname).lstrip('.') or '_'
+    # compared case insensitively for file systems ignoring the case
+    if name != hostname or name.lower() == INDEX_NAME:
+        if not isinstance(hostname, bytes):
+            hostname = hostname.encode('utf-8')
+        name += '+' + hashlib.sha1(hostname).hexdigest()[:8]
+    return name
+
+def prepare(directory):
+    """
+    Create output directory if it does not exist.
+
+    :raises: :py:class:`lmi.scripts.common.errors.LmiFailed` if it can
+        not be created.
+    """
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError as exc:
+            raise errors.LmiFailed('failed to create output directory'
+                    ' "%s": %s' % (directory, exc.strerror))
+
+def _count_rows(rows, counter):
+    """
+    Pass rows through while counting those, that are not formatter commands.
+    """
+    for row in rows:
+        if not isinstance(row, formatter.FormatterCommand):
+            counter[0] += 1
+        yield row
+
+def write_host(directory, hostname, formatter_factory, take_action,
+        trace=False):
+    """
+    Obtain results of single host and write them to its own file.
+    Errors are logged and recorded in returned entry.
+
+    :param string directory: Output directory.
+    :param string hostname: Name of host.
+    :param callable formatter_factory: Function taking an output stream
+        and returning a formatter.
+    :param callable take_action: Function without arguments returning
+        data to print.
+    :param boolean trace: Whether to log a traceback of errors.
+    :returns: Entry of index file.
+    :rtype: dictionary
+    """
+    started = time.time()
+    base = os.path.join(directory, file_name(hostname))
+    tmp_path = '%s.%d.tmp' % (base, os.getpid())
+    entry = {'host': hostname, 'status': STATUS_OK, 'file': None,
+            'rows': None, 'elapsed': None, 'error': None}
+    counter = [0]
+    try:
+        try:
+            with open(tmp_path, 'wb') as out:
+                fmt = formatter_factory(out)
+                data = take_action()
+                if not isinstance(data, (tuple, dict)):
+                    # rows of lister command
+                    data = _count_rows(data, counter)
+                    entry['rows'] = 0
+                fmt.produce_output(data)
+                fmt.finish()
+            path = '%s.%s' % (base, fmt.file_extension)
+            os.rename(tmp_path, path)
+            entry['file'] = os.path.basename(path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+    except Exception as exc:
+        if trace:
+            LOG().exception('failed to write output of host "%s"', hostname)
+        else:
+            LOG().error('failed to write output of host "%s": %s',
+                    hostname, exc)
+        entry['status'] = STATUS_FAILED
+        entry['error'] = str(exc)
+    if entry['rows'] is not None:
+        entry['rows'] = counter[0]
+    entry['elapsed'] = round(time.time() - started, 3)
+    return entry
+
+def write_index(directory, session, entries):
+    """
+    Write index file summarizing processed hosts. Hosts of session, that
+    could not be connected to, are included with ``unreachable`` status.
+
+    :param string directory: Output directory.
+    :param session: Session with processed hosts.
+    :type session: :py:class:`lmi.scripts.common.session.Session`
+    :param list entries: Entries returned by :py:func:`write_host`.
+    :returns: Number of hosts not written successfully.
+    :rtype: integer
+    """
+    by_host = dict((e['host'], e) for e in entries)
+    unreachable = session.get_unreachable()
+    for hostname in session.get_unconnected():
+        if hostname not in by_host:
+            by_host[hostname] = {'host': hostname,
+                    'status': STATUS_UNREACHABLE, 'file': None,
+                    'rows': None, 'elapsed': None,
+                    'error': unreachable.get(hostname, 'failed to connect')}
+    index = [by_host[h] for h in session.hostnames if h in by_host]
+    path = os.path.join(directory, INDEX_FILE)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as index_file:
+        json.dump(index, index_file, indent=1, sort_keys=True,
+                separators=(',', ': '))
+        index_file.write('\n')
+    os.rename(tmp_path, path)
+    failed = sum(1 for e in index if e['status'] != STATUS_OK)
+    LOG().info('output of %d hosts written to "%s", %d failed',
+            len(index), directory, failed)
+    return failed
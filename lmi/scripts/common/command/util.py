@@ -33,11 +33,30 @@ Utility functions used in command sub-package.
 
 import re
 
+from lmi.scripts.common import errors
+from lmi.scripts.common import where
+
 RE_OPT_BRACKET_ARGUMENT = re.compile('^<(?P<name>[^>]+)>$')
 RE_OPT_UPPER_ARGUMENT = re.compile('^(?P<name>[A-Z]+(?:[_-][A-Z]+)*)$')
 RE_OPT_SHORT_OPTION = re.compile('^-(?P<name>[a-z])$', re.IGNORECASE)
 RE_OPT_LONG_OPTION = re.compile('^--(?P<name>[a-z_-]+)$', re.IGNORECASE)
 
+#: Options modifying the output of commands. They can be given either to
+#: ``lmi`` meta-command or after the arguments of a command supporting them.
+#: Each is mapped to a pair ``(attribute, takes_value)``, where *attribute*
+#: is the property of configuration set by the option.
+OUTPUT_OPTIONS = {
+        '--limit'          : ('limit', True),
+        '--offset'         : ('offset', True),
+        '--columns'        : ('columns', True),
+        '--where'          : ('where', True),
+        '--aggregate'      : ('aggregate', False),
+        '--group-by'       : ('group_by', True),
+        '--cached'         : ('use_result_cache', False),
+        '--refresh'        : ('refresh_results', False),
+        '--since-snapshot' : ('since_snapshot', False),
+}
+
 def is_abstract_method(clss, method, missing_is_abstract=False):
     """
     Check, whether the given method is abstract in given class or list of
@@ -71,3 +90,157 @@ def is_abstract_method(clss, method, missing_is_abstract=False):
                 return False
     return missing_is_abstract
 
+
+def get_property_list(properties):
+    """
+    Get names of instance properties needed to render given list of
+    properties. The list may be passed to enumeration of instances as a
+    ``PropertyList``, so that other properties are not transferred.
+
+    :param properties: List of properties in the same format as
+        ``PROPERTIES`` property of instance commands.
+    :returns: List of property names or ``None``, if some value is
+        rendered by a function, which may need any property.
+    :rtype: list
+    """
+    names = []
+    for prop in properties:
+        if isinstance(prop, basestring):
+            name = prop
+        elif callable(prop[1]):
+            return None
+        else:
+            name = prop[1]
+        if name not in names:
+            names.append(name)
+    return names
+
+def column_index(columns, column):
+    """
+    Find column with given name. Letter case is ignored, unless there are
+    more columns differing just in case.
+
+    :param list columns: Column names.
+    :param string column: Name of column to find.
+    :returns: Index of column or ``None``, if there is no such column.
+    :rtype: integer
+    """
+    if column in columns:
+        return list(columns).index(column)
+    matching = [i for i, c in enumerate(columns)
+            if c.lower() == column.lower()]
+    if len(matching) != 1:
+        return None
+    return matching[0]
+
+def get_column_properties(properties):
+    """
+    Get names of instance properties rendered in columns without any
+    transformation.
+
+    :param properties: List of properties in the same format as
+        ``PROPERTIES`` property of instance commands.
+    :returns: Property names indexed by column names.
+    :rtype: dictionary
+    """
+    result = {}
+    for prop in properties:
+        if isinstance(prop, basestring):
+            result[prop] = prop
+        elif not callable(prop[1]):
+            result[prop[0]] = prop[1]
+    return result
+
+def pop_output_options(args, names, usage=''):
+    """
+    Remove options modifying the output from command line arguments of
+    command, so that they are not passed to ``docopt``. Options appearing in
+    the usage string of command are left alone.
+
+    :param list args: Command line arguments.
+    :param list names: Names of options to remove. They must be keys of
+        :py:data:`OUTPUT_OPTIONS`.
+    :param string usage: Usage string of command.
+    :returns: Pair ``(args, options)``, where *args* are the remaining
+        arguments and *options* is a dictionary of removed options with
+        their values like the one returned by ``docopt``.
+    :rtype: tuple
+    """
+    names = [n for n in names
+            if not re.search(r'%s(?![\w-])' % re.escape(n), usage)]
+    remaining = []
+    options = {}
+    args = iter(args)
+    for arg in args:
+        if arg == '--':
+            remaining.append(arg)
+            remaining.extend(args)
+            break
+        name, sep, value = arg.partition('=')
+        if name not in names:
+            remaining.append(arg)
+            continue
+        if not OUTPUT_OPTIONS[name][1]:
+            if sep:
+                raise errors.LmiInvalidOptions(
+                        '%s does not take a value' % name)
+            value = True
+        elif not sep:
+            try:
+                value = next(args)
+            except StopIteration:
+                raise errors.LmiInvalidOptions(
+                        '%s requires a value' % name)
+        options[name] = value
+    return remaining, options
+
+def set_output_options(config, options):
+    """
+    Override configuration with options modifying the output given on
+    command line.
+
+    :param config: Configuration object.
+    :type config: :py:class:`lmi.scripts.common.configuration.Configuration`
+    :param dictionary options: Options as returned by ``docopt``. Options
+        listed in :py:data:`OUTPUT_OPTIONS` are removed from it.
+    :returns: Names of options given.
+    :rtype: list
+    """
+    given = sorted(n for n in OUTPUT_OPTIONS
+            if options.get(n) not in (None, False))
+    for name in ('limit', 'offset'):
+        value = options.pop('--' + name, None)
+        if value is not None:
+            try:
+                setattr(config, name, int(value))
+            except ValueError:
+                raise errors.LmiInvalidOptions('--%s must be'
+                        ' a non-negative integer, not "%s"' % (name, value))
+    columns = options.pop('--columns', None)
+    if columns is not None:
+        config.columns = [c.strip() for c in columns.split(',')
+                if c.strip()]
+    expression = options.pop('--where', None)
+    if expression is not None:
+        # report syntax errors early
+        where.Filter(expression)
+        config.where = expression
+    if options.pop('--aggregate', False):
+        config.aggregate = True
+    group_by = options.pop('--group-by', None)
+    if group_by is not None:
+        config.group_by = group_by
+    if config.output_dir and (config.aggregate or config.group_by):
+        raise errors.LmiInvalidOptions('--output-dir can not be combined'
+                ' with --aggregate or --group-by')
+    if options.pop('--cached', False):
+        config.use_result_cache = True
+    if options.pop('--refresh', False):
+        config.refresh_results = True
+    if options.pop('--since-snapshot', False):
+        config.since_snapshot = True
+    if config.since_snapshot and (config.limit is not None or config.offset):
+        # rows left out would be missed by the next run
+        raise errors.LmiInvalidOptions('--since-snapshot can not be combined'
+                ' with --limit or --offset')
+    return given
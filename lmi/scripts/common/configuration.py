@@ -41,7 +41,9 @@ Configuration
 import os
 from lmi.base.BaseConfiguration import BaseConfiguration
 
-LISTER_FORMATS = ['csv', 'table']
+LISTER_FORMATS = ['csv', 'table', 'json', 'jsonl', 'binary']
+#: Implementations of concurrency used to process hosts of session.
+BACKENDS = ['threads', 'gevent']
 
 class Configuration(BaseConfiguration):
     """
@@ -66,6 +68,9 @@ class Configuration(BaseConfiguration):
     # indexes to LISTER_FORMATS
     LISTER_FORMAT_CSV = 0
     LISTER_FORMAT_TABLE = 1
+    LISTER_FORMAT_JSON = 2
+    LISTER_FORMAT_JSON_LINES = 3
+    LISTER_FORMAT_BINARY = 4
 
     def __init__(self, user_config_file_path=USER_CONFIG_FILE_PATH, **kwargs):
         self._user_config_file_path = os.path.expanduser(user_config_file_path)
@@ -77,6 +82,22 @@ class Configuration(BaseConfiguration):
         self._human_friendly = None
         self._lister_format = None
         self._no_headings = None
+        self._table_window = None
+        self._aggregate = None
+        self._group_by = None
+        self._pager = None
+        self._jobs = None
+        self._connect_timeout = None
+        self._backend = None
+        self._processes = None
+        self._use_result_cache = None
+        self._refresh_results = False
+        self._since_snapshot = False
+        self._limit = None
+        self._offset = 0
+        self._output_dir = None
+        self._columns = None
+        self._where = None
 
     @classmethod
     def provider_prefix(cls):
@@ -91,8 +112,29 @@ class Configuration(BaseConfiguration):
         defaults = BaseConfiguration.default_options().copy()
         # [Main] options
         defaults["CommandNamespace"] = 'lmi.scripts.cmd'
+        defaults["CommandIndex"] = "~/.cache/lmi/commands.json"
         defaults["Trace"] = "False"
         defaults["Verbosity"] = "0"
+        defaults["Jobs"] = "1"
+        defaults["Backend"] = "threads"
+        defaults["Processes"] = "1"
+        defaults["ConnectTimeout"] = "0"
+        defaults["ConnectDeadline"] = "0"
+        defaults["KeepAliveInterval"] = "60"
+        defaults["ConnectRetries"] = "0"
+        defaults["RetryDelay"] = "1"
+        defaults["RetryMaxDelay"] = "30"
+        defaults["UnreachableCache"] = "~/.cache/lmi/unreachable.json"
+        defaults["UnreachableTTL"] = "0"
+        defaults["ResultCache"] = "~/.cache/lmi/results"
+        defaults["ResultCacheSize"] = "64"
+        defaults["UseResultCache"] = "False"
+        defaults["SnapshotDir"] = "~/.cache/lmi/snapshots"
+        defaults["AdaptiveJobs"] = "False"
+        defaults["LatencyFactor"] = "2.0"
+        defaults["SubnetJobs"] = ""
+        defaults["CredentialsCache"] = ""
+        defaults["CredentialsKeyFile"] = "~/.config/lmi/credentials.key"
         # [Log] options
         defaults['ConsoleFormat'] = "%(levelname)s: %(message)s"
         defaults['FileFormat'] = \
@@ -103,6 +145,14 @@ class Configuration(BaseConfiguration):
         defaults['HumanFriendly'] = 'False' # be ugly by default
         defaults['ListerFormat'] = 'table'
         defaults['NoHeadings'] = 'False'
+        defaults['TableWindow'] = '0'
+        defaults['Aggregate'] = 'False'
+        defaults['GroupBy'] = ''
+        defaults['Pager'] = ''
+        # [Broker] options
+        defaults['Socket'] = '~/.cache/lmi/broker.sock'
+        defaults['IdleTimeout'] = '300'
+        defaults['MaxConnections'] = '64'
         return defaults
 
     @classmethod
@@ -111,6 +161,7 @@ class Configuration(BaseConfiguration):
         sects.add('Main')
         sects.add('SSL')
         sects.add('Format')
+        sects.add('Broker')
         return list(sects)
 
     def load(self):
@@ -178,6 +229,329 @@ class Configuration(BaseConfiguration):
                 level = self.OUTPUT_DEBUG
         self._verbosity = level
 
+    @property
+    def jobs(self):
+        """
+        Maximum number of hosts processed at once by session commands.
+
+        :rtype: integer
+        """
+        if self._jobs is None:
+            return max(1, self.get_safe('Main', 'Jobs', int, 1))
+        return self._jobs
+    @jobs.setter
+    def jobs(self, value):
+        """ Allows to override configuration option value. """
+        if value is not None:
+            if not isinstance(value, (long, int)):
+                raise TypeError("jobs must be an integer")
+            if value < 1:
+                raise ValueError("jobs must be a positive integer")
+        self._jobs = value
+
+    @property
+    def processes(self):
+        """
+        Number of processes, among which hosts of session are split. Each
+        of them processes up to ``jobs`` hosts at once.
+
+        :rtype: integer
+        """
+        if self._processes is None:
+            return max(1, self.get_safe('Main', 'Processes', int, 1))
+        return self._processes
+    @processes.setter
+    def processes(self, value):
+        """ Allows to override configuration option value. """
+        if value is not None:
+            if not isinstance(value, (long, int)):
+                raise TypeError("processes must be an integer")
+            if value < 1:
+                raise ValueError("processes must be a positive integer")
+        self._processes = value
+
+    @property
+    def backend(self):
+        """
+        Implementation of concurrency used to process hosts of session.
+        One of ``BACKENDS``.
+
+        :rtype: string
+        """
+        if self._backend is None:
+            value = self.get_safe('Main', 'Backend').lower()
+            if value not in BACKENDS:
+                value = self.default_options()['Backend']
+            return value
+        return self._backend
+    @backend.setter
+    def backend(self, value):
+        """ Allows to override configuration option value. """
+        if value is not None:
+            if not isinstance(value, basestring):
+                raise TypeError("backend must be a string")
+            value = value.lower()
+            if value not in BACKENDS:
+                raise ValueError("backend must be one of: %s"
+                        % ", ".join(BACKENDS))
+        self._backend = value
+
+    @property
+    def adaptive_jobs(self):
+        """
+        Whether to adjust the number of hosts processed at once according
+        to their response times and errors. ``jobs`` is the upper bound.
+
+        :rtype: boolean
+        """
+        return self.get_safe('Main', 'AdaptiveJobs', bool)
+
+    @property
+    def latency_factor(self):
+        """
+        How many times slower than average must a host respond to reduce
+        the number of hosts processed at once, when ``adaptive_jobs`` is
+        enabled.
+
+        :rtype: float
+        """
+        return self.get_safe('Main', 'LatencyFactor', float, 2.0)
+
+    @property
+    def subnet_jobs(self):
+        """
+        Maximum numbers of hosts processed at once in particular subnets.
+
+        :returns: List of pairs ``(network, jobs)``, where ``network`` is
+            an address in CIDR notation.
+        :rtype: list
+        :raises: ``ValueError`` if the option is malformed.
+        """
+        result = []
+        value = self.get_safe('Main', 'SubnetJobs') or ''
+        for item in value.replace(',', ' ').split():
+            network, _, jobs = item.rpartition('=')
+            try:
+                jobs = int(jobs)
+            except ValueError:
+                jobs = 0
+            if not network or jobs < 1:
+                raise ValueError('expected network=jobs with positive number'
+                        ' of jobs, not "%s"' % item)
+            result.append((network, jobs))
+        return result
+
+    @property
+    def connect_timeout(self):
+        """
+        Number of seconds to wait for a connection to single host, when
+        connecting to more hosts at once. ``None`` means no timeout.
+
+        :rtype: float
+        """
+        if self._connect_timeout is None:
+            value = self.get_safe('Main', 'ConnectTimeout', float, 0)
+        else:
+            value = self._connect_timeout
+        return value if value > 0 else None
+    @connect_timeout.setter
+    def connect_timeout(self, value):
+        """ Allows to override configuration option value. """
+        if value is not None:
+            if not isinstance(value, (long, int, float)):
+                raise TypeError("connect_timeout must be a number")
+            if value < 0:
+                raise ValueError("connect_timeout must not be negative")
+        self._connect_timeout = value
+
+    @property
+    def connect_deadline(self):
+        """
+        Number of seconds to wait for connections to all hosts, when
+        connecting to more hosts at once. ``None`` means no deadline.
+
+        :rtype: float
+        """
+        value = self.get_safe('Main', 'ConnectDeadline', float, 0)
+        return value if value > 0 else None
+
+    @property
+    def keep_alive_interval(self):
+        """
+        Number of seconds between probes of connections made in interactive
+        mode. ``None`` means connections are not probed.
+
+        :rtype: float
+        """
+        value = self.get_safe('Main', 'KeepAliveInterval', float, 60)
+        return value if value > 0 else None
+
+    @property
+    def connect_retries(self):
+        """
+        Number of times a failed connection to host is retried. Failures
+        caused by wrong credentials are not retried.
+
+        :rtype: integer
+        """
+        return max(0, self.get_safe('Main', 'ConnectRetries', int, 0))
+
+    @property
+    def retry_delay(self):
+        """
+        Number of seconds to wait before the first retry of connection.
+        The delay doubles with each further retry.
+
+        :rtype: float
+        """
+        return max(0, self.get_safe('Main', 'RetryDelay', float, 1))
+
+    @property
+    def retry_max_delay(self):
+        """
+        Upper bound of delay between retries of connection in seconds.
+
+        :rtype: float
+        """
+        return max(0, self.get_safe('Main', 'RetryMaxDelay', float, 30))
+
+    @property
+    def command_index(self):
+        """
+        Path to the file with index of command entry points. ``None`` means
+        entry points are searched for upon each invocation.
+
+        :rtype: string
+        """
+        value = self.get_safe('Main', 'CommandIndex')
+        if not value:
+            return None
+        return os.path.expanduser(value)
+
+    @property
+    def unreachable_cache(self):
+        """
+        Path to the file with cache of hosts, that recently failed to
+        connect.
+
+        :rtype: string
+        """
+        return os.path.expanduser(self.get_safe('Main', 'UnreachableCache'))
+
+    @property
+    def unreachable_ttl(self):
+        """
+        Number of seconds, the host failing to connect is skipped by
+        following invocations. ``None`` means unreachable hosts are not
+        cached.
+
+        :rtype: float
+        """
+        value = self.get_safe('Main', 'UnreachableTTL', float, 0)
+        return value if value > 0 else None
+
+    @property
+    def result_cache(self):
+        """
+        Path to the directory with cached results of read-only commands.
+        ``None`` means results are neither cached nor invalidated.
+
+        :rtype: string
+        """
+        value = self.get_safe('Main', 'ResultCache')
+        if not value:
+            return None
+        return os.path.expanduser(value)
+
+    @property
+    def result_cache_size(self):
+        """
+        Maximum size of result cache in bytes. ``None`` means no limit.
+
+        :rtype: integer
+        """
+        value = self.get_safe('Main', 'ResultCacheSize', float, 64)
+        return int(value * 1024 * 1024) if value > 0 else None
+
+    @property
+    def use_result_cache(self):
+        """
+        Whether the cached results of read-only commands are printed instead
+        of querying the hosts.
+
+        :rtype: boolean
+        """
+        if self._use_result_cache is None:
+            return self.get_safe('Main', 'UseResultCache', bool)
+        return self._use_result_cache
+    @use_result_cache.setter
+    def use_result_cache(self, value):
+        """ Allows to override configuration option. """
+        if value is not None:
+            value = bool(value)
+        self._use_result_cache = value
+
+    @property
+    def refresh_results(self):
+        """
+        Whether the results of read-only commands are obtained from hosts
+        and stored in result cache regardless of cached ones.
+
+        :rtype: boolean
+        """
+        return self._refresh_results
+    @refresh_results.setter
+    def refresh_results(self, value):
+        """ Allows to override configuration option. """
+        self._refresh_results = bool(value)
+
+    @property
+    def snapshot_dir(self):
+        """
+        Path to the directory with snapshots of rows printed by lister
+        commands.
+
+        :rtype: string
+        """
+        return os.path.expanduser(self.get_safe('Main', 'SnapshotDir'))
+
+    @property
+    def since_snapshot(self):
+        """
+        Whether lister commands print just the rows changed since the last
+        snapshot.
+
+        :rtype: boolean
+        """
+        return self._since_snapshot
+    @since_snapshot.setter
+    def since_snapshot(self, value):
+        """ Allows to override configuration option. """
+        self._since_snapshot = bool(value)
+
+    @property
+    def credentials_cache(self):
+        """
+        Path to the file with encrypted cache of verified credentials.
+        ``None`` means credentials are not cached.
+
+        :rtype: string
+        """
+        value = self.get_safe('Main', 'CredentialsCache')
+        if not value:
+            return None
+        return os.path.expanduser(value)
+
+    @property
+    def credentials_key_file(self):
+        """
+        Path to the file with key encrypting the credentials cache.
+
+        :rtype: string
+        """
+        return os.path.expanduser(
+                self.get_safe('Main', 'CredentialsKeyFile'))
+
     # *************************************************************************
     # [SSL] options
     # *************************************************************************
@@ -219,6 +593,9 @@ class Configuration(BaseConfiguration):
         Output format used for lister commands. Returns one of
             * LISTER_FORMAT_CSV
             * LISTER_FORMAT_TABLE
+            * LISTER_FORMAT_JSON
+            * LISTER_FORMAT_JSON_LINES
+            * LISTER_FORMAT_BINARY
 
         :rtype: integer
         """
@@ -263,3 +640,193 @@ class Configuration(BaseConfiguration):
             value = bool(value)
         self._no_headings = value
 
+    @property
+    def table_window(self):
+        """
+        Number of rows used to compute column sizes of tables. Following
+        rows are printed as they come. ``None`` means the whole table is
+        stored before printing.
+
+        :rtype: integer
+        """
+        if self._table_window is None:
+            value = self.get_safe('Format', 'TableWindow', int, 0)
+        else:
+            value = self._table_window
+        return value if value > 0 else None
+    @table_window.setter
+    def table_window(self, value):
+        """ Allows to override configuration option. """
+        if value is not None:
+            if not isinstance(value, (long, int)):
+                raise TypeError("table_window must be an integer")
+            if value < 0:
+                raise ValueError("table_window must not be negative")
+        self._table_window = value
+
+    @property
+    def aggregate(self):
+        """
+        Whether to merge rows of lister commands from all hosts into a single
+        table with hostname in the first column.
+
+        :rtype: boolean
+        """
+        if self._aggregate is None:
+            return self.get_safe('Format', 'Aggregate', bool)
+        return self._aggregate
+    @aggregate.setter
+    def aggregate(self, value):
+        """ Allows to override configuration option. """
+        if value is not None:
+            value = bool(value)
+        self._aggregate = value
+
+    @property
+    def group_by(self):
+        """
+        Name of column, by which the rows of lister commands from all hosts
+        are grouped. ``None`` means no grouping.
+
+        :rtype: string
+        """
+        if self._group_by is None:
+            value = self.get_safe('Format', 'GroupBy')
+        else:
+            value = self._group_by
+        return value or None
+    @group_by.setter
+    def group_by(self, value):
+        """ Allows to override configuration option. """
+        if value is not None and not isinstance(value, basestring):
+            raise TypeError("group_by must be a string")
+        self._group_by = value
+
+    @property
+    def limit(self):
+        """
+        Maximum number of rows printed by lister commands for each host.
+        ``None`` means no limit.
+
+        :rtype: integer
+        """
+        return self._limit
+    @limit.setter
+    def limit(self, value):
+        """ Allows to override configuration option. """
+        if value is not None:
+            if not isinstance(value, (long, int)):
+                raise TypeError("limit must be an integer")
+            if value < 0:
+                raise ValueError("limit must not be negative")
+        self._limit = value
+
+    @property
+    def offset(self):
+        """
+        Number of rows skipped by lister commands for each host.
+
+        :rtype: integer
+        """
+        return self._offset
+    @offset.setter
+    def offset(self, value):
+        """ Allows to override configuration option. """
+        if not isinstance(value, (long, int)):
+            raise TypeError("offset must be an integer")
+        if value < 0:
+            raise ValueError("offset must not be negative")
+        self._offset = value
+
+    @property
+    def columns(self):
+        """
+        Names of columns printed by lister commands. ``None`` means all
+        columns are printed.
+
+        :rtype: list
+        """
+        return self._columns
+    @columns.setter
+    def columns(self, value):
+        """ Allows to override configuration option. """
+        if value is not None:
+            if (   not isinstance(value, (list, tuple))
+               or not all(isinstance(c, basestring) for c in value)):
+                raise TypeError("columns must be a list of strings")
+            value = list(value) or None
+        self._columns = value
+
+    @property
+    def where(self):
+        """
+        Filter expression selecting rows printed by lister commands.
+        ``None`` means all rows are printed.
+
+        :rtype: string
+        """
+        return self._where
+    @where.setter
+    def where(self, value):
+        """ Allows to override configuration option. """
+        if value is not None and not isinstance(value, basestring):
+            raise TypeError("where must be a string")
+        self._where = value or None
+
+    @property
+    def output_dir(self):
+        """
+        Path to the directory, where the output of each host is written to
+        its own file. ``None`` means the output is printed to standard output.
+
+        :rtype: string
+        """
+        return self._output_dir
+    @output_dir.setter
+    def output_dir(self, value):
+        """ Allows to override configuration option. """
+        if value is not None:
+            if not isinstance(value, basestring):
+                raise TypeError("output_dir must be a string")
+            value = os.path.expanduser(value)
+        self._output_dir = value
+
+    @property
+    def pager(self):
+        """
+        Shell command running a pager for the output printed to terminal.
+        ``None`` means no pager is used.
+
+        :rtype: string
+        """
+        if self._pager is None:
+            value = self.get_safe('Format', 'Pager')
+        else:
+            value = self._pager
+        return value or None
+    @pager.setter
+    def pager(self, value):
+        """
+        Allows to override configuration option. Empty string disables the
+        pager.
+        """
+        if value is not None and not isinstance(value, basestring):
+            raise TypeError("pager must be a string")
+        self._pager = value
+
+
+    # *************************************************************************
+    # [Broker] options
+    # *************************************************************************
+    @property
+    def broker_socket(self):
+        """
+        Path to the control socket of connection broker. Empty string
+        disables the use of broker.
+
+        :rtype: string
+        """
+        value = self.get_safe('Broker', 'Socket')
+        if value:
+            value = os.path.expanduser(value)
+        return value
@@ -0,0 +1,243 @@
+# Copyright (c) 2013, Red Hat, Inc. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of the FreeBSD Project.
+#
+# Authors: Michal Minar <miminar@redhat.com>
+#
+"""
+Module with credential store used by :py:class:`Session`.
+
+Credentials are looked up by hostname in constant time. When the same
+credentials shall be used for all hosts, the first verified ones are kept
+as a shared default instead of being searched for among all the others.
+
+Verified credentials can be cached on disk, encrypted with a key stored in
+a separate file. This requires the *cryptography* python package.
+
+CredentialStore
+---------------
+
+.. autoclass:: CredentialStore
+    :members:
+
+"""
+
+import json
+import os
+import threading
+
+from lmi.scripts.common import get_logger
+from lmi.scripts.common.util import make_parent_dir
+
+LOG = get_logger(__name__)
+
+def _import_fernet():
+    """
+    Import *cryptography* package when the cache is used. It takes a while
+    and most invocations do not need it.
+
+    :returns: Module ``cryptography.fernet`` or ``None`` if not installed.
+    """
+    try:
+        from cryptography import fernet
+        return fernet
+    except ImportError:
+        return None
+
+class CredentialStore(object):
+    """
+    Store of credentials for hosts of session.
+
+    :param dictionary credentials: Mapping assigning a pair
+        ``(username, password)`` to hostnames.
+    :param boolean same_credentials: Use the first verified credentials for
+        all hosts, that are missing username or password.
+    :param string default_username: Username used for hosts without any
+        credentials given.
+    :param string cache_path: Path to file with encrypted cache of verified
+        credentials. Cache is not used if ``None``.
+    :param string key_path: Path to file with key used to encrypt the cache.
+        It's generated, if missing.
+    """
+
+    def __init__(self, credentials=None, same_credentials=False,
+            default_username=None, cache_path=None, key_path=None):
+        # { hostname : (username, password, verified), ... }
+        # where verified is a flag saying, whether these credentials
+        # were successfuly used for logging in
+        self._credentials = {}
+        self._same_credentials = same_credentials
+        self._default_username = default_username or ''
+        # first verified credentials shared by all hosts if
+        # same_credentials is True
+        self._shared = None
+        # { hostname : (username, password), ... }
+        # verified credentials read from the cache
+        self._cached = {}
+        self._lock = threading.Lock()
+        self._cache = None
+        # module cryptography.fernet, imported only with cache configured
+        self._fernet = None
+        # whether there are verified credentials not yet saved to cache
+        self._dirty = False
+        if cache_path is not None and key_path is not None:
+            self._fernet = _import_fernet()
+            if self._fernet is not None:
+                self._cache = (cache_path, key_path)
+                self._load_cache()
+            else:
+                LOG().warn('can not cache credentials without cryptography'
+                        ' package installed')
+        if credentials is not None:
+            if not isinstance(credentials, dict):
+                raise TypeError("credentials must be a dictionary")
+            for hostname, creds in credentials.items():
+                self.set(hostname, creds[0], creds[1])
+
+    def _get_fernet(self):
+        """
+        Get an object encrypting the cache. The key is generated if
+        missing.
+
+        :rtype: :py:class:`cryptography.fernet.Fernet`
+        """
+        key_path = self._cache[1]
+        if not os.path.exists(key_path):
+            make_parent_dir(key_path)
+            fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'w') as key_file:
+                key_file.write(self._fernet.Fernet.generate_key())
+        with open(key_path, 'r') as key_file:
+            return self._fernet.Fernet(key_file.read().strip())
+
+    def _load_cache(self):
+        """ Read verified credentials from the cache, if it exists. """
+        cache_path = self._cache[0]
+        if not os.path.exists(cache_path):
+            return
+        try:
+            with open(cache_path, 'r') as cache_file:
+                data = self._get_fernet().decrypt(cache_file.read())
+            cached = json.loads(data)
+        except (IOError, OSError, ValueError, TypeError,
+                self._fernet.InvalidToken) as exc:
+            LOG().warn('failed to read credentials cache "%s": %s',
+                    cache_path, exc)
+            return
+        for hostname, (username, password) in cached.items():
+            self._cached[hostname.encode('utf-8')] = (
+                    username.encode('utf-8'), password.encode('utf-8'))
+
+    def save(self):
+        """
+        Write verified credentials to the cache, if configured and any of
+        them changed.
+        """
+        if self._cache is None or not self._dirty:
+            return
+        cache_path = self._cache[0]
+        with self._lock:
+            self._cached.update(  (h, (c[0], c[1]))
+                               for h, c in self._credentials.items() if c[2])
+            data = json.dumps(self._cached)
+            self._dirty = False
+        try:
+            data = self._get_fernet().encrypt(data)
+            make_parent_dir(cache_path)
+            tmp_path = cache_path + '.tmp'
+            fd = os.open(tmp_path,
+                    os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as cache_file:
+                cache_file.write(data)
+            os.rename(tmp_path, cache_path)
+        except (IOError, OSError) as exc:
+            LOG().warn('failed to write credentials cache "%s": %s',
+                    cache_path, exc)
+
+    def set(self, hostname, username, password):
+        """
+        Set credentials for host.
+
+        :param string hostname: Name of host.
+        :param string username: Name of user.
+        :param string password: Password of user.
+        """
+        self._credentials[hostname] = (username or '', password or '', False)
+
+    def verify(self, hostname, username, password):
+        """
+        Mark credentials as successfully used for logging in.
+
+        :param string hostname: Name of host.
+        :param string username: Name of user.
+        :param string password: Password of user.
+        """
+        with self._lock:
+            if self._credentials.get(hostname) != (username, password, True):
+                self._dirty = True
+            self._credentials[hostname] = (username, password, True)
+            if self._shared is None:
+                self._shared = (username, password)
+
+    def invalidate(self, hostname):
+        """
+        Forget cached credentials of host, that failed to log in.
+
+        :param string hostname: Name of host.
+        """
+        with self._lock:
+            if self._cached.pop(hostname, None) is not None:
+                self._dirty = True
+
+    def get(self, hostname):
+        """
+        :param string hostname: Name of host to get credentials for.
+        :returns: Pair of ``(username, password)`` for given hostname. If no
+            credentials were given for this host, cached or shared ones are
+            used. ``(default_username, '')`` is returned if there are none.
+        :rtype: tuple
+        """
+        username, password, verified = self._credentials.get(
+                hostname, (self._default_username, '', False))
+        if verified or (username and password):
+            return username, password
+        cached = self._cached.get(hostname)
+        if cached is not None and (not username or username == cached[0]):
+            return cached
+        if self._same_credentials and self._shared is not None:
+            return self._shared
+        return username, password
+
+    def resolve(self, hostnames):
+        """
+        Get credentials for all given hosts at once.
+
+        :param list hostnames: Names of hosts.
+        :returns: Ordered pairs ``(hostname, (username, password))``.
+        :rtype: generator
+        """
+        for hostname in hostnames:
+            yield hostname, self.get(hostname)
@@ -73,6 +73,18 @@ class LmiNoConnections(LmiError):
     """ Raised, when no connection to remote hosts could be made. """
     pass
 
+class LmiOutputClosed(LmiError):
+    """
+    Raised, when the reader of output stream goes away. For example when
+    the pager is quit or the output is piped to ``head``. Processing of
+    hosts shall be cancelled.
+    """
+    pass
+
+class LmiBrokerError(LmiError):
+    """ Raised, when request to connection broker fails. """
+    pass
+
 class LmiCommandError(LmiError):
     """ Generic exception related to command declaration. """
     def __init__(self, module_name, class_name, msg):
@@ -0,0 +1,794 @@
+# Copyright (c) 2013, Red Hat, Inc. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of the FreeBSD Project.
+#
+# Authors: Michal Minar <miminar@redhat.com>
+#
+"""
+Module with executors running a function upon hosts of a session.
+
+Each executor has an :py:meth:`Executor.imap` method, which applies given
+function to every item of an iterable (usually a
+:py:class:`lmi.scripts.common.session.Session` yielding connections) and
+yields the results in the same order as the items were given. Executors
+differ in how many items are processed at once.
+"""
+
+import binascii
+import collections
+import errno
+import itertools
+import multiprocessing
+import os
+import cPickle as pickle
+import Queue
+import select
+import socket
+import struct
+import threading
+import time
+import urlparse
+
+from lmi.scripts.common import errors
+from lmi.scripts.common import get_logger
+
+LOG = get_logger(__name__)
+
+def use_greenlets():
+    """
+    Switch to cooperative concurrency of *gevent*. Blocking calls of
+    standard library are patched to switch between greenlets and threads
+    started afterwards are greenlets. Executors and session then can process
+    thousands of hosts at once with little memory needed for each.
+
+    It must be called before any thread is started.
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        raise errors.LmiError(
+                'gevent backend requires gevent python package')
+    monkey.patch_all()
+
+class Executor(object):
+    """
+    Base executor class.
+
+    :param integer jobs: Maximum number of items processed at once.
+    """
+
+    #: Whether the items are processed in other threads or processes than
+    #: the calling one. If ``True``, the function passed to :py:meth:`imap`
+    #: shall do all the work, that requires the connection, because the
+    #: result is consumed after another items are processed.
+    concurrent = False
+
+    def __init__(self, jobs=1):
+        if not isinstance(jobs, (int, long)):
+            raise TypeError("jobs must be an integer")
+        self.jobs = max(1, jobs)
+
+    def imap(self, func, items, failed_func=None):
+        """
+        Apply function to every item and yield pairs ``(item, result)`` in
+        the order of items. Exception raised by the function is re-raised,
+        when its item is about to be yielded.
+
+        :param callable func: Function taking a single item as an argument.
+        :param items: Items to process.
+        :type items: iterable
+        :param callable failed_func: Function taking a result and returning
+            whether the processing of item failed, although no exception
+            was raised. It's used by executors adjusting the number of
+            items processed at once to failures.
+        :rtype: generator over tuples
+        """
+        raise NotImplementedError("imap must be overriden in subclass")
+
+class SerialExecutor(Executor):
+    """
+    Executor processing one item at a time in the calling thread.
+    """
+
+    def imap(self, func, items, failed_func=None):
+        for item in items:
+            yield item, func(item)
+
+class _Task(object):
+    """
+    Item scheduled for processing in a thread pool. It holds the result
+    once processed.
+    """
+
+    def __init__(self, func, item, failed_func=None):
+        self.func = func
+        self.item = item
+        self.failed_func = failed_func
+        self.result = None
+        self.error = None
+        # whether the function raised or returned a failure
+        self.failed = False
+        self.cancelled = False
+        self.done = threading.Event()
+        # number of seconds the processing took
+        self.elapsed = None
+
+    def run(self):
+        """ Process the item unless the task has been cancelled. """
+        started = time.time()
+        try:
+            if not self.cancelled:
+                self.result = self.func(self.item)
+                if self.failed_func is not None:
+                    self.failed = bool(self.failed_func(self.result))
+        except Exception as exc:
+            LOG().debug('task failed for "%s"', self.item, exc_info=True)
+            self.error = exc
+            self.failed = True
+        finally:
+            self.elapsed = time.time() - started
+            self.done.set()
+
+    def wait(self):
+        """ Block until the task is processed. """
+        # waiting without a timeout can not be interrupted by a signal
+        while not self.done.wait(0.5):
+            pass
+
+def _worker(tasks):
+    """ Thread body processing tasks until ``None`` is received. """
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task.run()
+
+class ThreadPoolExecutor(Executor):
+    """
+    Executor processing up to ``jobs`` items at once in a pool of threads.
+    Items are consumed from given iterable in the calling thread, so the
+    session can still interact with user when making connections.
+
+    Results are yielded in the order of items. Results of items following a
+    slow one are kept until it is done, but no more than ``2 * jobs`` items
+    are held at once.
+    """
+
+    concurrent = True
+
+    def imap(self, func, items, failed_func=None):
+        tasks = Queue.Queue()
+        workers = []
+        pending = collections.deque()
+        items = iter(items)
+        try:
+            for _ in range(self.jobs):
+                worker = threading.Thread(target=_worker, args=(tasks,))
+                worker.daemon = True
+                worker.start()
+                workers.append(worker)
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < 2 * self.jobs:
+                    try:
+                        task = _Task(func, next(items), failed_func)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending.append(task)
+                    tasks.put(task)
+                if not pending:
+                    break
+                task = pending.popleft()
+                task.wait()
+                if task.error is not None:
+                    raise task.error
+                yield task.item, task.result
+        finally:
+            for task in pending:
+                task.cancelled = True
+            for _ in workers:
+                tasks.put(None)
+
+#: Frame sent by worker process with a result of single host.
+_FRAME_RESULT = 0
+#: Frame sent by worker process with an exception raised for the next host.
+_FRAME_ERROR = 1
+#: The last frame sent by worker process with connected, unreachable and
+#: offline hosts.
+_FRAME_DONE = 2
+#: Frame sent by worker process for a host, that failed to connect.
+_FRAME_SKIPPED = 3
+
+#: Header of frame holding the length of pickled payload.
+_FRAME_HEADER = struct.Struct('!I')
+
+class RemoteHost(object):
+    """
+    Item yielded by :py:class:`ProcessPoolExecutor` in place of connection
+    made in a worker process.
+
+    :param string hostname: Name of host.
+    """
+
+    def __init__(self, hostname):
+        self.hostname = hostname
+
+    def __repr__(self):
+        return "RemoteHost(%r)" % self.hostname
+
+def _send_frame(out, *frame):
+    """ Write single frame to the pipe. """
+    data = pickle.dumps(frame, pickle.HIGHEST_PROTOCOL)
+    out.write(_FRAME_HEADER.pack(len(data)) + data)
+    # parent waits for the frame before passing more hosts
+    out.flush()
+
+def _read_hosts(fd):
+    """
+    Yield hostnames sent by parent process one per line until the pipe is
+    closed.
+    """
+    with os.fdopen(fd, 'r') as feed:
+        for line in iter(feed.readline, ''):
+            yield line.rstrip('\n')
+
+def _shard_worker(func, shard, executor_inst, fd, failed_func=None,
+        close_fds=()):
+    """
+    Body of worker process. Processes hosts of session shard and sends the
+    results to parent in frames.
+    """
+    # ends of pipes of parent and other workers, the feed of hosts would not
+    # be closed otherwise
+    for other_fd in close_fds:
+        os.close(other_fd)
+    out = os.fdopen(fd, 'wb')
+    shard.unconnected_callback = lambda hostname: _send_frame(
+            out, _FRAME_SKIPPED, hostname)
+    try:
+        for connection, result in executor_inst.imap(
+                func, shard, failed_func):
+            try:
+                _send_frame(out, _FRAME_RESULT, connection.hostname, result)
+            except (pickle.PicklingError, TypeError) as exc:
+                _send_frame(out, _FRAME_ERROR, errors.LmiError(
+                    'failed to pass result of host "%s" to parent'
+                    ' process: %s' % (connection.hostname, exc)))
+                break
+    except errors.LmiNoConnections:
+        pass
+    except Exception as exc:
+        try:
+            _send_frame(out, _FRAME_ERROR, exc)
+        except (pickle.PicklingError, TypeError):
+            _send_frame(out, _FRAME_ERROR, errors.LmiError(str(exc)))
+    finally:
+        shard.save()
+        unconnected = shard.get_unconnected()
+        unreachable = shard.get_unreachable()
+        offline = shard.get_offline()
+        skipped = set(unconnected).union(offline)
+        _send_frame(out, _FRAME_DONE,
+                [h for h in shard.hostnames if h not in skipped],
+                dict((h, unreachable.get(h, 'failed to connect'))
+                    for h in unconnected), offline)
+        out.close()
+
+class _ShardReader(object):
+    """
+    Reader of frames sent by worker processes. Pipes of all workers are
+    drained at once, so that none of them is blocked on a full pipe.
+
+    :param list fds: File descriptors of pipes, one for each worker.
+    """
+
+    def __init__(self, fds):
+        self._fds = list(fds)
+        self._buffers = [b''] * len(self._fds)
+        self._frames = [collections.deque() for _ in self._fds]
+        self._open = set(range(len(self._fds)))
+
+    def read(self, index):
+        """
+        Get next frame sent by a worker.
+
+        :param integer index: Index of worker.
+        :returns: Frame or ``None``, if the worker exited without
+            finishing.
+        :rtype: tuple
+        """
+        while not self._frames[index] and index in self._open:
+            self._fill()
+        if self._frames[index]:
+            return self._frames[index].popleft()
+        return None
+
+    def _fill(self):
+        """ Read data available in pipes and split them into frames. """
+        fds = dict((self._fds[i], i) for i in self._open)
+        try:
+            readable = select.select(fds.keys(), [], [])[0]
+        except select.error as exc:
+            if exc.args[0] == errno.EINTR:
+                return
+            raise
+        for fd in readable:
+            index = fds[fd]
+            data = os.read(fd, 65536)
+            if not data:
+                self._open.discard(index)
+                continue
+            buf = self._buffers[index] + data
+            while len(buf) >= _FRAME_HEADER.size:
+                size = _FRAME_HEADER.unpack_from(buf)[0]
+                end = _FRAME_HEADER.size + size
+                if len(buf) < end:
+                    break
+                self._frames[index].append(
+                        pickle.loads(buf[_FRAME_HEADER.size:end]))
+                buf = buf[end:]
+            self._buffers[index] = buf
+
+class ProcessPoolExecutor(Executor):
+    """
+    Executor splitting hosts of session among ``processes`` worker
+    processes, so that processing and rendering of results is spread over
+    more processors. Each worker makes connections to its hosts and
+    processes them with an executor made by ``executor_factory`` given
+    ``jobs``. Each host is assigned to the worker with the least hosts
+    waiting for results.
+
+    Hosts are pulled from session as the results are yielded and passed to
+    workers over pipes, so that a large stream of hosts is not read in
+    advance. Results are sent back to the parent process over pipes in
+    frames made of a length and pickled payload. They are yielded in the
+    order of hosts together with :py:class:`RemoteHost` in place of
+    connection. Thus the function shall return a picklable value and must
+    not return a generator.
+
+    Items passed to :py:meth:`imap` must be a
+    :py:class:`lmi.scripts.common.session.Session`. Workers can not ask the
+    user for credentials, they must be given for all hosts.
+
+    :param integer processes: Number of worker processes.
+    :param callable executor_factory: Class or a callable making an
+        executor used by each worker given ``jobs``.
+    """
+
+    concurrent = True
+
+    def __init__(self, jobs=1, processes=2,
+            executor_factory=SerialExecutor):
+        Executor.__init__(self, jobs)
+        self.processes = max(1, processes)
+        self.executor_factory = executor_factory
+
+    def imap(self, func, items, failed_func=None):
+        session = items
+
+        def _iter_hostnames():
+            """ Pull hosts from session checking their credentials. """
+            for hostname in session.iter_hostnames():
+                if not all(session.get_credentials(hostname)):
+                    raise errors.LmiInvalidOptions('--processes: missing'
+                            ' credentials of host "%s", worker processes'
+                            ' can not ask for them' % hostname)
+                yield hostname
+
+        hostnames = _iter_hostnames()
+        # the first hosts decide the number of workers needed
+        first = []
+        for hostname in hostnames:
+            first.append(hostname)
+            if len(first) == self.processes:
+                break
+        hostnames = itertools.chain(first, hostnames)
+        count = len(first) or 1
+        # Number of hosts passed to each worker ahead of its results. The
+        # worker reads ahead hosts connected in batches and hosts being
+        # processed by its executor.
+        window = 2 * self.jobs + 2 * max(1, session.prefetch) + 1
+        workers = []
+        fds = []
+        feeds = []
+        # indexes of workers, that sent all their frames
+        finished = set()
+        # number of hosts passed to each worker, that were not answered
+        unanswered = [0] * count
+        # { hostname : index, ... } of worker processing the host, whose
+        # result was not yet yielded
+        owners = {}
+        # { hostname : frame, ... } for each worker, frames of hosts
+        # skipped by worker arrive before the results of preceding hosts
+        early = [{} for _ in range(count)]
+        # hostnames in the order passed to workers
+        sent = collections.deque()
+
+        def _read(index):
+            """
+            Read the next frame of worker. Returns ``None`` when the worker
+            is done.
+            """
+            frame = reader.read(index)
+            if frame is None:
+                raise errors.LmiError('worker process %d exited'
+                        ' unexpectedly' % workers[index].pid)
+            if frame[0] == _FRAME_ERROR:
+                raise frame[1]
+            if frame[0] == _FRAME_DONE:
+                finished.add(index)
+                session.merge_shard(frame[1], frame[2], frame[3])
+                return None
+            if owners.get(frame[1]) != index:
+                raise errors.LmiError('unexpected result of host "%s"'
+                        ' from worker process' % frame[1])
+            unanswered[index] -= 1
+            return frame
+
+        def _feed():
+            """ Pass hosts to workers, until each has enough of them. """
+            while feeds:
+                index = min(range(count), key=unanswered.__getitem__)
+                if unanswered[index] >= window:
+                    break
+                try:
+                    hostname = next(hostnames)
+                except StopIteration:
+                    _close_feeds()
+                    break
+                os.write(feeds[index], (hostname + '\n').encode('utf-8'))
+                owners[hostname] = index
+                unanswered[index] += 1
+                sent.append(hostname)
+
+        def _close_feeds():
+            """ Let the workers know, there are no more hosts. """
+            while feeds:
+                os.close(feeds.pop())
+
+        try:
+            pipes = [(os.pipe(), os.pipe()) for _ in range(count)]
+            for index, (feed_pipe, result_pipe) in enumerate(pipes):
+                close_fds = []
+                for other, (other_feed, other_result) in enumerate(pipes):
+                    close_fds.append(other_feed[1])
+                    close_fds.append(other_result[0])
+                    if other != index:
+                        close_fds.append(other_feed[0])
+                        close_fds.append(other_result[1])
+                worker = multiprocessing.Process(target=_shard_worker,
+                        args=(func, session.make_shard(
+                                _read_hosts(feed_pipe[0])),
+                            self.executor_factory(self.jobs),
+                            result_pipe[1], failed_func, close_fds))
+                worker.daemon = True
+                worker.start()
+                workers.append(worker)
+            for feed_pipe, result_pipe in pipes:
+                os.close(feed_pipe[0])
+                os.close(result_pipe[1])
+                feeds.append(feed_pipe[1])
+                fds.append(result_pipe[0])
+            reader = _ShardReader(fds)
+            processed = 0
+            while True:
+                _feed()
+                if not sent:
+                    break
+                hostname = sent.popleft()
+                index = owners[hostname]
+                frame = early[index].pop(hostname, None)
+                while frame is None and index not in finished:
+                    frame = _read(index)
+                    if frame is not None and frame[1] != hostname:
+                        early[index][frame[1]] = frame
+                        frame = None
+                        # keep the worker busy until the host is answered
+                        _feed()
+                del owners[hostname]
+                if frame is None or frame[0] == _FRAME_SKIPPED:
+                    continue
+                processed += 1
+                yield RemoteHost(hostname), frame[2]
+            for index in range(count):
+                while index not in finished:
+                    _read(index)
+            if processed == 0:
+                raise errors.LmiNoConnections('no successful connection made')
+        finally:
+            _close_feeds()
+            for index, worker in enumerate(workers):
+                if index not in finished and worker.is_alive():
+                    worker.terminate()
+                worker.join()
+            for fd in fds:
+                os.close(fd)
+
+def parse_network(network):
+    """
+    Parse network address in CIDR notation.
+
+    :param string network: Network address (e.g. ``"10.0.0.0/24"``).
+    :returns: Triple ``(family, address, prefix_length)``, where ``address``
+        is an integer.
+    :rtype: tuple
+    """
+    address, _, prefix = network.partition('/')
+    family = socket.AF_INET6 if ':' in address else socket.AF_INET
+    try:
+        packed = socket.inet_pton(family, address)
+    except socket.error:
+        raise ValueError('invalid network address "%s"' % network)
+    bits = len(packed) * 8
+    try:
+        prefix = int(prefix) if prefix else bits
+    except ValueError:
+        prefix = -1
+    if prefix < 0 or prefix > bits:
+        raise ValueError('invalid prefix length in "%s"' % network)
+    return family, int(binascii.hexlify(packed), 16), prefix
+
+def _resolve_host(hostname):
+    """
+    Get the address of host.
+
+    :param string hostname: Hostname optionally with scheme and port.
+    :returns: Pair ``(family, address)``, where ``address`` is an integer,
+        or ``None`` if the host can not be resolved.
+    :rtype: tuple
+    """
+    if '://' not in hostname:
+        hostname = 'https://' + hostname
+    hostname = urlparse.urlparse(hostname).hostname
+    try:
+        family, _, _, _, sockaddr = socket.getaddrinfo(
+                hostname, None, 0, socket.SOCK_STREAM)[0]
+        packed = socket.inet_pton(family, sockaddr[0])
+    except (socket.error, IndexError, TypeError) as err:
+        LOG().debug('failed to resolve "%s": %s', hostname, err)
+        return None
+    return family, int(binascii.hexlify(packed), 16)
+
+class AimdController(object):
+    """
+    Controller of the number of items processed at once using additive
+    increase and multiplicative decrease. The limit grows by one for every
+    ``limit`` successful items. It is multiplied by ``decrease`` when an
+    item fails or when it takes more than ``latency_factor`` times the
+    average time, but at most once per ``limit`` processed items.
+
+    :param integer maximum: Upper bound of the limit.
+    :param integer initial: Initial limit.
+    :param float latency_factor: How many times slower than average an item
+        must be processed to be treated as a sign of overloading.
+    :param float decrease: Factor applied to the limit when decreasing.
+    """
+
+    def __init__(self, maximum, initial=2, latency_factor=2.0, decrease=0.5):
+        self.maximum = max(1, maximum)
+        self.limit = float(min(self.maximum, max(1, initial)))
+        self.latency_factor = latency_factor
+        self.decrease = decrease
+        # exponentially weighted moving average of processing time
+        self.average = None
+        self._processed = 0
+        self._last_decrease = 0
+
+    @property
+    def allowed(self):
+        """ Number of items, that may be processed at once. """
+        return int(self.limit)
+
+    def record(self, elapsed, failed=False):
+        """
+        Adjust the limit for a processed item.
+
+        :param float elapsed: Number of seconds the item took to process.
+        :param boolean failed: Whether the processing failed.
+        """
+        self._processed += 1
+        slow = (   self.average is not None
+               and elapsed > self.average * self.latency_factor)
+        if self.average is None:
+            self.average = elapsed
+        elif elapsed < self.average:
+            self.average += (elapsed - self.average) * 0.1
+        elif not slow:
+            # follow the growth of processing times slowly, so that the
+            # overloading is noticed before hosts start to fail
+            self.average += (elapsed - self.average) * 0.01
+        if failed or slow:
+            if self._processed - self._last_decrease >= self.limit:
+                self.limit = max(1.0, self.limit * self.decrease)
+                self._last_decrease = self._processed
+                LOG().debug('decreased number of jobs to %d', self.allowed)
+        else:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+class AdaptiveExecutor(ThreadPoolExecutor):
+    """
+    Thread pool executor adjusting the number of items processed at once
+    with :py:class:`AimdController`. Up to ``jobs`` items are processed at
+    once, but less if they slow down or fail. Additionally the number of
+    items processed at once for hosts of particular subnets can be limited.
+
+    :param integer jobs: Maximum number of items processed at once.
+    :param list subnet_jobs: Pairs ``(network, jobs)`` limiting the number
+        of items processed at once, whose hosts belong to given network in
+        CIDR notation. The first matching network applies.
+    :param float latency_factor: See :py:class:`AimdController`.
+    :param callable hostname_func: Function returning hostname of an item.
+        Needed only for ``subnet_jobs``. Defaults to the ``hostname``
+        attribute of item.
+    :param boolean adaptive: Whether to adjust the number of items
+        processed at once. If ``False``, only subnet limits apply.
+    """
+
+    def __init__(self, jobs=1, subnet_jobs=(), latency_factor=2.0,
+            hostname_func=None, adaptive=True):
+        ThreadPoolExecutor.__init__(self, jobs)
+        self.subnet_jobs = [  (parse_network(n), max(1, j))
+                           for n, j in subnet_jobs]
+        self.latency_factor = latency_factor
+        if hostname_func is None:
+            hostname_func = lambda item: item.hostname
+        self.hostname_func = hostname_func
+        self.adaptive = adaptive
+        # { hostname : subnet_index, ... }
+        self._subnets = {}
+
+    def _get_subnet(self, item):
+        """
+        :returns: Index to ``subnet_jobs`` applying to the item or ``None``.
+        """
+        if not self.subnet_jobs:
+            return None
+        hostname = self.hostname_func(item)
+        if hostname not in self._subnets:
+            subnet = None
+            address = _resolve_host(hostname)
+            for index, ((family, net, prefix), _) in enumerate(
+                    self.subnet_jobs):
+                if address is None or address[0] != family:
+                    continue
+                shift = (32 if family == socket.AF_INET else 128) - prefix
+                if address[1] >> shift == net >> shift:
+                    subnet = index
+                    break
+            self._subnets[hostname] = subnet
+        return self._subnets[hostname]
+
+    def imap(self, func, items, failed_func=None):
+        controller = AimdController(self.jobs,
+                initial=2 if self.adaptive else self.jobs,
+                latency_factor=self.latency_factor)
+        scheduler = _Scheduler(controller,
+                [jobs for _, jobs in self.subnet_jobs], self.adaptive)
+        workers = []
+        pending = collections.deque()
+        items = iter(items)
+        try:
+            for _ in range(self.jobs):
+                worker = threading.Thread(target=_scheduled_worker,
+                        args=(scheduler,))
+                worker.daemon = True
+                worker.start()
+                workers.append(worker)
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < 2 * self.jobs:
+                    try:
+                        task = _Task(func, next(items), failed_func)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending.append(task)
+                    scheduler.add(task, self._get_subnet(task.item))
+                if not pending:
+                    break
+                task = pending.popleft()
+                task.wait()
+                if task.error is not None:
+                    raise task.error
+                yield task.item, task.result
+        finally:
+            for task in pending:
+                task.cancelled = True
+            scheduler.close()
+
+class _Scheduler(object):
+    """
+    Hands tasks of :py:class:`AdaptiveExecutor` over to worker threads,
+    while keeping the number of tasks processed at once within limits.
+
+    :param controller: Controller of the overall limit.
+    :type controller: :py:class:`AimdController`
+    :param list subnet_limits: Limits of subnets indexed by subnet index.
+    :param boolean adaptive: Whether to report processed tasks to the
+        controller.
+    """
+
+    def __init__(self, controller, subnet_limits, adaptive=True):
+        self._controller = controller
+        self._subnet_limits = subnet_limits
+        self._adaptive = adaptive
+        self._cond = threading.Condition()
+        # pairs (task, subnet_index) in order of items
+        self._waiting = []
+        self._running = 0
+        self._subnet_running = collections.defaultdict(int)
+        self._closed = False
+
+    def add(self, task, subnet):
+        """ Schedule the task for processing. """
+        with self._cond:
+            self._waiting.append((task, subnet))
+            self._cond.notify()
+
+    def get(self):
+        """
+        Wait for the first task, that can be processed within the limits.
+
+        :returns: Pair ``(task, subnet_index)`` or ``None`` if closed.
+        """
+        with self._cond:
+            while not self._closed:
+                if self._running < self._controller.allowed:
+                    for index, (task, subnet) in enumerate(self._waiting):
+                        if (   subnet is None
+                           or  self._subnet_running[subnet]
+                             < self._subnet_limits[subnet]):
+                            del self._waiting[index]
+                            self._running += 1
+                            self._subnet_running[subnet] += 1
+                            return task, subnet
+                self._cond.wait()
+            return None
+
+    def finish(self, task, subnet):
+        """ Account for processed task. """
+        with self._cond:
+            self._running -= 1
+            self._subnet_running[subnet] -= 1
+            if self._adaptive:
+                self._controller.record(task.elapsed, task.failed)
+            self._cond.notify_all()
+
+    def close(self):
+        """ Make the workers terminate. """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+def _scheduled_worker(scheduler):
+    """ Thread body processing tasks of scheduler until it's closed. """
+    while True:
+        scheduled = scheduler.get()
+        if scheduled is None:
+            break
+        scheduled[0].run()
+        scheduler.finish(*scheduled)
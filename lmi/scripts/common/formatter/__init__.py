@@ -35,13 +35,88 @@ argument which gets rendered and printed to output stream. Each formatter
 expects different argument, please refer to doc string of particular class.
 """
 
+import collections
+import errno
 import itertools
+import json
+
+from lmi.scripts.common import errors
+from lmi.scripts.common.formatter import columnar
+
+_encode_json_string = json.encoder.encode_basestring_ascii
+
+class OutputBuffer(object):
+    """
+    Buffer assembling the output of formatter, so that the stream is written
+    in large chunks instead of single cells. Unicode strings are encoded
+    to UTF-8.
+
+    Broken pipe is reported with
+    :py:exc:`lmi.scripts.common.errors.LmiOutputClosed`. Any following data
+    are discarded.
+
+    :param file stream: Output stream.
+    :param integer size: Number of bytes collected before they are written
+        to the stream.
+    """
+
+    def __init__(self, stream, size=65536):
+        self.stream = stream
+        self.size = size
+        self.closed = False
+        self._chunks = []
+        self._length = 0
+
+    def write(self, data):
+        """
+        Add data to the buffer. It's written to the stream, if the buffer
+        gets full.
+
+        :param string data: Data to write.
+        """
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+        self._chunks.append(data)
+        self._length += len(data)
+        if self._length >= self.size:
+            self._write_chunks()
+
+    def _write_chunks(self):
+        """ Write the content of buffer to the stream. """
+        if self._chunks:
+            data = b''.join(self._chunks)
+            self._chunks = []
+            self._length = 0
+            self._call(self.stream.write, data)
+
+    def _call(self, method, *args):
+        """
+        Call the method of stream translating broken pipe to
+        :py:exc:`lmi.scripts.common.errors.LmiOutputClosed`.
+        """
+        if self.closed:
+            raise errors.LmiOutputClosed('output stream is closed')
+        try:
+            method(*args)
+        except (IOError, OSError) as exc:
+            if exc.errno != errno.EPIPE:
+                raise
+            self.closed = True
+            raise errors.LmiOutputClosed('output stream is closed')
+
+    def flush(self):
+        """ Write the content of buffer and flush the stream. """
+        self._write_chunks()
+        if hasattr(self.stream, 'flush'):
+            self._call(self.stream.flush)
 
 class Formatter(object):
     """
     Base formatter class.
 
     It produces string representation of given argument and prints it.
+    Output is assembled in :py:attr:`out` buffer, which is flushed, when
+    all the data given to :py:meth:`produce_output` are printed.
 
     This formatter supports following commands:
         :py:class:`NewHostCommand`.
@@ -51,12 +126,15 @@ class Formatter(object):
     :param boolean no_headings: If table headings should be omitted.
     """
 
+    #: Extension of files written by formatter.
+    file_extension = 'txt'
+
     def __init__(self, stream, padding=0, no_headings=False):
         if not isinstance(padding, (int, long)):
             raise TypeError("padding must be an integer")
         if padding < 0:
             padding = 0
-        self.out = stream
+        self.out = OutputBuffer(stream)
         self.padding = padding
         self.no_headings = no_headings
 
@@ -87,8 +165,8 @@ class Formatter(object):
             ``line`` argument.
         :param dictionary kwargs: Keyword arguments to ``format()`` function.
         """
-        self.out.write(' ' * self.padding + line.format(*args, **kwargs))
-        self.out.write("\n")
+        self.out.write(' ' * self.padding + line.format(*args, **kwargs)
+                + "\n")
 
     def print_host(self, hostname):
         """
@@ -96,9 +174,22 @@ class Formatter(object):
 
         :param string hostname: Hostname to print.
         """
-        self.out.write("="*79 + "\n")
-        self.out.write("Host: %s\n" % hostname)
-        self.out.write("="*79 + "\n")
+        self.out.write("%s\nHost: %s\n%s\n" % ("="*79, hostname, "="*79))
+
+    def end_host(self):
+        """
+        Called when all the data of host were produced. Separates outputs
+        of hosts with an empty line.
+        """
+        self.out.write("\n")
+        self.out.flush()
+
+    def finish(self):
+        """
+        Called when there are no more data to produce. Subclasses may print
+        what is left.
+        """
+        self.out.flush()
 
     def produce_output(self, data):
         """
@@ -114,6 +205,7 @@ class Formatter(object):
             :py:class:`FormatterCommand`.
         """
         self.print_line(str(data))
+        self.out.flush()
 
 class ListFormatter(Formatter):
     """
@@ -170,6 +262,15 @@ class ListFormatter(Formatter):
         self.out.write("\n%s:\n" % title)
         self.want_header = True
 
+    def set_table_header(self, command):
+        """
+        Store the header of following tables.
+
+        :param command: Command with column names.
+        :type command: :py:class:`NewTableHeaderCommand`
+        """
+        self.column_names = command.columns
+
     def print_header(self):
         """ Print table header. """
         if self.no_headings:
@@ -194,9 +295,10 @@ class ListFormatter(Formatter):
             elif isinstance(row, NewTableCommand):
                 self.print_table_title(row.title)
             elif isinstance(row, NewTableHeaderCommand):
-                self.column_names = row.columns
+                self.set_table_header(row)
             else:
                 self.print_row(row)
+        self.out.flush()
 
 class TableFormatter(ListFormatter):
     """
@@ -207,6 +309,13 @@ class TableFormatter(ListFormatter):
     them until the table is complete. Column sizes are computed afterwards
     and the table is printed at once.
 
+    Large tables can be streamed instead. If ``window`` is given, column
+    sizes are computed from the first ``window`` rows only. Following rows
+    are printed as they come. Column sizes can be also declared in
+    :py:class:`NewTableHeaderCommand`, then no row is stored at all. Value
+    not fitting its column shifts the following ones. They get aligned again
+    as soon as shorter values make up for it.
+
     This formatter supports following commands:
         * :py:class:`NewHostCommand`
         * :py:class:`NewTableCommand`
@@ -214,48 +323,134 @@ class TableFormatter(ListFormatter):
 
     The command must be provided as content of one row. This row is then not
     printed and the command is executed.
+
+    :param integer window: Maximum number of rows stored to compute column
+        sizes. ``None`` means the whole table.
     """
-    def __init__(self, stream, padding=0, no_headings=False):
+    def __init__(self, stream, padding=0, no_headings=False, window=None):
         super(TableFormatter, self).__init__(stream, padding, no_headings)
+        if window is not None and window < 1:
+            raise ValueError("window must be a positive integer")
         self.stash = []
+        self.window = window
+        # sizes declared by table header command
+        self.declared_sizes = None
+        # sizes of columns of table being printed, rows are not stored
+        # once they are known
+        self.column_sizes = None
+        # line format for rows, whose values fit column sizes
+        self._template = None
+        self._template_sizes = None
+        self._line_length = None
 
     def print_text_row(self, row, column_size):
-        for i in xrange(len(row)):
-            size = column_size[i]
-            item = self.render_value(unicode(row[i]).ljust(size))
-            self.out.write(item)
-            self.out.write(" ")
-        self.out.write("\n")
+        """
+        Print single row aligned to columns.
+
+        :param list row: Cells of row already converted to unicode.
+        :param list column_size: Sizes of columns.
+        """
+        if self._template_sizes is not column_size:
+            self._template = u"".join(
+                    u"%%-%ds " % size for size in column_size) + u"\n"
+            self._template_sizes = column_size
+            self._line_length = sum(column_size) + len(column_size) + 1
+        if len(row) == len(column_size):
+            line = self._template % tuple(row)
+            # longer line means some value does not fit its column
+            if len(line) == self._line_length:
+                self.out.write(self.render_value(line))
+                return
+        # width taken by values not fitting their columns
+        excess = 0
+        cells = []
+        for i, cell in enumerate(row):
+            # rows printed in streaming mode may have more cells than
+            # the known sizes
+            size = (column_size[i] if i < len(column_size) else 0) - excess
+            cell = cell.ljust(size)
+            excess = len(cell) - size
+            cells.append(cell)
+            cells.append(u" ")
+        cells.append(u"\n")
+        self.out.write(self.render_value(u"".join(cells)))
+
+    def print_header(self):
+        """ Print table header. """
+        if not self.no_headings and self.column_names:
+            self.print_text_row([unicode(c) for c in self.column_names],
+                    self.column_sizes)
+        self.want_header = False
 
     def print_stash(self):
+        """
+        Print stored rows. Column sizes are computed from them, unless
+        already known.
+        """
         if not self.stash:
             return
 
-        # Compute column sizes
-        column_sizes = []
-        for i in xrange(len(self.column_names)):
-            column_sizes.append(len(self.column_names[i]))
-        for row in self.stash:
-            for i in xrange(len(row)):
-                row_length = len(unicode(row[i]))
-                if column_sizes[i] < row_length:
-                    column_sizes[i] = row_length
-
-        # print headers
-        if not self.no_headings:
-            self.print_text_row(self.column_names, column_sizes)
+        if self.column_sizes is None:
+            # Compute column sizes
+            column_sizes = [len(unicode(c)) for c in self.column_names or ()]
+            for row in self.stash:
+                if len(row) > len(column_sizes):
+                    column_sizes.extend([0] * (len(row) - len(column_sizes)))
+                for i, cell in enumerate(row):
+                    if column_sizes[i] < len(cell):
+                        column_sizes[i] = len(cell)
+            self.column_sizes = column_sizes
+
+        if self.want_header:
+            self.print_header()
         # print stashed rows
         for row in self.stash:
-            self.print_text_row(row, column_sizes)
+            self.print_text_row(row, self.column_sizes)
         self.stash = []
 
+    def end_table(self):
+        """
+        Print the rest of current table. Column sizes of the next one will
+        be computed again.
+        """
+        self.print_stash()
+        self.column_sizes = self.declared_sizes
+        self.want_header = True
+
+    def set_table_header(self, command):
+        """
+        Store the header of following tables together with declared column
+        sizes.
+
+        :param command: Command with column names.
+        :type command: :py:class:`NewTableHeaderCommand`
+        """
+        super(TableFormatter, self).set_table_header(command)
+        if command.widths is not None:
+            self.declared_sizes = [ max(len(unicode(c)), w)
+                                  for c, w in itertools.izip_longest(
+                                      command.columns or (), command.widths,
+                                      fillvalue=0)]
+        else:
+            self.declared_sizes = None
+        if not self.stash:
+            self.column_sizes = self.declared_sizes
+
     def print_row(self, data):
         """
-        Print data row.
+        Print data row. It's stored until column sizes are known.
 
         :param tuple data: Data to print.
         """
-        self.stash.append(data)
+        cells = [unicode(v) for v in data]
+        if self.column_sizes is not None:
+            if self.want_header:
+                self.print_header()
+            self.print_text_row(cells, self.column_sizes)
+            return
+        self.stash.append(cells)
+        if self.window is not None and len(self.stash) >= self.window:
+            self.print_stash()
 
     def print_host(self, hostname):
         """
@@ -263,7 +458,7 @@ class TableFormatter(ListFormatter):
 
         :param string hostname: Hostname to print.
         """
-        self.print_stash()
+        self.end_table()
         super(TableFormatter, self).print_host(hostname)
 
     def print_table_title(self, title):
@@ -272,7 +467,7 @@ class TableFormatter(ListFormatter):
 
         :param string title: Title to print.
         """
-        self.print_stash()
+        self.end_table()
         self.out.write("\n%s:\n" % title)
 
     def produce_output(self, rows):
@@ -286,7 +481,8 @@ class TableFormatter(ListFormatter):
         :type rows: list or generator
         """
         super(TableFormatter, self).produce_output(rows)
-        self.print_stash()
+        self.end_table()
+        self.out.flush()
 
 class CsvFormatter(ListFormatter):
     """
@@ -298,6 +494,8 @@ class CsvFormatter(ListFormatter):
         * :py:class:`NewTableHeaderCommand`
     """
 
+    file_extension = 'csv'
+
     def render_value(self, val):
         if isinstance(val, basestring):
             if isinstance(val, unicode):
@@ -312,6 +510,208 @@ class CsvFormatter(ListFormatter):
     def print_text_row(self, row):
         self.print_line(",".join(self.render_value(v) for v in row))
 
+class JsonLinesFormatter(ListFormatter):
+    """
+    Renders each row as a JSON object on a single line. Types of values are
+    preserved. Each object looks like: ::
+
+        {"host": "server", "table": null, "row": {"Name": "sshd", ...}}
+
+    Where ``host`` is the name of host given by the last
+    :py:class:`NewHostCommand` and ``table`` a title of the last
+    :py:class:`NewTableCommand`. Both are ``null`` if not given. ``row`` is
+    a list of values, when column names are not known.
+
+    This formatter supports following commands:
+        * :py:class:`NewHostCommand`
+        * :py:class:`NewTableCommand`
+        * :py:class:`NewTableHeaderCommand`
+    """
+
+    file_extension = 'jsonl'
+
+    def __init__(self, stream, padding=0, no_headings=False):
+        super(JsonLinesFormatter, self).__init__(stream, padding, no_headings)
+        self.hostname = None
+        self.title = None
+        # beginning of serialized row and serialized column names
+        self._prefix = None
+        self._keys = None
+
+    def render_value(self, val):
+        """
+        Convert the value to an object serializable to JSON.
+
+        :param val: Any value to render.
+        :rtype: ``None``, boolean, number, unicode, list or dictionary
+        """
+        if val is None or isinstance(val, (bool, int, long, float, unicode)):
+            return val
+        if isinstance(val, str):
+            return val.decode('utf-8', 'replace')
+        if isinstance(val, (list, tuple, set, frozenset)):
+            return [self.render_value(v) for v in val]
+        if isinstance(val, dict):
+            return dict((unicode(k), self.render_value(v))
+                    for k, v in val.items())
+        return super(JsonLinesFormatter, self).render_value(val).decode(
+                'utf-8', 'replace')
+
+    def make_object(self, row):
+        """
+        Make an object representing single row.
+
+        :param tuple row: Values of row.
+        :rtype: :py:class:`collections.OrderedDict`
+        """
+        values = [self.render_value(v) for v in row]
+        if self.column_names:
+            values = collections.OrderedDict(itertools.izip(
+                (self.render_value(c) for c in self.column_names), values))
+        return collections.OrderedDict((
+            ('host', self.hostname),
+            ('table', self.title),
+            ('row', values)))
+
+    def dump_value(self, val):
+        """
+        Serialize single value to JSON.
+
+        :param val: Any value to render.
+        :rtype: string
+        """
+        if isinstance(val, basestring):
+            if isinstance(val, str):
+                val = val.decode('utf-8', 'replace')
+            return _encode_json_string(val)
+        if val is None:
+            return 'null'
+        if val is True:
+            return 'true'
+        if val is False:
+            return 'false'
+        if isinstance(val, (int, long)):
+            return str(val)
+        return json.dumps(self.render_value(val))
+
+    def dump_row(self, row):
+        """
+        Serialize object representing single row to JSON. It's equal to
+        serialized :py:meth:`make_object`, only faster.
+
+        :param tuple row: Values of row.
+        :rtype: string
+        """
+        if self._prefix is None:
+            # rendered once for each table
+            self._prefix = '{"host": %s, "table": %s, "row": ' % (
+                    json.dumps(self.hostname), json.dumps(self.title))
+            self._keys = [ json.dumps(self.render_value(c)) + ': '
+                         for c in self.column_names or ()]
+        values = [self.dump_value(v) for v in row]
+        if self.column_names:
+            values = '{%s}' % ', '.join(k + v
+                    for k, v in itertools.izip(self._keys, values))
+        else:
+            values = '[%s]' % ', '.join(values)
+        return self._prefix + values + '}'
+
+    def print_text_row(self, row):
+        self.out.write(self.dump_row(row) + "\n")
+
+    def print_row(self, data):
+        self.print_text_row(data)
+
+    def print_host(self, hostname):
+        self.hostname = hostname
+        self.title = None
+        self._prefix = None
+
+    def print_table_title(self, title):
+        self.title = title
+        self._prefix = None
+
+    def set_table_header(self, command):
+        super(JsonLinesFormatter, self).set_table_header(command)
+        self._prefix = None
+
+    def end_host(self):
+        self.out.flush()
+
+class JsonFormatter(JsonLinesFormatter):
+    """
+    Renders rows of all tables and hosts as a single JSON array of objects
+    described in :py:class:`JsonLinesFormatter`. Rows are written as they
+    come. The array is closed by :py:meth:`Formatter.finish`.
+
+    This formatter supports following commands:
+        * :py:class:`NewHostCommand`
+        * :py:class:`NewTableCommand`
+        * :py:class:`NewTableHeaderCommand`
+    """
+
+    file_extension = 'json'
+
+    def __init__(self, stream, padding=0, no_headings=False):
+        super(JsonFormatter, self).__init__(stream, padding, no_headings)
+        self.rows_written = 0
+
+    def print_text_row(self, row):
+        self.out.write(("[\n" if self.rows_written == 0 else ",\n")
+                + self.dump_row(row))
+        self.rows_written += 1
+
+    def finish(self):
+        self.out.write("[]\n" if self.rows_written == 0 else "\n]\n")
+        self.out.flush()
+
+class BinaryFormatter(ListFormatter):
+    """
+    Writes rows in compact binary columnar format described in
+    :py:mod:`lmi.scripts.common.formatter.columnar`. Rows are stored by
+    blocks, strings are dictionary encoded. Use
+    :py:class:`lmi.scripts.common.formatter.columnar.Reader` to read the
+    output.
+
+    This formatter supports following commands:
+        * :py:class:`NewHostCommand`
+        * :py:class:`NewTableCommand`
+        * :py:class:`NewTableHeaderCommand`
+    """
+
+    file_extension = 'lmic'
+
+    def __init__(self, stream, padding=0, no_headings=False):
+        super(BinaryFormatter, self).__init__(stream, padding, no_headings)
+        self.writer = columnar.Writer(self.out)
+
+    def print_row(self, data):
+        if self.want_header:
+            self.writer.schema(self.column_names or ())
+            self.want_header = False
+        self.writer.add_row(data)
+
+    def print_host(self, hostname):
+        self.writer.host(hostname)
+        self.want_header = True
+
+    def print_table_title(self, title):
+        self.writer.title(title)
+        self.want_header = True
+
+    def set_table_header(self, command):
+        super(BinaryFormatter, self).set_table_header(command)
+        self.want_header = True
+
+    def end_host(self):
+        # rows of host must reach the output before it's flushed
+        self.writer.flush()
+        self.out.flush()
+
+    def finish(self):
+        self.writer.flush()
+        self.out.flush()
+
 class SingleFormatter(Formatter):
     """
     Meant to render and print attributes of single object.
@@ -363,6 +763,8 @@ class ShellFormatter(SingleFormatter):
         * :py:class:`NewHostCommand`
     """
 
+    file_extension = 'sh'
+
     def render_value(self, val):
         if isinstance(val, basestring):
             if isinstance(val, unicode):
@@ -402,6 +804,11 @@ class NewTableHeaderCommand(FormatterCommand):
     header and (if there are any data) print the table header.
     The table header will be printed in all subsequent tables, until
     new instance of this class arrives.
+
+    :param list columns: Column names.
+    :param list widths: Declared sizes of columns. They allow
+        :py:class:`TableFormatter` to print rows as they come.
     """
-    def __init__(self, columns=None):
+    def __init__(self, columns=None, widths=None):
         self.columns = columns
+        self.widths = widths
@@ -0,0 +1,454 @@
+# Copyright (c) 2013, Red Hat, Inc. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of the FreeBSD Project.
+#
+# Authors: Michal Minar <miminar@redhat.com>
+#
+"""
+Module with compact binary columnar format used for bulk exports of lister
+commands. It is written by
+:py:class:`lmi.scripts.common.formatter.BinaryFormatter` and read with
+:py:class:`Reader`.
+
+File starts with ``MAGIC`` followed by frames. Each frame consists of a
+kind (``uint8``), length of payload (``uint32``) and the payload. All
+numbers are in network byte order. Frame kinds are:
+
+    ``FRAME_HOST``
+        Name of host, whose tables follow, encoded in UTF-8.
+    ``FRAME_TITLE``
+        Title of following tables encoded in UTF-8.
+    ``FRAME_SCHEMA``
+        Starts a new table. Number of columns (``uint16``) followed by their
+        names, each prefixed with its length (``uint16``).
+    ``FRAME_BLOCK``
+        Rows of current table stored by columns. Number of rows (``uint32``)
+        and number of columns (``uint16``) followed by a block of each
+        column.
+
+Column block starts with a type (``uint8``):
+
+    ``TYPE_NONE``
+        All values are ``None``. Nothing follows.
+    ``TYPE_BOOL``
+        A byte for each row: 0 for ``False``, 1 for ``True``, 2 for ``None``.
+    ``TYPE_INT``, ``TYPE_FLOAT``
+        A byte for each row telling, whether the value is present, followed
+        by an ``int64`` or ``double`` for each row.
+    ``TYPE_STRING``, ``TYPE_JSON``
+        Strings are dictionary encoded. Number of new dictionary entries
+        (``uint32``) is followed by the entries, each prefixed with its length
+        (variable length quantity, 7 bits in each byte, the highest bit set
+        in all but the last byte). Then comes the size of index (``uint8``: 1, 2 or 4) and
+        an index to the dictionary for each row. Index 0 stands for ``None``,
+        ``i`` for the ``i``-th entry. Values of ``TYPE_JSON`` columns are
+        JSON documents. They hold lists, dictionaries and columns with
+        values of mixed types.
+
+The dictionary is shared by all columns of table. Thus repeated values are
+stored just once per table.
+
+Reader
+------
+
+.. autoclass:: Reader
+    :members:
+
+"""
+
+import itertools
+import json
+import mmap
+import struct
+
+MAGIC = b'LMIC\x00\x01'
+
+FRAME_HOST = 1
+FRAME_TITLE = 2
+FRAME_SCHEMA = 3
+FRAME_BLOCK = 4
+
+TYPE_NONE = 0
+TYPE_BOOL = 1
+TYPE_INT = 2
+TYPE_FLOAT = 3
+TYPE_STRING = 4
+TYPE_JSON = 5
+
+_FRAME_HEADER = struct.Struct('!BI')
+_UINT8 = struct.Struct('!B')
+_UINT16 = struct.Struct('!H')
+_UINT32 = struct.Struct('!I')
+_BLOCK_HEADER = struct.Struct('!IH')
+_INDEX_FORMATS = {1 : 'B', 2 : 'H', 4 : 'I'}
+_INT64_MIN = -2**63
+_INT64_MAX = 2**63 - 1
+
+def _encode_text(text):
+    """ Encode string to UTF-8. """
+    if isinstance(text, unicode):
+        return text.encode('utf-8')
+    return str(text)
+
+def _encode_length(length):
+    """ Encode length as variable length quantity. """
+    data = bytearray()
+    while length >= 0x80:
+        data.append((length & 0x7f) | 0x80)
+        length >>= 7
+    data.append(length)
+    return str(data)
+
+def _decode_length(buf, offset):
+    """
+    Decode length encoded as variable length quantity.
+
+    :returns: Pair of the length and offset following it.
+    :rtype: tuple
+    """
+    length = 0
+    shift = 0
+    while True:
+        byte = ord(buf[offset])
+        offset += 1
+        length |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return length, offset
+        shift += 7
+
+def _column_type(values):
+    """
+    Choose the type of column block for given values.
+
+    :rtype: integer
+    """
+    kinds = set()
+    for val in values:
+        if val is None:
+            continue
+        if isinstance(val, bool):
+            kinds.add(TYPE_BOOL)
+        elif isinstance(val, (int, long)):
+            kinds.add(TYPE_INT if _INT64_MIN <= val <= _INT64_MAX
+                    else TYPE_JSON)
+        elif isinstance(val, float):
+            kinds.add(TYPE_FLOAT)
+        elif isinstance(val, basestring):
+            kinds.add(TYPE_STRING)
+        else:
+            kinds.add(TYPE_JSON)
+    if not kinds:
+        return TYPE_NONE
+    if len(kinds) > 1:
+        return TYPE_JSON
+    return kinds.pop()
+
+class Writer(object):
+    """
+    Encoder writing frames of columnar format to a stream. Rows are stored
+    until ``block_size`` of them is collected or the table ends.
+
+    :param file stream: Output stream opened in binary mode.
+    :param integer block_size: Maximum number of rows in single block.
+    """
+
+    def __init__(self, stream, block_size=1024):
+        self.out = stream
+        self.block_size = max(1, block_size)
+        self._started = False
+        self._rows = []
+        # { string : index, ... } dictionary of current table
+        self._dictionary = {}
+
+    def _write_frame(self, kind, payload):
+        """ Write single frame. """
+        if not self._started:
+            self.out.write(MAGIC)
+            self._started = True
+        self.out.write(_FRAME_HEADER.pack(kind, len(payload)))
+        self.out.write(payload)
+
+    def host(self, hostname):
+        """ Start output of new host. """
+        self.flush()
+        self._write_frame(FRAME_HOST, _encode_text(hostname))
+
+    def title(self, title):
+        """ Set the title of following tables. """
+        self.flush()
+        self._write_frame(FRAME_TITLE, _encode_text(title or ''))
+
+    def schema(self, columns):
+        """
+        Start new table.
+
+        :param list columns: Column names.
+        """
+        self.flush()
+        self._dictionary = {}
+        parts = [_UINT16.pack(len(columns))]
+        for name in columns:
+            name = _encode_text(name)
+            parts.append(_UINT16.pack(len(name)))
+            parts.append(name)
+        self._write_frame(FRAME_SCHEMA, b''.join(parts))
+
+    def add_row(self, row):
+        """
+        Add a row to current table.
+
+        :param tuple row: Values of row.
+        """
+        self._rows.append(row)
+        if len(self._rows) >= self.block_size:
+            self.flush()
+
+    def _encode_strings(self, values, parts):
+        """ Encode dictionary indexes of strings. """
+        dictionary = self._dictionary
+        new_entries = []
+        indexes = []
+        for val in values:
+            if val is None:
+                indexes.append(0)
+                continue
+            index = dictionary.get(val)
+            if index is None:
+                index = dictionary[val] = len(dictionary) + 1
+                new_entries.append(val)
+            indexes.append(index)
+        parts.append(_UINT32.pack(len(new_entries)))
+        for entry in new_entries:
+            entry = _encode_text(entry)
+            parts.append(_encode_length(len(entry)))
+            parts.append(entry)
+        size = 1 if len(dictionary) < 2**8 else (
+                2 if len(dictionary) < 2**16 else 4)
+        parts.append(_UINT8.pack(size))
+        parts.append(struct.pack('!%d%s' % (len(indexes),
+            _INDEX_FORMATS[size]), *indexes))
+
+    def _encode_column(self, values, parts):
+        """ Encode block of single column. """
+        col_type = _column_type(values)
+        parts.append(_UINT8.pack(col_type))
+        count = len(values)
+        if col_type == TYPE_BOOL:
+            parts.append(bytearray(2 if v is None else int(v)
+                for v in values))
+        elif col_type in (TYPE_INT, TYPE_FLOAT):
+            parts.append(bytearray(v is not None for v in values))
+            parts.append(struct.pack(
+                '!%d%s' % (count, 'q' if col_type == TYPE_INT else 'd'),
+                *[0 if v is None else v for v in values]))
+        elif col_type == TYPE_STRING:
+            self._encode_strings(values, parts)
+        elif col_type == TYPE_JSON:
+            self._encode_strings([ None if v is None else json.dumps(v,
+                                       sort_keys=True, default=str)
+                                 for v in values], parts)
+
+    def flush(self):
+        """ Write rows stored as a block. """
+        if not self._rows:
+            return
+        rows = self._rows
+        self._rows = []
+        width = max(len(row) for row in rows)
+        parts = [_BLOCK_HEADER.pack(len(rows), width)]
+        for i in xrange(width):
+            self._encode_column(
+                    [row[i] if i < len(row) else None for row in rows], parts)
+        self._write_frame(FRAME_BLOCK, b''.join(str(p) for p in parts))
+
+class Table(object):
+    """
+    Table read from columnar file. Its rows are decoded lazily by blocks,
+    when iterated.
+
+    :param buf: Memory mapped file.
+    :param string hostname: Name of host, the table belongs to.
+    :param string title: Title of table.
+    :param list columns: Column names.
+    """
+
+    def __init__(self, buf, hostname, title, columns):
+        self._buf = buf
+        self.hostname = hostname
+        self.title = title
+        self.columns = columns
+        # offsets of payloads of block frames
+        self.blocks = []
+
+    def __iter__(self):
+        """
+        Yield rows of table as tuples.
+        """
+        dictionary = [None]
+        for offset in self.blocks:
+            count, width = _BLOCK_HEADER.unpack_from(self._buf, offset)
+            offset += _BLOCK_HEADER.size
+            columns = []
+            for _ in xrange(width):
+                values, offset = self._decode_column(
+                        offset, count, dictionary)
+                columns.append(values)
+            for row in itertools.izip(*columns):
+                yield row
+
+    def _decode_strings(self, offset, count, dictionary):
+        """ Decode dictionary encoded strings. """
+        buf = self._buf
+        new_entries = _UINT32.unpack_from(buf, offset)[0]
+        offset += _UINT32.size
+        for _ in xrange(new_entries):
+            length, offset = _decode_length(buf, offset)
+            dictionary.append(
+                    buf[offset:offset + length].decode('utf-8', 'replace'))
+            offset += length
+        size = _UINT8.unpack_from(buf, offset)[0]
+        offset += _UINT8.size
+        fmt = '!%d%s' % (count, _INDEX_FORMATS[size])
+        indexes = struct.unpack_from(fmt, buf, offset)
+        return indexes, offset + struct.calcsize(fmt)
+
+    def _decode_column(self, offset, count, dictionary):
+        """
+        Decode block of single column.
+
+        :returns: Pair of values and offset of the next block.
+        :rtype: tuple
+        """
+        buf = self._buf
+        col_type = _UINT8.unpack_from(buf, offset)[0]
+        offset += _UINT8.size
+        if col_type == TYPE_NONE:
+            return itertools.repeat(None, count), offset
+        if col_type == TYPE_BOOL:
+            flags = struct.unpack_from('!%dB' % count, buf, offset)
+            return ( (False, True, None)[f] for f in flags ), offset + count
+        if col_type in (TYPE_INT, TYPE_FLOAT):
+            present = struct.unpack_from('!%dB' % count, buf, offset)
+            offset += count
+            fmt = '!%d%s' % (count, 'q' if col_type == TYPE_INT else 'd')
+            values = struct.unpack_from(fmt, buf, offset)
+            return ( v if p else None for p, v in itertools.izip(
+                     present, values)), offset + struct.calcsize(fmt)
+        if col_type in (TYPE_STRING, TYPE_JSON):
+            indexes, offset = self._decode_strings(offset, count, dictionary)
+            if col_type == TYPE_STRING:
+                return (dictionary[i] for i in indexes), offset
+            return ( None if i == 0 else json.loads(dictionary[i])
+                   for i in indexes), offset
+        raise ValueError('unknown column type %d' % col_type)
+
+class Reader(object):
+    """
+    Reader of file in columnar format. The file is memory mapped, only the
+    blocks being iterated are decoded. ::
+
+        with Reader('packages.lmic') as reader:
+            for table in reader:
+                for row in table:
+                    print table.hostname, row
+
+    :param string path: Path to the file.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        try:
+            self._buf = mmap.mmap(self._file.fileno(), 0,
+                    access=mmap.ACCESS_READ)
+        except (ValueError, mmap.error):
+            # empty file can not be mapped
+            self._file.close()
+            raise ValueError('"%s" is not a columnar file' % path)
+        if self._buf[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError('"%s" is not a columnar file' % path)
+
+    def close(self):
+        """ Unmap and close the file. """
+        self._buf.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        """
+        Yield tables of file in order. Only frame headers are read, until
+        the rows of table are iterated.
+
+        :rtype: generator over :py:class:`Table`
+        """
+        buf = self._buf
+        offset = len(MAGIC)
+        hostname = None
+        title = None
+        table = None
+        while offset + _FRAME_HEADER.size <= len(buf):
+            kind, length = _FRAME_HEADER.unpack_from(buf, offset)
+            offset += _FRAME_HEADER.size
+            if offset + length > len(buf):
+                raise ValueError('truncated frame at offset %d' % offset)
+            if kind == FRAME_BLOCK:
+                if table is None:
+                    table = Table(buf, hostname, title, None)
+                table.blocks.append(offset)
+            else:
+                if table is not None:
+                    yield table
+                    table = None
+                payload = buf[offset:offset + length]
+                if kind == FRAME_HOST:
+                    hostname = payload.decode('utf-8')
+                    title = None
+                elif kind == FRAME_TITLE:
+                    title = payload.decode('utf-8') or None
+                elif kind == FRAME_SCHEMA:
+                    table = Table(buf, hostname, title,
+                            self._decode_schema(payload))
+            offset += length
+        if table is not None:
+            yield table
+
+    @staticmethod
+    def _decode_schema(payload):
+        """ Get column names from the payload of schema frame. """
+        count = _UINT16.unpack_from(payload)[0]
+        offset = _UINT16.size
+        columns = []
+        for _ in xrange(count):
+            length = _UINT16.unpack_from(payload, offset)[0]
+            offset += _UINT16.size
+            columns.append(payload[offset:offset + length].decode('utf-8'))
+            offset += length
+        return columns
@@ -0,0 +1,211 @@
+# Copyright (c) 2013, Red Hat, Inc. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of the FreeBSD Project.
+#
+# Authors: Michal Minar <miminar@redhat.com>
+#
+"""
+Module with on-disk cache of results of read-only commands.
+
+Dashboards and scripts run the same listing commands over and over again.
+Each run makes the provider enumerate whole CIM classes. Rendered results
+of commands declaring ``CACHE_TTL`` property are therefore stored for each
+host and reused by following runs given ``--cached`` option.
+
+Each host has its own directory containing one file per cached result.
+This makes it cheap to drop all the results of a host, when it's modified
+by some command. Least recently used results are removed, when the size of
+cache exceeds its limit.
+
+ResultCache
+-----------
+
+.. autoclass:: ResultCache
+    :members:
+
+"""
+
+import cPickle
+import errno
+import hashlib
+import os
+import shutil
+import threading
+import time
+
+from lmi.scripts.common import get_logger
+
+LOG = get_logger(__name__)
+
+def make_key(*args):
+    """
+    Make a key of cached result from given arguments. Dictionaries are
+    normalized, so the order of their items does not matter.
+
+    :returns: Hexadecimal digest of arguments.
+    :rtype: string
+    """
+    def _normalize(value):
+        if isinstance(value, dict):
+            return sorted((k, _normalize(v)) for k, v in value.items())
+        if isinstance(value, (list, tuple)):
+            return [_normalize(v) for v in value]
+        return value
+    return hashlib.sha1(repr(_normalize(args))).hexdigest()
+
+class ResultCache(object):
+    """
+    Cache of command results stored as pickled lists of rows under given
+    directory. Modification time of each file marks its last use.
+
+    :param string path: Path to the cache directory.
+    :param integer max_size: Maximum size of the cache in bytes. ``None``
+        means no limit.
+    """
+
+    def __init__(self, path, max_size=None):
+        self._path = path
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        # whether any result was stored by this process
+        self._modified = False
+
+    def _host_dir(self, hostname):
+        """
+        :returns: Path to the directory with results of given host.
+        :rtype: string
+        """
+        return os.path.join(self._path,
+                hashlib.sha1(hostname.encode('utf-8')).hexdigest())
+
+    def get(self, hostname, key, ttl):
+        """
+        Get stored result.
+
+        :param string hostname: Name of host.
+        :param string key: Key made with :py:func:`make_key`.
+        :param float ttl: Maximum age of result in seconds.
+        :returns: Stored rows or ``None`` if there is no such result or
+            it's expired.
+        :rtype: list
+        """
+        path = os.path.join(self._host_dir(hostname), key)
+        try:
+            with open(path, 'rb') as cache_file:
+                stored_at, rows = cPickle.load(cache_file)
+        except (IOError, OSError) as exc:
+            if exc.errno != errno.ENOENT:
+                LOG().warn('failed to read cached result "%s": %s',
+                        path, exc)
+            return None
+        except Exception as exc:
+            LOG().warn('failed to load cached result "%s": %s', path, exc)
+            return None
+        if stored_at < time.time() - ttl:
+            return None
+        try:
+            # mark it as recently used
+            os.utime(path, None)
+        except OSError:
+            pass
+        return rows
+
+    def set(self, hostname, key, rows):
+        """
+        Store the result of command.
+
+        :param string hostname: Name of host.
+        :param string key: Key made with :py:func:`make_key`.
+        :param list rows: Rows to store. They must be picklable.
+        """
+        host_dir = self._host_dir(hostname)
+        path = os.path.join(host_dir, key)
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        try:
+            data = cPickle.dumps((time.time(), rows),
+                    cPickle.HIGHEST_PROTOCOL)
+        except Exception as exc:
+            LOG().debug('result of host "%s" can not be cached: %s',
+                    hostname, exc)
+            return
+        try:
+            if not os.path.isdir(host_dir):
+                os.makedirs(host_dir, 0o700)
+            with open(tmp_path, 'wb') as cache_file:
+                cache_file.write(data)
+            os.rename(tmp_path, path)
+        except (IOError, OSError) as exc:
+            LOG().warn('failed to store result of host "%s" in cache: %s',
+                    hostname, exc)
+            return
+        with self._lock:
+            self._modified = True
+
+    def invalidate(self, hostname):
+        """
+        Drop all stored results of host.
+
+        :param string hostname: Name of host.
+        """
+        host_dir = self._host_dir(hostname)
+        if not os.path.isdir(host_dir):
+            return
+        LOG().debug('dropping cached results of host "%s"', hostname)
+        shutil.rmtree(host_dir, ignore_errors=True)
+
+    def save(self):
+        """
+        Remove least recently used results until the cache fits its
+        maximum size. It's done only if some result was stored by this
+        process.
+        """
+        with self._lock:
+            modified, self._modified = self._modified, False
+        if not modified or self._max_size is None:
+            return
+        entries = []
+        total = 0
+        for dirpath, _dirnames, filenames in os.walk(self._path):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        if total <= self._max_size:
+            return
+        entries.sort()
+        for _mtime, size, path in entries:
+            if total <= self._max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        LOG().debug('result cache reduced to %d bytes', total)
@@ -31,14 +31,66 @@
 Module for session object representing all connection to remote hosts.
 """
 
-from collections import defaultdict
+import getpass
+import os
+import Queue
+import random
+import threading
+import time
 
 from lmi.scripts.common import errors
 from lmi.scripts.common import get_logger
-from lmi.shell.LMIConnection import connect
+from lmi.scripts.common.credentials import CredentialStore
+from lmi.scripts.common.executor import RemoteHost
 
 LOG = get_logger(__name__)
 
+#: CIM status code returned for wrong credentials.
+CIM_ERR_ACCESS_DENIED = 2
+
+#: Hosts, that ``lmi.shell`` connects to through the Unix socket of local
+#: CIMOM, when run by root without credentials.
+LOCAL_HOSTNAMES = ('localhost', 'localhost.localdomain', '127.0.0.1', '::1')
+
+#: { connection class : its subclass reporting the host behind broker }
+_BROKERED_CLASSES = {}
+
+def _report_hostname(connection, hostname):
+    """
+    Make the connection to local endpoint of connection broker report the
+    remote host instead of the endpoint.
+
+    :param connection: Connection made through the broker.
+    :param string hostname: Host the endpoint forwards to.
+    :returns: The same connection object.
+    """
+    cls = type(connection)
+    if cls not in _BROKERED_CLASSES:
+        _BROKERED_CLASSES[cls] = type(cls.__name__, (cls, ), {
+            'hostname' : property(lambda self: self.brokered_hostname)})
+    connection.__class__ = _BROKERED_CLASSES[cls]
+    connection.brokered_hostname = hostname
+    return connection
+
+def _is_transient(error):
+    """
+    Decide, whether the failed connection attempt is worth retrying.
+    Connection failures without an exception are not retried, that's how
+    ``connect()`` of LMIShell reports rejected credentials.
+
+    :param error: Exception raised by the attempt or ``None``.
+    :rtype: boolean
+    """
+    if error is None:
+        return False
+    from lmi.shell import LMIExceptions
+    code = error.args[0] if error.args else None
+    if isinstance(error, LMIExceptions.ConnectionError):
+        return code not in (401, 403)
+    if isinstance(error, LMIExceptions.CIMError):
+        return code != CIM_ERR_ACCESS_DENIED
+    return True
+
 class Session(object):
     """
     Session object keeps connection objects to remote hosts. Their are
@@ -47,61 +99,289 @@ class Session(object):
     for connection to be made, the user is asked to supply them from
     standard input.
 
+    Hosts are pulled from ``hosts`` lazily, as they are iterated over. Thus
+    the session can start with a stream of hosts from large inventory.
+
     :param app: Instance of main application.
-    :param list hosts: List of hostname strings.
-    :param dictionary credentials: Mapping assigning a pair
-        ``(user, password)`` to each hostname.
+    :param hosts: Hostname strings. Duplicates are ignored.
+    :type hosts: list or generator
+    :param credentials: Mapping assigning a pair ``(user, password)`` to
+        each hostname or a credential store.
+    :type credentials: dictionary or
+        :py:class:`lmi.scripts.common.credentials.CredentialStore`
     :param boolean same_credentials: Use the same credentials for all
-        hosts in session. The first credentials given will be used.
+        hosts in session. The first verified credentials will be used.
+        Ignored if ``credentials`` is a credential store.
+    :param broker: Client of connection broker. If given, connections are
+        made through it.
+    :type broker: :py:class:`lmi.scripts.common.broker.BrokerClient`
+    :param unreachable_cache: Cache of hosts, that recently failed to
+        connect. Those are skipped without an attempt to connect.
+    :type unreachable_cache:
+        :py:class:`lmi.scripts.common.unreachable.UnreachableCache`
     """
 
-    def __init__(self, app, hosts, credentials=None, same_credentials=False):
+    def __init__(self, app, hosts, credentials=None, same_credentials=False,
+            broker=None, unreachable_cache=None):
         self._app = app
-        self._connections = {h: None for h in hosts}
-        # { hostname : (username, password, verified), ... }
-        # where verified is a flag saying, whether these credentials
-        # were successfuly used for logging in
-        self._credentials = defaultdict(lambda: ('', '', False))
-        self._same_credentials = same_credentials
-        if credentials is not None:
-            if not isinstance(credentials, dict):
-                raise TypeError("credentials must be a dictionary")
-            for hostname, creds in credentials.items():
-                credentials[hostname] = (creds[0], creds[1], False)
-            self._credentials.update(credentials)
+        self._broker = broker
+        self._unreachable_cache = unreachable_cache
+        # hosts not yet pulled, None when exhausted
+        self._pending = iter(hosts)
+        # keep the order of hosts for the output to be deterministic
+        self._hostnames = []
+        # { hostname : connection, ... }
+        self._connections = {}
+        # Number of hosts connected at once ahead of iteration. Values
+        # lower than 2 mean hosts are connected one by one as iterated.
+        self.prefetch = 1
+        # Function called with hostname of each host skipped while
+        # iterating, because it failed to connect.
+        self.unconnected_callback = None
+        self._offline_callback = None
+        # { hostname : boolean, ... }
+        # hosts passed to offline_callback with its answer
+        self._offline = {}
+        # hosts already passed to connect_all() while iterating
+        self._prefetched = set()
+        # absolute time of ConnectDeadline shared by connect_all() calls
+        # made while iterating
+        self._deadline = None
+        # { hostname : reason, ... }
+        # hosts, that failed to connect in connect_all(), those are not
+        # retried
+        self._unreachable = {}
+        # { hostname : time_of_connection, ... }
+        self._connected_at = {}
+        # { hostname : round_trip_time, ... }
+        # measured by the last successful probe()
+        self._rtt = {}
+        # hosts connected in sessions made by make_shard(), reported back
+        # with merge_shard()
+        self._connected_elsewhere = set()
+        # session, that made this one with make_shard()
+        self._parent = None
+        if not isinstance(credentials, CredentialStore):
+            credentials = CredentialStore(credentials, same_credentials)
+        self._credentials = credentials
 
     def __getitem__(self, hostname):
         """
         :rtype: (``LMIConnection``) Connection object to remote host.
             ``None`` if connection can not be made.
         """
-        if self._connections[hostname] is None:
+        if hostname not in self._connections:
+            self._pull_all()
+        if (   self._connections[hostname] is None
+           and hostname not in self._unreachable):
+            # shards are processed in other processes sharing the terminal
             self._connections[hostname] = self._connect(
-                    hostname, interactive=True)
+                    hostname, interactive=self._parent is None)
         return self._connections[hostname]
 
+    @property
+    def offline_callback(self):
+        """
+        Function called with hostname of each host before connecting it
+        while iterating. If it returns ``True``, the host is yielded as
+        :py:class:`lmi.scripts.common.executor.RemoteHost` without being
+        connected. Setting it forgets the answers of previous one.
+        """
+        return self._offline_callback
+    @offline_callback.setter
+    def offline_callback(self, callback):
+        """ Set the function deciding, which hosts are not connected. """
+        self._offline_callback = callback
+        self._offline.clear()
+
     def __len__(self):
         """ Get the number of hostnames in session. """
-        return len(self._connections)
+        self._pull_all()
+        return len(self._hostnames)
 
     def __iter__(self):
-        """ Yields connection objects. """
+        """
+        Yields connection objects. If :py:attr:`prefetch` is greater than 1,
+        hosts are connected in batches with :py:meth:`connect_all`. Hosts
+        accepted by :py:attr:`offline_callback` are yielded as
+        :py:class:`lmi.scripts.common.executor.RemoteHost` objects.
+        """
         successful_connections = 0
-        for hostname in self._connections:
+        index = 0
+        while index < len(self._hostnames) or self._pull():
+            hostname = self._hostnames[index]
+            if self.prefetch > 1 and hostname not in self._prefetched:
+                size = 2 * self.prefetch
+                self._pull(index + size - len(self._hostnames))
+                batch = self._hostnames[index:index + size]
+                self._prefetched.update(batch)
+                self.connect_all(self.prefetch, hostnames=[h for h in batch
+                        if not self._is_offline(h)])
+            index += 1
+            if self._is_offline(hostname):
+                yield RemoteHost(hostname)
+                successful_connections += 1
+                continue
             try:
                 connection = self[hostname]
                 if connection is not None:
                     yield connection
                     successful_connections += 1
+                    continue
             except Exception as exc:
                 LOG().error('failed to make a connection to "%s": %s',
                         hostname, exc)
+            if self.unconnected_callback is not None:
+                self.unconnected_callback(hostname)
         if successful_connections == 0:
             raise errors.LmiNoConnections('no successful connection made')
 
+    def _is_offline(self, hostname):
+        """
+        Decide, whether the host is processed without a connection. Each
+        host is passed to :py:attr:`offline_callback` just once.
+
+        :rtype: boolean
+        """
+        if hostname not in self._offline:
+            if self.offline_callback is None:
+                return False
+            self._offline[hostname] = bool(self.offline_callback(hostname))
+        return self._offline[hostname]
+
+    def _pull(self, count=1):
+        """
+        Pull more hosts from the ones given.
+
+        :param integer count: Number of hosts to pull.
+        :returns: Number of hosts pulled.
+        :rtype: integer
+        """
+        pulled = 0
+        while self._pending is not None and pulled < count:
+            try:
+                hostname = next(self._pending)
+            except StopIteration:
+                self._pending = None
+                break
+            if hostname not in self._connections:
+                self._hostnames.append(hostname)
+                self._connections[hostname] = None
+                if self._parent is not None:
+                    self._inherit(hostname)
+                pulled += 1
+        return pulled
+
+    def _pull_all(self):
+        """ Pull all the remaining hosts. """
+        while self._pending is not None:
+            self._pull(1024)
+
+    @property
+    def has_many_hosts(self):
+        """
+        Whether there is more than one host in session. Unlike ``len()``
+        it does not need to pull all the hosts.
+
+        :rtype: boolean
+        """
+        if len(self._hostnames) < 2:
+            self._pull(2 - len(self._hostnames))
+        return len(self._hostnames) > 1
+
+    def _is_known_unreachable(self, hostname):
+        """
+        Check the cache of unreachable hosts. Host found there is marked
+        as unreachable in this session.
+
+        :param string hostname: Name of host.
+        :rtype: boolean
+        """
+        if self._unreachable_cache is None:
+            return False
+        entry = self._unreachable_cache.get(hostname)
+        if entry is None:
+            return False
+        LOG().warn('skipping host "%s" unreachable since %s: %s', hostname,
+                time.strftime('%H:%M:%S', time.localtime(entry[0])), entry[1])
+        self._unreachable[hostname] = 'recently unreachable'
+        return True
+
     def _connect(self, hostname, interactive=False):
         """
-        Makes the connection to host.
+        Makes the connection to host. Failed attempts are retried with
+        exponentially growing delay up to ``[Main] ConnectRetries`` times,
+        unless they are caused by wrong credentials. Hosts failing to
+        connect are remembered in the cache of unreachable hosts.
+
+        :param string hostname: Name of host.
+        :param boolean interactive: Whether we can interact with user
+            and expect a reply from him.
+        :returns: Connection to remote host or ``None``.
+        :rtype: :py:class:`lmi.shell.LMIConnection` or ``None``
+        """
+        if self._is_known_unreachable(hostname):
+            return None
+        config = self._app.config
+        retries = config.connect_retries
+        if interactive and not all(self.get_credentials(hostname)):
+            # do not ask the user for credentials repeatedly
+            retries = 0
+        attempt = 0
+        while True:
+            error = None
+            try:
+                connection = self._connect_once(hostname, interactive)
+            except Exception as exc:
+                connection, error = None, exc
+            if connection is not None:
+                if self._unreachable_cache is not None:
+                    self._unreachable_cache.discard(hostname)
+                return connection
+            if attempt >= retries or not _is_transient(error):
+                break
+            # jitter keeps hosts failed at once from retrying in sync
+            delay = min(config.retry_max_delay,
+                    config.retry_delay * 2 ** attempt)
+            delay *= random.uniform(0.5, 1)
+            LOG().warn('failed to connect to host "%s"%s, retrying in'
+                    ' %.1f seconds', hostname,
+                    '' if error is None else ': %s' % error, delay)
+            time.sleep(delay)
+            attempt += 1
+
+        self._credentials.invalidate(hostname)
+        if self._unreachable_cache is not None and _is_transient(error):
+            self._unreachable_cache.add(hostname,
+                    'failed to connect' if error is None else str(error))
+        if error is not None:
+            raise error
+        LOG().error('failed to connect to host "%s"', hostname)
+        return None
+
+    def _ask_credentials(self, hostname, username, password):
+        """
+        Ask the user for credentials missing to connect to host.
+
+        :param string hostname: Name of host.
+        :param string username: Name of user, if known.
+        :param string password: Password of user, if known.
+        :returns: Pair ``(username, password)``.
+        :rtype: tuple
+        """
+        if os.getuid() == 0 and hostname in LOCAL_HOSTNAMES:
+            # connected through the local socket without credentials
+            return username, password
+        prefix = '[%s] ' % hostname if self.has_many_hosts else ''
+        if not username:
+            username = raw_input(prefix + 'username: ')
+        if not password:
+            password = getpass.getpass(prefix + 'password: ')
+        return username, password
+
+    def _connect_once(self, hostname, interactive=False):
+        """
+        Makes single attempt to connect to host.
 
         :param string hostname: Name of host.
         :param boolean interactive: Whether we can interact with user
@@ -110,7 +390,11 @@ class Session(object):
         :rtype: :py:class:`lmi.shell.LMIConnection` or ``None``
         """
         username, password = self.get_credentials(hostname)
+        if interactive and not (username and password):
+            username, password = self._ask_credentials(
+                    hostname, username, password)
         import inspect
+        from lmi.shell.LMIConnection import connect
         # TODO: remove inspect magic and add dependency on particular
         # version of openlmi-tools, when its released
         kwargs = dict(interactive=interactive)
@@ -123,22 +407,206 @@ class Session(object):
             kwargs['verify_certificate'] = self._app.config.verify_server_cert
         # else: this must be very old and bearded shell
 
-        if (  len(self._connections) > 1 \
+        if (  self.has_many_hosts \
            and (  'prompt_prefix' in con_argspec.args
                or con_argspec.keywords)):
             kwargs['prompt_prefix'] = '[%s] ' % hostname
-        connection = connect(hostname, username, password, **kwargs)
+        uri, secret = hostname, password
+        # Without credentials lmi.shell would connect to the local broker
+        # endpoint through Unix socket of local CIMOM. Such hosts are
+        # connected directly.
+        if self._broker is not None and username and password:
+            try:
+                # endpoint accepts its token in place of the password
+                uri, secret = self._broker.open(hostname, username, password,
+                        self._app.config.verify_server_cert)
+            except errors.LmiBrokerError as err:
+                LOG().warn('connecting to "%s" directly: %s', hostname, err)
+        connection = connect(uri, username, secret, **kwargs)
         if connection is not None:
+            if uri != hostname:
+                _report_hostname(connection, hostname)
             LOG().debug('connection to host "%s" successfully created',
                     hostname)
-            tp = connection._client._cliconn.creds
-            if tp is None:
-                tp = ('', '')
-            self._credentials[hostname] = (tp[0], tp[1], True)
-        else:
-            LOG().error('failed to connect to host "%s"', hostname)
+            self._credentials.verify(hostname, username, password)
+            self._connected_at[hostname] = time.time()
+            self._rtt.pop(hostname, None)
         return connection
 
+    def connect_all(self, jobs=None, timeout=None, deadline=None,
+            hostnames=None):
+        """
+        Make connections to hosts not yet connected concurrently. Hosts
+        missing a password are skipped, they will be connected when needed,
+        so the user can be asked for credentials. Hosts failing to connect
+        are not retried afterwards and are returned by
+        :py:meth:`get_unconnected`.
+
+        :param integer jobs: Maximum number of connections made at once.
+            Defaults to ``[Main] Jobs`` configuration option.
+        :param float timeout: Number of seconds to wait for a connection to
+            single host. Defaults to ``[Main] ConnectTimeout``.
+        :param float deadline: Number of seconds to wait for all connections
+            to be made. Defaults to ``[Main] ConnectDeadline``, which is
+            measured from the first call.
+        :param list hostnames: Hosts to connect. Defaults to all of them.
+        :returns: Number of connections made.
+        :rtype: integer
+        """
+        config = self._app.config
+        if jobs is None:
+            jobs = config.jobs
+        if timeout is None:
+            timeout = config.connect_timeout
+        if deadline is not None:
+            deadline = time.time() + deadline
+        else:
+            if (   self._deadline is None
+               and config.connect_deadline is not None):
+                self._deadline = time.time() + config.connect_deadline
+            deadline = self._deadline
+        if hostnames is None:
+            self._pull_all()
+            hostnames = self._hostnames
+
+        # hosts to connect in the same order as given
+        waiting = [ h for h, (_, password)
+                    in self._credentials.resolve(hostnames)
+                  if  self._connections[h] is None
+                  and h not in self._unreachable
+                  and password
+                  and not self._is_known_unreachable(h)]
+        waiting.reverse()
+        # { hostname : start_time, ... }
+        running = {}
+        # pairs (hostname, connection) put by threads, when finished
+        finished = Queue.Queue()
+
+        def _connect(hostname):
+            """ Thread body making a connection to single host. """
+            connection = None
+            try:
+                connection = self._connect(hostname)
+            except Exception as exc:
+                LOG().error('failed to make a connection to "%s": %s',
+                        hostname, exc)
+            finished.put((hostname, connection))
+
+        connected = 0
+        while waiting or running:
+            while waiting and len(running) < max(1, jobs):
+                hostname = waiting.pop()
+                thread = threading.Thread(target=_connect, args=(hostname,))
+                thread.daemon = True
+                thread.start()
+                running[hostname] = time.time()
+            # wait for a thread to finish or for the nearest time limit
+            limits = [1.0]
+            if timeout is not None:
+                limits.append(min(running.values()) + timeout - time.time())
+            if deadline is not None:
+                limits.append(deadline - time.time())
+            try:
+                hostname, connection = finished.get(
+                        timeout=max(0.001, min(limits)))
+            except Queue.Empty:
+                pass
+            else:
+                # result of abandoned thread is not used
+                if hostname in running:
+                    del running[hostname]
+                    self._connections[hostname] = connection
+                    if connection is None:
+                        self._unreachable[hostname] = 'failed to connect'
+                    else:
+                        connected += 1
+            now = time.time()
+            if timeout is not None:
+                for hostname, started in running.items():
+                    if now - started > timeout:
+                        # thread is abandoned, its result won't be used
+                        del running[hostname]
+                        LOG().error('connection to host "%s" timed out',
+                                hostname)
+                        self._unreachable[hostname] = 'connection timed out'
+                        if self._unreachable_cache is not None:
+                            self._unreachable_cache.add(hostname,
+                                    'connection timed out')
+            if deadline is not None and now > deadline:
+                for hostname in waiting + running.keys():
+                    LOG().error('deadline for connecting to host "%s"'
+                        ' expired', hostname)
+                    self._unreachable[hostname] = 'deadline expired'
+                break
+        return connected
+
+    def probe(self, hostname):
+        """
+        Check, whether the connection to host is still alive, by sending
+        a dummy request. Dropped connection is replaced with a new one
+        without asking user for credentials. If that fails, the host is
+        reconnected when needed.
+
+        :param string hostname: Name of host to check.
+        :returns: Round trip time of dummy request in seconds or ``None`` if
+            the host is not connected or the connection has been dropped.
+        :rtype: float
+        """
+        connection = self._connections[hostname]
+        if connection is None:
+            return None
+        started = time.time()
+        try:
+            alive = connection.client.dummy().rval
+        except Exception as exc:
+            LOG().debug('probe of host "%s" failed: %s', hostname, exc)
+            alive = False
+        if alive:
+            self._rtt[hostname] = time.time() - started
+            return self._rtt[hostname]
+        LOG().warn('connection to host "%s" lost, reconnecting', hostname)
+        self._connections[hostname] = None
+        del self._connected_at[hostname]
+        self._rtt.pop(hostname, None)
+        try:
+            self._connections[hostname] = self._connect(hostname)
+        except Exception as exc:
+            # keep probing other hosts, this one is reconnected when needed
+            if self._app.config.trace:
+                LOG().exception('failed to reconnect host "%s"', hostname)
+            else:
+                LOG().error('failed to reconnect host "%s": %s',
+                        hostname, exc)
+            self._connections[hostname] = None
+        return None
+
+    def probe_all(self):
+        """
+        Probe all connected hosts with :py:meth:`probe`.
+        """
+        for hostname in self._hostnames:
+            if self._connections[hostname] is not None:
+                self.probe(hostname)
+
+    def get_connection_stats(self):
+        """
+        :returns: List of triples ``(hostname, age, rtt)`` for each host
+            pulled so far. ``age`` is a number of seconds since the
+            connection has been made and ``rtt`` is the round trip time
+            measured by the last :py:meth:`probe`. Both are ``None`` if
+            unknown.
+        :rtype: list
+        """
+        now = time.time()
+        result = []
+        for hostname in self._hostnames:
+            connection = self._connections[hostname]
+            age = None
+            if connection is not None and hostname in self._connected_at:
+                age = now - self._connected_at[hostname]
+            result.append((hostname, age, self._rtt.get(hostname)))
+        return result
+
     @property
     def hostnames(self):
         """
@@ -146,30 +614,155 @@ class Session(object):
 
         :rtype: list
         """
-        return self._connections.keys()
+        self._pull_all()
+        return list(self._hostnames)
+
+    def iter_hostnames(self):
+        """
+        Yield hostnames in session without connecting them. Unlike
+        :py:attr:`hostnames` hosts are pulled as needed.
+
+        :rtype: generator over strings
+        """
+        index = 0
+        while index < len(self._hostnames) or self._pull():
+            yield self._hostnames[index]
+            index += 1
 
     def get_credentials(self, hostname):
         """
         :param string hostname: Name of host to get credentials for.
         :returns: Pair of ``(username, password)`` for given hostname. If no
             credentials were given for this host, ``('', '')`` is returned.
-        :rtype: tuple 
-        """
-        username, password, verified = self._credentials[hostname]
-        if (   not verified
-           and (not username or not password)
-           and self._same_credentials):
-            for tp in self._credentials.values():
-                if tp[2]:
-                    username, password = tp[0], tp[1]
-                    break
-        return username, password
+        :rtype: tuple
+        """
+        return self._credentials.get(hostname)
+
+    @property
+    def credentials(self):
+        """
+        Credential store of session.
+
+        :rtype: :py:class:`lmi.scripts.common.credentials.CredentialStore`
+        """
+        return self._credentials
+
+    def make_shard(self, hosts):
+        """
+        Make a new session of some hosts of this session, which can be
+        processed in a separate process. It shares credentials, broker and
+        the cache of unreachable hosts with this session. Connections
+        already made are passed to it as well. Shard never asks the user
+        for credentials.
+
+        Credentials verified in the new session are not saved by it.
+        Report its connected and unreachable hosts back with
+        :py:meth:`merge_shard`.
+
+        :param hosts: Hostnames of shard. They may be pulled lazily.
+        :type hosts: list or generator
+        :rtype: :py:class:`Session`
+        """
+        shard = Session(self._app, hosts, self._credentials,
+                broker=self._broker,
+                unreachable_cache=self._unreachable_cache)
+        shard.prefetch = self.prefetch
+        shard.offline_callback = self.offline_callback
+        shard._deadline = self._deadline
+        shard._parent = self
+        return shard
+
+    def _inherit(self, hostname):
+        """
+        Take over the connection and connection failure of host from the
+        session, that made this shard.
+        """
+        self._connections[hostname] = self._parent._connections.get(hostname)
+        if hostname in self._parent._unreachable:
+            self._unreachable[hostname] = self._parent._unreachable[hostname]
+
+    def merge_shard(self, connected, unreachable, offline=()):
+        """
+        Record the outcome of connecting hosts in a session made by
+        :py:meth:`make_shard`.
+
+        :param list connected: Hosts connected successfully.
+        :param dictionary unreachable: Hosts, that failed to connect, with
+            a reason of failure assigned.
+        :param list offline: Hosts processed without a connection.
+        """
+        for hostname in connected:
+            self._connected_elsewhere.add(hostname)
+            self._credentials.verify(hostname,
+                    *self._credentials.get(hostname))
+        self._unreachable.update(unreachable)
+        for hostname in offline:
+            self._offline[hostname] = True
+
+    def save(self):
+        """
+        Write verified credentials and unreachable hosts to their caches,
+        if configured.
+        """
+        if self._parent is None:
+            self._credentials.save()
+        if self._unreachable_cache is not None:
+            self._unreachable_cache.save()
 
     def get_unconnected(self):
         """
         :returns:  List of hostnames, which do not have associated connection
-            yet.
+            yet. Hosts processed without a connection are not included.
+        :rtype: list
+        """
+        self._pull_all()
+        return [ h for h in self._hostnames
+               if  self._connections[h] is None
+               and h not in self._connected_elsewhere
+               and not self._offline.get(h)]
+
+    def get_offline(self):
+        """
+        :returns: List of hostnames processed without a connection, because
+            they were accepted by :py:attr:`offline_callback`.
         :rtype: list
         """
-        return [h for h, c in self._connections.items() if c is None]
+        return [h for h in self._hostnames if self._offline.get(h)]
+
+    def get_unreachable(self):
+        """
+        :returns: Dictionary with hostnames, that failed to connect in
+            :py:meth:`connect_all`, with a reason of failure assigned.
+        :rtype: dictionary
+        """
+        return self._unreachable.copy()
+
+class KeepAlive(threading.Thread):
+    """
+    Thread probing connections of session periodically, so that dropped
+    ones are replaced before they are needed. Probes are not made while
+    :py:attr:`lock` is held. Command using the session shall hold it while
+    running.
+
+    :param session: Session to keep alive.
+    :type session: :py:class:`Session`
+    :param float interval: Number of seconds between probes.
+    """
+
+    def __init__(self, session, interval):
+        threading.Thread.__init__(self, name='KeepAlive')
+        self.daemon = True
+        self.session = session
+        self.interval = interval
+        self.lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            with self.lock:
+                if not self._stopped.is_set():
+                    self.session.probe_all()
 
+    def stop(self):
+        """ Make the thread terminate. """
+        self._stopped.set()
@@ -0,0 +1,197 @@
+# Copyright (c) 2013, Red Hat, Inc. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of the FreeBSD Project.
+#
+# Authors: Michal Minar <miminar@redhat.com>
+#
+"""
+Module with snapshots of rows printed by lister commands.
+
+Audits of large inventories print mostly the same rows every day. With
+``--since-snapshot`` option, rows of each host are compared to a snapshot
+stored by the previous run and only the added, removed and changed ones
+are printed.
+
+Snapshot does not contain whole rows. Each row is identified by the value
+of its first column and stored with a digest of its content. Comparison
+is made in a single pass over the new rows with constant time lookups, so
+neither old nor new rows need to be sorted.
+
+Snapshot
+--------
+
+.. autoclass:: Snapshot
+    :members:
+
+"""
+
+import cPickle
+import collections
+import errno
+import hashlib
+import os
+
+from lmi.scripts.common import formatter
+from lmi.scripts.common import get_logger
+from lmi.scripts.common.util import make_parent_dir
+
+LOG = get_logger(__name__)
+
+#: Name of column prepended to rows describing the change.
+CHANGE_COLUMN = 'Change'
+
+ADDED = 'added'
+REMOVED = 'removed'
+CHANGED = 'changed'
+
+_NATIVE_TYPES = (basestring, bool, int, long, float, type(None))
+
+#: Occurence in identifiers of snapshot entries holding table headers.
+_HEADER = -1
+
+def _row_digest(row):
+    """
+    :returns: Digest of row content.
+    :rtype: string
+    """
+    return hashlib.md5(repr(tuple(
+        v if isinstance(v, _NATIVE_TYPES) else unicode(v)
+        for v in row))).digest()[:8]
+
+class Snapshot(object):
+    """
+    Snapshot of rows of single host printed by particular command. It's
+    stored in a file as a pickled dictionary mapping row identifiers to
+    digests of rows. Headers of tables are stored in it as well. Each host
+    has its own directory with snapshots.
+
+    :param string directory: Path to the directory with snapshots.
+    :param string hostname: Name of host.
+    :param string key: Key identifying the command and its options.
+    """
+
+    def __init__(self, directory, hostname, key):
+        self._path = os.path.join(directory,
+                hashlib.sha1(hostname.encode('utf-8')).hexdigest(), key)
+
+    def _load(self):
+        """
+        :returns: Dictionary mapping row identifiers to digests.
+        :rtype: dictionary
+        """
+        try:
+            with open(self._path, 'rb') as snapshot_file:
+                return cPickle.load(snapshot_file)
+        except (IOError, OSError) as exc:
+            if exc.errno != errno.ENOENT:
+                LOG().warn('failed to read snapshot "%s": %s',
+                        self._path, exc)
+        except Exception as exc:
+            LOG().warn('failed to load snapshot "%s": %s', self._path, exc)
+        return {}
+
+    def _save(self, entries):
+        """
+        Replace the snapshot with given entries.
+
+        :param dictionary entries: Row identifiers mapped to digests.
+        """
+        tmp_path = '%s.%d.tmp' % (self._path, os.getpid())
+        try:
+            make_parent_dir(self._path)
+            with open(tmp_path, 'wb') as snapshot_file:
+                cPickle.dump(entries, snapshot_file,
+                        cPickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, self._path)
+        except Exception as exc:
+            LOG().warn('failed to write snapshot "%s": %s', self._path, exc)
+
+    def diff(self, rows):
+        """
+        Compare rows with the snapshot. New snapshot is stored, when all
+        the rows are compared, even if the returned generator is closed
+        before yielding the removed ones.
+
+        :param rows: Rows of lister command interleaved with formatter
+            commands.
+        :type rows: list or generator
+        :returns: Added and changed rows followed by removed ones. Each
+            is prefixed with a description of change. Removed rows contain
+            just the value of first column. Table headers get
+            :py:data:`CHANGE_COLUMN` prepended.
+        :rtype: generator
+        """
+        old = self._load()
+        # { table title : header columns, ... }
+        headers = dict((ident[0], old.pop(ident)) for ident in list(old)
+                if ident[2] == _HEADER)
+        new = {}
+        # number of rows having the same identifier in current table
+        occurences = collections.defaultdict(int)
+        title = None
+        completed = False
+        try:
+            for row in rows:
+                if isinstance(row, formatter.NewTableHeaderCommand):
+                    columns = (CHANGE_COLUMN, ) + tuple(row.columns or ())
+                    headers[title] = columns
+                    new[(title, None, _HEADER)] = columns
+                    yield formatter.NewTableHeaderCommand(columns)
+                    continue
+                if isinstance(row, formatter.NewTableCommand):
+                    title = row.title
+                    occurences.clear()
+                if isinstance(row, formatter.FormatterCommand):
+                    yield row
+                    continue
+                first = row[0] if len(row) else None
+                ident = (title, first, occurences[first])
+                occurences[first] += 1
+                digest = _row_digest(row)
+                new[ident] = digest
+                old_digest = old.pop(ident, None)
+                if old_digest is None:
+                    yield (ADDED, ) + tuple(row)
+                elif old_digest != digest:
+                    yield (CHANGED, ) + tuple(row)
+            completed = True
+            # the rest of old rows was removed, keep them in their tables
+            removed = collections.defaultdict(list)
+            for (table, first, _occurence) in old:
+                removed[table].append(first)
+            for table, values in sorted(removed.items()):
+                if table is not None and table != title:
+                    yield formatter.NewTableCommand(table)
+                    title = table
+                    if table in headers:
+                        # rows of other table were printed since its header
+                        yield formatter.NewTableHeaderCommand(headers[table])
+                padding = (None, ) * max(0, len(headers.get(table, ())) - 2)
+                for value in sorted(values):
+                    yield (REMOVED, value) + padding
+        finally:
+            if completed:
+                self._save(new)
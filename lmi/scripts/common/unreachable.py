@@ -0,0 +1,179 @@
+# Copyright (c) 2013, Red Hat, Inc. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of the FreeBSD Project.
+#
+# Authors: Michal Minar <miminar@redhat.com>
+#
+"""
+Module with on-disk cache of hosts, that recently failed to connect.
+
+Scheduled runs against large inventories spend most of their time waiting
+for hosts, that are down. Those are remembered for a configurable time,
+so the following runs skip them immediately. Lookups are made in constant
+time in a dictionary loaded once per process.
+
+UnreachableCache
+----------------
+
+.. autoclass:: UnreachableCache
+    :members:
+
+"""
+
+import json
+import os
+import threading
+import time
+
+from lmi.scripts.common import get_logger
+from lmi.scripts.common.util import make_parent_dir
+
+LOG = get_logger(__name__)
+
+class UnreachableCache(object):
+    """
+    Cache of unreachable hosts stored in a file as a JSON object mapping
+    hostnames to pairs ``[time_of_failure, reason]``. Entries older than
+    ``ttl`` seconds are ignored and dropped when the cache is saved.
+
+    Several processes may share the cache. Only the hosts changed by this
+    process are written back, merged with the current content of the file.
+
+    :param string path: Path to the cache file.
+    :param float ttl: Number of seconds, the host is considered unreachable
+        after a failed connection attempt.
+    """
+
+    def __init__(self, path, ttl):
+        self._path = path
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        # { hostname : (time_of_failure, reason), ... }
+        # loaded upon first lookup
+        self._hosts = None
+        # { hostname : (time_of_failure, reason) or None, ... }
+        # changes made by this process, None marks a removed host
+        self._changes = {}
+
+    def _read(self):
+        """
+        Read the cache file dropping expired entries.
+
+        :returns: Dictionary mapping hostnames to pairs
+            ``(time_of_failure, reason)``.
+        :rtype: dictionary
+        """
+        if not os.path.exists(self._path):
+            return {}
+        try:
+            with open(self._path, 'r') as cache_file:
+                data = json.load(cache_file)
+            if not isinstance(data, dict):
+                raise ValueError('expected JSON object')
+        except (IOError, OSError, ValueError) as exc:
+            LOG().warn('failed to read unreachable hosts cache "%s": %s',
+                    self._path, exc)
+            return {}
+        oldest = time.time() - self._ttl
+        hosts = {}
+        for hostname, entry in data.items():
+            try:
+                failed_at, reason = float(entry[0]), entry[1]
+            except (TypeError, ValueError, IndexError):
+                continue
+            if failed_at >= oldest:
+                hosts[hostname] = (failed_at, reason)
+        return hosts
+
+    def get(self, hostname):
+        """
+        Check whether the host failed to connect recently.
+
+        :param string hostname: Name of host.
+        :returns: Pair ``(time_of_failure, reason)`` or ``None`` if the
+            host is not known to be unreachable.
+        :rtype: tuple
+        """
+        with self._lock:
+            if self._hosts is None:
+                self._hosts = self._read()
+            entry = self._hosts.get(hostname)
+        if entry is not None and entry[0] < time.time() - self._ttl:
+            return None
+        return entry
+
+    def add(self, hostname, reason):
+        """
+        Remember the host as unreachable.
+
+        :param string hostname: Name of host.
+        :param string reason: Description of the failure.
+        """
+        entry = (time.time(), reason)
+        with self._lock:
+            if self._hosts is not None:
+                self._hosts[hostname] = entry
+            self._changes[hostname] = entry
+
+    def discard(self, hostname):
+        """
+        Forget the host, because it has been connected.
+
+        :param string hostname: Name of host.
+        """
+        with self._lock:
+            if self._hosts is not None:
+                self._hosts.pop(hostname, None)
+            self._changes[hostname] = None
+
+    def save(self):
+        """
+        Write the changes made to the cache file, if there are any.
+        """
+        with self._lock:
+            changes, self._changes = self._changes, {}
+        if not changes:
+            return
+        hosts = self._read()
+        modified = False
+        for hostname, entry in changes.items():
+            if entry is not None:
+                hosts[hostname] = entry
+                modified = True
+            elif hosts.pop(hostname, None) is not None:
+                modified = True
+        if not modified:
+            return
+        try:
+            make_parent_dir(self._path)
+            tmp_path = '%s.%d.tmp' % (self._path, os.getpid())
+            with open(tmp_path, 'w') as cache_file:
+                json.dump(dict((h, list(e)) for h, e in hosts.items()),
+                        cache_file)
+            os.rename(tmp_path, self._path)
+        except (IOError, OSError) as exc:
+            LOG().warn('failed to write unreachable hosts cache "%s": %s',
+                    self._path, exc)
@@ -0,0 +1,518 @@
+# Copyright (c) 2013, Red Hat, Inc. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of the FreeBSD Project.
+#
+# Authors: Michal Minar <miminar@redhat.com>
+#
+"""
+Module with filter expressions given with ``--where`` option.
+
+Expression selects rows of lister commands. It's composed of comparisons
+of column values with literals joined with logical operators: ::
+
+    Status = "OK" and (Name like "ssh%" or not Started)
+
+Grammar of expressions: ::
+
+    expression  := conjunction ("or" conjunction)*
+    conjunction := negation ("and" negation)*
+    negation    := "not" negation | "(" expression ")" | predicate
+    predicate   := name ("=" | "!=" | "<>" | "<" | "<=" | ">" | ">=") literal
+                 | name ["not"] "like" string
+                 | name "is" ["not"] "null"
+                 | name
+    literal     := string | number | "true" | "false" | "null"
+
+Keywords are case insensitive. Strings are enclosed in single or double
+quotes, backslash escapes the next character. ``like`` patterns use ``%``
+for any sequence of characters and ``_`` for a single character. Predicate
+consisting of a name alone is true, when the value is true.
+
+Missing values are ``NULL`` like in SQL. Predicates other than ``is null``
+and ``is not null`` are unknown for them, so are their negations. Row is
+selected only if the whole expression is true. Thus the result does not
+depend on whether the expression is evaluated by CIMOM or locally.
+
+Expressions are compiled to conditions of CQL/WQL queries, so that rows
+are filtered by CIMOM before being transferred. Predicates that can not be
+compiled are evaluated locally on rendered rows. See
+:py:meth:`Filter.split`.
+
+Filter
+------
+
+.. autoclass:: Filter
+    :members:
+
+"""
+
+import re
+
+from lmi.scripts.common import errors
+
+RE_ESCAPE = re.compile(r'(["\\])')
+RE_TOKEN = re.compile(r'''
+      \s*(?:
+        (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<number>-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<operator><=|>=|!=|<>|=|<|>)
+      | (?P<paren>[()])
+      )''', re.VERBOSE)
+RE_UNESCAPE = re.compile(r'\\(.)')
+
+KEYWORDS = ('and', 'or', 'not', 'like', 'is', 'null', 'true', 'false')
+
+def escape_cql(s):
+    """
+    Escape potentially unsafe string for CQL.
+
+    It is generally not possible to do anything really harmful in CQL
+    (there is no DELETE nor DROP TABLE), but just to be nice,
+    all strings passed to CQL should escape backslash '\' and double quote
+    '"'.
+
+    :type s: string
+    :param s: String to escape.
+    :rtype: string
+    """
+    return RE_ESCAPE.sub(r'\\\1', s)
+
+def make_query(class_name, property_list=None, conditions=()):
+    """
+    Make a WQL query selecting instances of given class.
+
+    :param string class_name: Name of CIM class.
+    :param list property_list: Names of properties to select. All of them
+        are selected if ``None``.
+    :param list conditions: Conditions instances must satisfy.
+    :rtype: string
+    """
+    query = 'SELECT %s FROM %s' % (
+            '*' if property_list is None else ', '.join(property_list),
+            class_name)
+    conditions = [c for c in conditions if c]
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(
+                c if len(conditions) == 1 else '(%s)' % c
+                for c in conditions)
+    return query
+
+def _render_literal(value):
+    """
+    :returns: Literal of CQL/WQL query.
+    :rtype: string
+    """
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, basestring):
+        return '"%s"' % escape_cql(value)
+    return repr(value)
+
+def _like_to_regexp(pattern):
+    """
+    :returns: Compiled regular expression matching the same strings as
+        ``like`` pattern.
+    """
+    parts = []
+    for char in pattern:
+        if char == '%':
+            parts.append('.*')
+        elif char == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+    return re.compile(''.join(parts) + r'\Z', re.DOTALL)
+
+def _compare(value, operator, literal):
+    """
+    Compare value of column with literal. Numeric literals are compared
+    with numeric strings as numbers, other literals with strings as strings.
+    Comparison with missing value is unknown.
+
+    :returns: Result of comparison or ``None`` if unknown.
+    """
+    if value is None or literal is None:
+        return None
+    if (   isinstance(literal, (int, long, float))
+       and not isinstance(literal, bool)
+       and isinstance(value, basestring)):
+        try:
+            value = float(value)
+        except ValueError:
+            return False
+    elif isinstance(literal, basestring) and not isinstance(value, basestring):
+        value = str(value)
+    if operator == '=':
+        return value == literal
+    if operator in ('!=', '<>'):
+        return value != literal
+    if operator == '<':
+        return value < literal
+    if operator == '<=':
+        return value <= literal
+    if operator == '>':
+        return value > literal
+    return value >= literal
+
+class _Node(object):
+    """
+    Node of parsed expression.
+    """
+
+    def names(self):
+        """
+        :returns: Names of columns referred to by expression.
+        :rtype: set
+        """
+        raise NotImplementedError
+
+    def evaluate(self, get_value):
+        """
+        :param callable get_value: Function returning a value of column
+            with given name.
+        :returns: Whether the row satisfies expression. ``None`` means
+            unknown due to missing values.
+        :rtype: boolean
+        """
+        raise NotImplementedError
+
+    def to_wql(self, properties):
+        """
+        :param dictionary properties: Property names indexed by lowercase
+            column names.
+        :returns: Condition of WQL query or ``None``, if the expression
+            can not be compiled.
+        :rtype: string
+        """
+        raise NotImplementedError
+
+class _Predicate(_Node):
+    """
+    Predicate on a value of single column.
+    """
+
+    def __init__(self, name, operator, literal=None):
+        self.name = name
+        self.operator = operator
+        self.literal = literal
+        if operator == 'like':
+            self._regexp = _like_to_regexp(literal)
+
+    def names(self):
+        return set([self.name])
+
+    def evaluate(self, get_value):
+        value = get_value(self.name)
+        if self.operator == 'is null':
+            return value is None
+        if self.operator == 'is not null':
+            return value is not None
+        if value is None:
+            return None
+        if self.operator == 'true':
+            return bool(value)
+        if self.operator == 'like':
+            if not isinstance(value, basestring):
+                value = str(value)
+            return self._regexp.match(value) is not None
+        return _compare(value, self.operator, self.literal)
+
+    def to_wql(self, properties):
+        prop = properties.get(self.name.lower())
+        if prop is None:
+            return None
+        if self.operator == 'true':
+            # type of property is not known
+            return None
+        if self.operator in ('is null', 'is not null'):
+            return '%s %s' % (prop, self.operator.upper())
+        if self.operator == 'like':
+            return '%s LIKE %s' % (prop, _render_literal(self.literal))
+        if self.literal is None:
+            return None
+        operator = '<>' if self.operator == '!=' else self.operator
+        return '%s %s %s' % (prop, operator, _render_literal(self.literal))
+
+class _Not(_Node):
+    """
+    Negation of expression.
+    """
+
+    def __init__(self, operand):
+        self.operand = operand
+
+    def names(self):
+        return self.operand.names()
+
+    def evaluate(self, get_value):
+        result = self.operand.evaluate(get_value)
+        if result is None:
+            return None
+        return not result
+
+    def to_wql(self, properties):
+        condition = self.operand.to_wql(properties)
+        if condition is None:
+            return None
+        return 'NOT (%s)' % condition
+
+class _Junction(_Node):
+    """
+    Conjunction or disjunction of expressions.
+    """
+
+    def __init__(self, operator, operands):
+        self.operator = operator
+        self.operands = operands
+
+    def names(self):
+        result = set()
+        for operand in self.operands:
+            result.update(operand.names())
+        return result
+
+    def evaluate(self, get_value):
+        # the first operand deciding the result stops the evaluation
+        decisive = self.operator == 'or'
+        result = not decisive
+        for operand in self.operands:
+            value = operand.evaluate(get_value)
+            if value is None:
+                result = None
+            elif value == decisive:
+                return decisive
+        return result
+
+    def to_wql(self, properties):
+        conditions = [o.to_wql(properties) for o in self.operands]
+        if any(c is None for c in conditions):
+            return None
+        return (' %s ' % self.operator.upper()).join(
+                '(%s)' % c for c in conditions)
+
+class _Parser(object):
+    """
+    Recursive descent parser of filter expressions.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = []
+        pos = 0
+        expression = expression.rstrip()
+        while pos < len(expression):
+            match = RE_TOKEN.match(expression, pos)
+            if match is None or match.end() == pos:
+                self.fail('unexpected character', pos)
+            kind = match.lastgroup
+            value = match.group(kind)
+            start = match.start(kind)
+            if kind == 'name' and value.lower() in KEYWORDS:
+                kind, value = 'keyword', value.lower()
+            self.tokens.append((kind, value, start))
+            pos = match.end()
+        self.index = 0
+
+    def fail(self, message, pos=None):
+        """ Raise an error pointing at given position. """
+        if pos is None:
+            pos = (  self.tokens[self.index][2]
+                  if self.index < len(self.tokens) else len(self.expression))
+        raise errors.LmiInvalidOptions('invalid filter expression "%s":'
+                ' %s at position %d' % (self.expression, message, pos + 1))
+
+    def peek(self, kind=None, value=None):
+        """
+        :returns: Whether the next token is of given kind and value.
+        """
+        if self.index >= len(self.tokens):
+            return False
+        token_kind, token_value, _pos = self.tokens[self.index]
+        return (   (kind is None or kind == token_kind)
+               and (value is None or value == token_value))
+
+    def take(self, kind=None, value=None, what=None):
+        """
+        :returns: Value of the next token, which must be of given kind and
+            value.
+        """
+        if not self.peek(kind, value):
+            self.fail('expected %s' % (what or value or kind))
+        self.index += 1
+        return self.tokens[self.index - 1][1]
+
+    def parse(self):
+        """
+        :returns: Root node of expression.
+        """
+        node = self.parse_disjunction()
+        if self.index < len(self.tokens):
+            self.fail('unexpected "%s"' % self.tokens[self.index][1])
+        return node
+
+    def parse_disjunction(self):
+        operands = [self.parse_conjunction()]
+        while self.peek('keyword', 'or'):
+            self.index += 1
+            operands.append(self.parse_conjunction())
+        return operands[0] if len(operands) == 1 else _Junction('or', operands)
+
+    def parse_conjunction(self):
+        operands = [self.parse_negation()]
+        while self.peek('keyword', 'and'):
+            self.index += 1
+            operands.append(self.parse_negation())
+        return operands[0] if len(operands) == 1 else _Junction('and', operands)
+
+    def parse_negation(self):
+        if self.peek('keyword', 'not'):
+            self.index += 1
+            return _Not(self.parse_negation())
+        if self.peek('paren', '('):
+            self.index += 1
+            node = self.parse_disjunction()
+            self.take('paren', ')')
+            return node
+        return self.parse_predicate()
+
+    def parse_literal(self):
+        if self.peek('string'):
+            value = self.take('string')
+            return RE_UNESCAPE.sub(r'\1', value[1:-1])
+        if self.peek('number'):
+            value = self.take('number')
+            if re.match(r'-?\d+\Z', value):
+                return int(value)
+            return float(value)
+        for keyword, value in (('true', True), ('false', False),
+                ('null', None)):
+            if self.peek('keyword', keyword):
+                self.index += 1
+                return value
+        self.fail('expected a literal')
+
+    def parse_predicate(self):
+        name = self.take('name', what='column name')
+        if self.peek('operator'):
+            operator = self.take('operator')
+            return _Predicate(name, operator, self.parse_literal())
+        negate = False
+        if self.peek('keyword', 'not'):
+            self.index += 1
+            negate = True
+            if not self.peek('keyword', 'like'):
+                self.fail('expected like')
+        if self.peek('keyword', 'like'):
+            self.index += 1
+            node = _Predicate(name, 'like',
+                    RE_UNESCAPE.sub(r'\1', self.take('string')[1:-1]))
+            return _Not(node) if negate else node
+        if self.peek('keyword', 'is'):
+            self.index += 1
+            if self.peek('keyword', 'not'):
+                self.index += 1
+                self.take('keyword', 'null')
+                return _Predicate(name, 'is not null')
+            self.take('keyword', 'null')
+            return _Predicate(name, 'is null')
+        return _Predicate(name, 'true')
+
+class Filter(object):
+    """
+    Parsed filter expression.
+
+    :param string expression: Expression to parse.
+    :raises: :py:class:`lmi.scripts.common.errors.LmiInvalidOptions` if
+        the expression is not valid.
+    """
+
+    def __init__(self, expression, _root=None):
+        self.expression = expression
+        if _root is None:
+            _root = _Parser(expression).parse()
+        self._root = _root
+
+    def names(self):
+        """
+        :returns: Names of columns referred to by expression.
+        :rtype: set
+        """
+        return self._root.names()
+
+    def evaluate(self, get_value):
+        """
+        Evaluate the expression on single row.
+
+        :param callable get_value: Function returning a value of column
+            with given name.
+        :returns: Whether the row satisfies the expression. Unknown result
+            due to missing values does not satisfy it.
+        :rtype: boolean
+        """
+        return self._root.evaluate(get_value) is True
+
+    def split(self, properties):
+        """
+        Split the expression into a condition of WQL query and the rest to
+        be evaluated locally. Operands of top-level conjunction are split
+        individually. Other expressions are compiled as a whole.
+
+        :param dictionary properties: Names of CIM properties indexed by
+            column names. Only predicates on these columns can be compiled.
+        :returns: A pair ``(condition, local_filter)``. Condition is a string
+            or ``None``, if nothing can be compiled. Local filter is an
+            instance of :py:class:`Filter` or ``None``, if everything is
+            compiled.
+        :rtype: tuple
+        """
+        properties = dict((c.lower(), p) for c, p in properties.items())
+        if isinstance(self._root, _Junction) and self._root.operator == 'and':
+            operands = self._root.operands
+        else:
+            operands = [self._root]
+        conditions, rest = [], []
+        for operand in operands:
+            condition = operand.to_wql(properties)
+            if condition is None:
+                rest.append(operand)
+            else:
+                conditions.append(condition)
+        if not conditions:
+            return None, self
+        if len(conditions) == 1:
+            condition = conditions[0]
+        else:
+            condition = ' AND '.join('(%s)' % c for c in conditions)
+        if not rest:
+            return condition, None
+        root = rest[0] if len(rest) == 1 else _Junction('and', rest)
+        return condition, Filter(self.expression, root)
+
+    def __str__(self):
+        return self.expression
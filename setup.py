@@ -58,7 +58,8 @@ setup(
     zip_safe=False,
     entry_points={
         'console_scripts': [
-            'lmi = lmi.scripts._metacommand:main'
+            'lmi = lmi.scripts._metacommand:main',
+            'lmi-broker = lmi.scripts.common.broker:main'
             ],
         'lmi.scripts.cmd': [],
         },